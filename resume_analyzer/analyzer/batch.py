@@ -0,0 +1,224 @@
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from django.conf import settings
+from portia import PlanBuilderV2
+from pydantic import BaseModel
+
+from . import metrics, quota
+from .cache import lookup_result, store_result
+from .clients import get_client
+from .compaction import clean_text, count_tokens, token_budget, trim_to_budget
+from .fallback import AttemptFailed, is_rate_limited, run_with_fallback
+from .parsing import OutputParseError, parse_output
+from .schemas import ResumeMatchResult
+from .utils import FALLBACK_MODELS, PROMPT_VERSION
+
+
+# -------- Batch analysis --------
+# Compares one resume against many job descriptions (or many resumes against
+# one job description) by packing several comparisons into each LLM request.
+# The shared document is sent once per request instead of once per pair.
+
+class PairMatchResult(ResumeMatchResult):
+    pair_id: str
+
+
+class BatchMatchResult(BaseModel):
+    results: List[PairMatchResult]
+
+
+def shared_budget(shared_is_resume):
+    """Tokens the shared document may take: its usual prompt budget, at most half a request."""
+    resume_budget, jd_budget = token_budget("default")
+    return min(resume_budget if shared_is_resume else jd_budget, settings.BATCH_TOKEN_BUDGET // 2)
+
+
+def pack_batches(items, shared_text):
+    """
+    Split ``(pair_id, text)`` items into batches that fit the per-request
+    token budget. Both texts must already be cleaned and trimmed, as sent.
+    """
+    budget = settings.BATCH_TOKEN_BUDGET - count_tokens(shared_text)
+    batches, current, used = [], [], 0
+    for item in items:
+        cost = count_tokens(item[1]) + 4  # the [pair_id] label and blank line
+        if current and (used + cost > budget or len(current) >= settings.BATCH_MAX_PAIRS):
+            batches.append(current)
+            current, used = [], 0
+        current.append(item)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+@functools.lru_cache(maxsize=None)
+def build_batch_plan(shared_label, item_label):
+    with metrics.stage("plan_build", plan="batch_analysis"):
+        return _build_batch_plan(shared_label, item_label)
+
+
+def _build_batch_plan(shared_label, item_label):
+    builder = PlanBuilderV2(label="Batch Resume to Job Match Analyzer")
+
+    shared_input = builder.input(
+        name="shared_document", description=f"The {shared_label} every item is compared with"
+    )
+    items_input = builder.input(
+        name="items", description=f"Numbered {item_label}s, each starting with its [pair_id]"
+    )
+
+    builder.llm_step(
+        task=(
+            f"""You are a Resume-Job Match Detective 🕵️‍♂️.
+
+Compare the shared {shared_label.upper()} against EACH numbered {item_label.upper()} independently.
+Return ONLY a valid JSON object of the form {{'results': [...]}} with one entry per item:
+{{
+  'pair_id': the id shown in brackets before the item,
+  'match_score': number from 1–10 (higher means stronger match),
+  'strengths': list of 3 strengths that the resume already shows off,
+  'missing_keywords': list of important skills/keywords from the JD that are hiding from the resume,
+  'improvement_tips': list of 3–5 actionable suggestions to level up the resume,
+  'schedule_plan_to_improve': list of steps (with rough timing) to learn what the improvement tips need
+}}
+
+Do not include any extra text, commentary, or formatting outside of JSON."""
+        ),
+        inputs=[shared_input, items_input],
+        output_schema=BatchMatchResult,
+        step_name="analyze_batch",
+    )
+
+    builder.final_output(output_schema=BatchMatchResult)
+
+    return builder.build()
+
+
+def _run_batch(plan, shared, batch):
+    """
+    Return ``{pair_id: ResumeMatchResult}`` for one packed request; ``shared``
+    and the batch's texts are sent as they are (see pack_batches).
+    """
+    items = "\n\n".join(f"[{pair_id}]\n{text}" for pair_id, text in batch)
+    tokens_in = count_tokens(shared) + count_tokens(items)
+
+    def attempt(model):
+        charged = tokens_in + settings.ANALYZER_QUOTA_OUTPUT_ESTIMATE * len(batch)
+        quota.acquire(model, charged)
+        started = time.perf_counter()
+
+        def record(outcome, tokens_out=0):
+            metrics.record_llm_attempt(
+                model, time.perf_counter() - started, outcome, tokens_in=tokens_in, tokens_out=tokens_out,
+            )
+
+        try:
+            plan_run = get_client(model).run_plan(
+                plan,
+                plan_run_inputs={"shared_document": shared, "items": items},
+                end_user="its me, mario",
+            )
+        except Exception as e:
+            if is_rate_limited(e):
+                record("rate_limited")
+                quota.block(model, quota.retry_after_seconds(e))
+            else:
+                record("error")
+            raise
+        if not plan_run or not plan_run.outputs:
+            record("empty")
+            raise AttemptFailed(f"No output from {model}")
+        raw_value = plan_run.outputs.model_dump().get("final_output", {}).get("value", "{}")
+        tokens_out = count_tokens(str(raw_value))
+        quota.settle(model, charged, tokens_in + tokens_out)
+        record("ok", tokens_out)
+        try:
+            with metrics.stage("json_parse", model=model):
+                return parse_output(raw_value, BatchMatchResult)
+        except OutputParseError as e:
+            raise AttemptFailed(f"Unparsable batch output from {model}: {e}") from e
+
+    model, parsed = run_with_fallback(FALLBACK_MODELS, attempt)
+    if parsed is None:
+        return {}, None
+    wanted = {pair_id for pair_id, _ in batch}
+    return {r.pair_id: r for r in parsed.results if r.pair_id in wanted}, model
+
+
+def analyze_batch(shared_text, items, shared_is_resume=True):
+    """
+    Compare ``shared_text`` with every text in ``items``.
+
+    With ``shared_is_resume`` the shared text is a resume and the items are
+    job descriptions; otherwise it is the other way round. Returns one
+    ``ResumeMatchResult`` (or None on failure) per item, in order.
+    """
+    def pair(text):
+        return (shared_text, text) if shared_is_resume else (text, shared_text)
+
+    results = [None] * len(items)
+    todo = []
+    for index, text in enumerate(items):
+        resume_text, job_description = pair(text)
+        _, cached = lookup_result(resume_text, job_description, FALLBACK_MODELS, PROMPT_VERSION)
+        if cached is not None:
+            metrics.ANALYSES.inc(answered_by="cache")
+            results[index] = ResumeMatchResult.model_validate(cached)
+        else:
+            todo.append((str(index), text))
+
+    if not todo:
+        return results
+
+    # Budgets are counted on the text as sent: cleaned, and trimmed so the
+    # shared document leaves room for items and no item fills a request alone.
+    shared = trim_to_budget(clean_text(shared_text), shared_budget(shared_is_resume))
+    item_budget = min(
+        token_budget("default")[1 if shared_is_resume else 0],
+        settings.BATCH_TOKEN_BUDGET - count_tokens(shared) - 4,
+    )
+    sent = {pair_id: trim_to_budget(clean_text(text), item_budget) for pair_id, text in todo}
+
+    shared_label, item_label = (
+        ("resume", "job description") if shared_is_resume else ("job description", "resume")
+    )
+    plan = build_batch_plan(shared_label, item_label)
+
+    def run(todo):
+        """Fill ``results`` for ``todo``; return the items the model left out."""
+        batches = pack_batches([(pair_id, sent[pair_id]) for pair_id, _ in todo], shared)
+        with ThreadPoolExecutor(max_workers=settings.BATCH_CONCURRENCY) as executor:
+            outcomes = list(executor.map(lambda b: _run_batch(plan, shared, b), batches))
+
+        texts = dict(todo)
+        skipped = []
+        for batch, (found, model) in zip(batches, outcomes):
+            if model is None:
+                # Every model failed for this request; asking again would fail too.
+                metrics.ANALYSES.inc(len(batch), answered_by="none")
+                continue
+            for pair_id, _ in batch:
+                match = found.get(pair_id)
+                if match is None:
+                    skipped.append((pair_id, texts[pair_id]))
+                    continue
+                metrics.ANALYSES.inc(answered_by="llm")
+                resume_text, job_description = pair(texts[pair_id])
+                result = ResumeMatchResult(**match.model_dump(exclude={"pair_id"}))
+                store_result(resume_text, job_description, model, PROMPT_VERSION, result.model_dump())
+                results[int(pair_id)] = result
+        return skipped
+
+    skipped = run(todo)
+    if skipped:
+        # The model left some items out; ask once more for just those,
+        # packed like the rest rather than one analysis each.
+        skipped = run(skipped)
+        if skipped:
+            metrics.ANALYSES.inc(len(skipped), answered_by="none")
+
+    return results
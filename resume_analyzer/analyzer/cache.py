@@ -0,0 +1,87 @@
+import hashlib
+import threading
+import unicodedata
+
+from diskcache import Cache
+from django.conf import settings
+
+
+# -------- Persistent analysis result cache --------
+# Results are stored on disk (shared by every worker process) and keyed by a
+# hash of the normalized inputs, so re-analysing the same resume against the
+# same job description never reaches the LLM again.
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# hit/miss counters live in the cache itself so they are shared by all workers
+HITS_KEY = "stats:hits"
+MISSES_KEY = "stats:misses"
+COALESCED_KEY = "stats:coalesced"  # analyses answered by joining one in flight
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = Cache(
+                    directory=str(settings.ANALYSIS_CACHE_DIR),
+                    size_limit=settings.ANALYSIS_CACHE_SIZE_LIMIT,
+                    eviction_policy="least-recently-used",
+                )
+    return _cache
+
+
+def normalize_text(text):
+    """Collapse whitespace and unicode variants so cosmetic edits hash the same."""
+    text = unicodedata.normalize("NFKC", text or "")
+    return " ".join(text.split())
+
+
+def make_cache_key(resume_text, job_description, model_name, prompt_version):
+    digest = hashlib.sha256()
+    for part in (
+        normalize_text(resume_text),
+        normalize_text(job_description),
+        model_name,
+        prompt_version,
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return f"analysis:{digest.hexdigest()}"
+
+
+def make_flight_key(resume_text, job_description, prompt_version):
+    """Model-independent key of an analysis in progress (see analyzer.singleflight)."""
+    digest = make_cache_key(resume_text, job_description, "", prompt_version).split(":", 1)[1]
+    return f"flight:{digest}"
+
+
+def lookup_result(resume_text, job_description, models, prompt_version):
+    """Return ``(model, result)`` for the first model with a cached analysis."""
+    cache = get_cache()
+    for model in models:
+        key = make_cache_key(resume_text, job_description, model, prompt_version)
+        result = cache.get(key)
+        if result is not None:
+            cache.incr(HITS_KEY)
+            return model, result
+    cache.incr(MISSES_KEY)
+    return None, None
+
+
+def store_result(resume_text, job_description, model, prompt_version, result):
+    key = make_cache_key(resume_text, job_description, model, prompt_version)
+    get_cache().set(key, result, expire=settings.ANALYSIS_CACHE_TTL)
+
+
+def cache_stats():
+    cache = get_cache()
+    return {
+        "hits": cache.get(HITS_KEY, 0),
+        "misses": cache.get(MISSES_KEY, 0),
+        "coalesced": cache.get(COALESCED_KEY, 0),
+        "entries": len(cache),
+        "size_bytes": cache.volume(),
+    }
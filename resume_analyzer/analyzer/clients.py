@@ -0,0 +1,129 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from dotenv import load_dotenv
+from portia import (
+    Config,
+    DefaultToolRegistry,
+    Portia,
+    StorageClass,
+    LLMProvider,
+)
+from portia.cli import CLIExecutionHooks
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# -------- Process-wide Portia client registry --------
+# Building a Portia client (config, tool registry, hooks) is expensive, so
+# each worker builds one client per model and reuses it for every request.
+
+load_dotenv()
+
+_clients = {}
+_build_seconds = {}
+_registry_lock = threading.Lock()
+_model_locks = {}
+_executor = None
+
+
+def _model_lock(model_name):
+    with _registry_lock:
+        return _model_locks.setdefault(model_name, threading.Lock())
+
+
+def _build_client(model_name):
+    if settings.ANALYZER_LLM_BACKEND == "stub":
+        from .stub_llm import StubPortia
+        return StubPortia(model_name)
+
+    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+    if not GOOGLE_API_KEY:
+        raise ValueError("GOOGLE_API_KEY is not set. Please check your .env file.")
+
+    google_config = Config.from_default(
+        llm_provider=LLMProvider.GOOGLE,
+        default_model=f"google/{model_name}",
+        google_api_key=GOOGLE_API_KEY,
+        storage_class=StorageClass.MEMORY,
+    )
+
+    return Portia(
+        config=google_config,
+        tools=DefaultToolRegistry(google_config),
+        execution_hooks=CLIExecutionHooks(),
+    )
+
+
+def get_client(model_name):
+    """Return the shared client for ``model_name``, building it on first use."""
+    client = _clients.get(model_name)
+    if client is not None:
+        return client
+
+    # Only one thread builds a given model; the others wait for it.
+    with _model_lock(model_name):
+        client = _clients.get(model_name)
+        if client is None:
+            started = time.perf_counter()
+            with metrics.stage("client_build", model=model_name):
+                client = _build_client(model_name)
+            _build_seconds[model_name] = time.perf_counter() - started
+            _clients[model_name] = client
+            logger.info("Built client for %s in %.3fs", model_name, _build_seconds[model_name])
+    return client
+
+
+async def aget_client(model_name):
+    """``get_client`` for async code; a first-time build runs off the event loop."""
+    client = _clients.get(model_name)
+    if client is not None:
+        return client
+    return await asyncio.to_thread(get_client, model_name)
+
+
+def _blocking_executor():
+    global _executor
+    with _registry_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ANALYZER_ASYNC_BLOCKING_THREADS, thread_name_prefix="llm-call",
+            )
+    return _executor
+
+
+async def arun_plan(client, plan, plan_run_inputs, end_user):
+    """
+    Await ``client.run_plan``: natively if the client has ``arun_plan``,
+    otherwise on a thread pool sized for many in-flight calls (the default
+    asyncio executor allows only a few dozen).
+    """
+    native = getattr(client, "arun_plan", None)
+    if native is not None:
+        return await native(plan, plan_run_inputs=plan_run_inputs, end_user=end_user)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _blocking_executor(),
+        functools.partial(client.run_plan, plan, plan_run_inputs=plan_run_inputs, end_user=end_user),
+    )
+
+
+def warm_clients(models):
+    """Build clients ahead of the first request (e.g. at worker startup)."""
+    for model_name in models:
+        try:
+            get_client(model_name)
+        except Exception as e:
+            logger.warning("Could not pre-warm %s: %s", model_name, e)
+
+
+def client_build_times():
+    return dict(_build_seconds)
@@ -0,0 +1,242 @@
+import logging
+import re
+import threading
+from collections import Counter
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# -------- Prompt compaction --------
+# Resumes and job descriptions are cleaned up and trimmed to a per-model
+# token budget before they are sent to the LLM. Sections that matter most
+# for matching (skills, experience) are kept first.
+
+PROMPT_TOKENS = metrics.counter(
+    "analyzer_prompt_tokens_total",
+    "Input tokens of each analysis before and after compaction, by model and plan (full or sections).",
+)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    # No tiktoken or no cached encoding file (offline):
+                    # fall back to the ~4 characters per token heuristic.
+                    logger.warning("tiktoken unavailable, estimating tokens: %s", e)
+                    _encoding = False
+    return _encoding
+
+
+def count_tokens(text):
+    """
+    Token count of ``text``.
+
+    cl100k_base is not Gemini's tokenizer, but it is close enough for
+    budgeting and much better than counting characters.
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+# -------- Cleaning --------
+
+_BOILERPLATE_RE = re.compile(
+    r"^(?:"
+    r"page \d{1,3}( of \d{1,3})?"
+    r"|\d{1,3} ?/ ?\d{1,3}"
+    r"|\d{1,3}"
+    r"|curriculum vitae|resume|résumé"
+    r"|references (are )?available (up)?on request\.?"
+    r"|.*\b(equal opportunity employer|without regard to race)\b.*"
+    r")$",
+    re.IGNORECASE,
+)
+
+_CONTACT_ITEM = (
+    r"(?:[\w.+-]+@[\w-]+\.[\w.-]+"                                      # email
+    r"|(?!(?:19|20)\d{2}\s*[-–—]\s*(?:19|20)\d{2}\b)"                      # (not a year range)
+    r"\+?\d[\d\s().-]{7,}\d"                                              # phone
+    r"|(?:https?://)?(?:www\.)?[\w-]+\.(?:com|in|io|dev|me|org)(?:/\S*)?)"  # profile link
+)
+_CONTACT_RE = re.compile(
+    rf"^[\s|•·,]*{_CONTACT_ITEM}(?:[\s|•·,]+{_CONTACT_ITEM})*[\s|•·,]*$",
+    re.IGNORECASE,
+)
+
+
+# A short line repeated this often is taken for a page header or footer.
+# Repeated bullets, job titles and section headings are kept.
+HEADER_FOOTER_REPEATS = 3
+HEADER_FOOTER_MAX_CHARS = 60
+_BULLET_RE = re.compile(r"^[-•*▪◦·]")
+
+
+def _header_footer_lines(lines):
+    counts = Counter(
+        line.lower() for line in lines
+        if line and len(line) <= HEADER_FOOTER_MAX_CHARS
+        and not _BULLET_RE.match(line) and not _heading_name(line)
+    )
+    return {line for line, count in counts.items() if count >= HEADER_FOOTER_REPEATS}
+
+
+def clean_text(text):
+    """Drop boilerplate and contact-only lines and page headers/footers (short lines repeated on every page)."""
+    stripped_lines = [" ".join(line.split()) for line in (text or "").splitlines()]
+    # Every copy goes, so one part of the text never depends on another.
+    headers_footers = _header_footer_lines(stripped_lines)
+    lines = []
+    for stripped in stripped_lines:
+        if not stripped:
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        if (
+            stripped.lower() in headers_footers
+            or _BOILERPLATE_RE.match(stripped)
+            or _CONTACT_RE.match(stripped)
+        ):
+            continue
+        lines.append(stripped)
+    return "\n".join(lines).strip()
+
+
+# -------- Sections --------
+
+SECTION_HEADINGS = {
+    "summary": ("summary", "profile", "objective", "about me", "professional summary", "career objective"),
+    "experience": ("experience", "work experience", "professional experience", "work history", "employment", "employment history"),
+    "projects": ("projects", "personal projects", "key projects"),
+    "skills": ("skills", "technical skills", "core skills", "key skills", "technologies", "tech stack", "competencies"),
+    "education": ("education", "academic background", "qualifications"),
+    "certifications": ("certifications", "certificates", "licenses", "courses"),
+    "awards": ("awards", "achievements", "honors", "accomplishments"),
+    "publications": ("publications",),
+    "interests": ("interests", "hobbies", "activities"),
+    "references": ("references",),
+}
+
+_HEADING_LOOKUP = {
+    alias: name for name, aliases in SECTION_HEADINGS.items() for alias in aliases
+}
+
+# Kept first when the budget is tight.
+SECTION_PRIORITY = [
+    "skills", "experience", "projects", "summary", "certifications",
+    "other", "education", "awards", "publications", "interests", "references",
+]
+
+
+def _heading_name(line):
+    key = line.strip().rstrip(":").strip().lower()
+    if len(key) > 40:
+        return None
+    return _HEADING_LOOKUP.get(key)
+
+
+def segment_sections(text):
+    """Split ``text`` into ``[(section_name, text), ...]`` in document order."""
+    sections = []
+    name, lines = "other", []
+    for line in (text or "").splitlines():
+        heading = _heading_name(line)
+        if heading:
+            if any(l.strip() for l in lines):
+                sections.append((name, "\n".join(lines).strip()))
+            name, lines = heading, [line.strip()]
+        else:
+            lines.append(line)
+    if any(l.strip() for l in lines):
+        sections.append((name, "\n".join(lines).strip()))
+    return sections
+
+
+def section_priority(name):
+    return SECTION_PRIORITY.index(name) if name in SECTION_PRIORITY else len(SECTION_PRIORITY)
+
+
+def truncate_tokens(text, budget):
+    """The start of ``text``, at most ``budget`` tokens long."""
+    if budget <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:budget])
+    return text[:(budget - 1) * 4]
+
+
+def trim_to_budget(text, budget):
+    """Keep the highest-priority sections (in original order) that fit ``budget`` tokens."""
+    if count_tokens(text) <= budget:
+        return text
+
+    sections = segment_sections(text)
+    kept = {}
+    remaining = budget
+    overflow = None
+    for index in sorted(range(len(sections)), key=lambda i: section_priority(sections[i][0])):
+        cost = count_tokens(sections[index][1])
+        if cost <= remaining:
+            kept[index] = sections[index][1]
+            remaining -= cost
+        elif overflow is None:
+            overflow = index
+
+    # Fill what is left with the start of the most important section that
+    # did not fit, line by line. The first line that does not fit (e.g. a
+    # job description that is one long paragraph) is cut at token level.
+    if overflow is not None:
+        partial = []
+        for line in sections[overflow][1].splitlines():
+            cost = count_tokens(line) + 1
+            if cost > remaining:
+                partial.append(truncate_tokens(line, remaining - 1))
+                break
+            partial.append(line)
+            remaining -= cost
+        partial = "\n".join(partial).strip()
+        if partial:
+            kept[overflow] = partial
+
+    return "\n\n".join(kept[i] for i in sorted(kept))
+
+
+def token_budget(model_name):
+    budgets = settings.ANALYZER_PROMPT_TOKEN_BUDGETS
+    return budgets.get(model_name, budgets["default"])
+
+
+def record_compaction(model_name, before, after, plan):
+    PROMPT_TOKENS.inc(before, model=model_name, plan=plan, stage="before")
+    PROMPT_TOKENS.inc(after, model=model_name, plan=plan, stage="after")
+    logger.info("Input tokens for %s (%s plan): %d -> %d", model_name, plan, before, after)
+
+
+def compact_inputs(model_name, resume_text, job_description):
+    """Return compacted ``(resume_text, job_description)`` for ``model_name``."""
+    resume_budget, jd_budget = token_budget(model_name)
+    before = count_tokens(resume_text) + count_tokens(job_description)
+
+    resume_text = trim_to_budget(clean_text(resume_text), resume_budget)
+    job_description = trim_to_budget(clean_text(job_description), jd_budget)
+
+    after = count_tokens(resume_text) + count_tokens(job_description)
+    record_compaction(model_name, before, after, "full")
+    return resume_text, job_description
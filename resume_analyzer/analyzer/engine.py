@@ -0,0 +1,80 @@
+import asyncio
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# -------- Lazy analysis engine --------
+# Importing the LLM stack (portia, langchain, google-genai, ...) costs
+# seconds and tens of MB per process. Routes that never analyze (upload,
+# listing, detail, media, metrics) should not pay for it, so views, jobs
+# and streaming go through these functions, which import analyzer.utils and
+# analyzer.batch on first use. warmup() loads them ahead of time instead,
+# e.g. in the gunicorn master before it forks (see gunicorn.conf.py).
+
+_modules = {}
+_load_seconds = {}
+_lock = threading.Lock()
+
+
+def _load(name):
+    module = _modules.get(name)
+    if module is not None:
+        return module
+    with _lock:
+        module = _modules.get(name)
+        if module is None:
+            started = time.perf_counter()
+            module = importlib.import_module(f"{__package__}.{name}")
+            _load_seconds[name] = time.perf_counter() - started
+            logger.info("Loaded analysis engine module %s in %.2fs", name, _load_seconds[name])
+            _modules[name] = module
+    return module
+
+
+def analyze(resume_text, job_description, on_event=None):
+    """See ``analyzer.utils.analyze_resume_with_fallback``."""
+    return _load("utils").analyze_resume_with_fallback(resume_text, job_description, on_event=on_event)
+
+
+async def aanalyze(resume_text, job_description, on_event=None):
+    """See ``analyzer.utils.aanalyze_resume_with_fallback``."""
+    utils = _modules.get("utils") or await asyncio.to_thread(_load, "utils")
+    return await utils.aanalyze_resume_with_fallback(resume_text, job_description, on_event=on_event)
+
+
+def analyze_batch(shared_text, items, shared_is_resume=True):
+    """See ``analyzer.batch.analyze_batch``."""
+    return _load("batch").analyze_batch(shared_text, items, shared_is_resume=shared_is_resume)
+
+
+def fallback_models():
+    return list(_load("utils").FALLBACK_MODELS)
+
+
+def warmup(clients=False):
+    """
+    Import the engine and build the analysis plans now rather than on the
+    first request. Building ``clients`` opens connections and threads, so
+    only do it after the fork (post_worker_init), never in the master.
+    """
+    utils = _load("utils")
+    batch = _load("batch")
+    utils.build_resume_analysis_plan()
+    utils.build_section_analysis_plan()
+    batch.build_batch_plan("resume", "job description")
+    batch.build_batch_plan("job description", "resume")
+    if clients:
+        from .clients import warm_clients
+        warm_clients(utils.FALLBACK_MODELS)
+
+
+def is_loaded():
+    return "utils" in _modules
+
+
+def load_times():
+    return dict(_load_seconds)
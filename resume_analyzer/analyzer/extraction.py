@@ -0,0 +1,292 @@
+import io
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import PyPDF2
+import docx2txt
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# -------- Resume text extraction --------
+# Runs once per upload; the normalized text is stored on the TextDocument so
+# page views and analyses never have to re-parse the original file. Parsing
+# happens in a process pool so a pathological file can be killed without
+# taking a web worker's CPU or memory with it.
+
+class UnsupportedFormat(ValueError):
+    pass
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+# -------- Extractor registry --------
+
+_EXTRACTORS = {}
+
+
+def register_extractor(*extensions):
+    """Register ``func(file_path) -> (text, page_count)`` for the given extensions."""
+    def decorator(func):
+        for ext in extensions:
+            _EXTRACTORS[ext.lower().lstrip(".")] = func
+        return func
+    return decorator
+
+
+def supported_extensions():
+    return sorted(_EXTRACTORS)
+
+
+def _xml_text(xml):
+    # Paragraph-ish tags become line breaks, every other tag is dropped.
+    xml = re.sub(r"</(?:text:p|text:h|a:p|w:p|si)>", "\n", xml)
+    xml = re.sub(r"<[^>]+>", " ", xml)
+    for entity, char in (("&lt;", "<"), ("&gt;", ">"), ("&quot;", '"'), ("&apos;", "'"), ("&amp;", "&")):
+        xml = xml.replace(entity, char)
+    return xml
+
+
+def _zip_members_text(file_path, pattern):
+    with zipfile.ZipFile(file_path) as archive:
+        names = sorted(n for n in archive.namelist() if re.fullmatch(pattern, n))
+        parts = [_xml_text(archive.read(n).decode("utf-8", errors="ignore")) for n in names]
+    return "\n".join(parts), len(names)
+
+
+@register_extractor("txt")
+def extract_plain_text(file_path):
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        return f.read(), None
+
+
+@register_extractor("tex")
+def extract_tex(file_path):
+    text, _ = extract_plain_text(file_path)
+    text = re.sub(r"(?<!\\)%.*", "", text)                        # comments
+    text = re.sub(r"\\[a-zA-Z]+\*?(?:\[[^\]]*\])?", " ", text)     # commands
+    return text.replace("{", "").replace("}", ""), None
+
+
+@register_extractor("rtf")
+def extract_rtf(file_path):
+    text, _ = extract_plain_text(file_path)
+    # Drop font/colour tables and other non-text destinations first.
+    text = re.sub(r"\{\\(?:fonttbl|colortbl|stylesheet|info|\*)[^{}]*(?:\{[^{}]*\}[^{}]*)*\}", "", text)
+    text = re.sub(r"\\par[d]?\b", "\n", text)
+    text = re.sub(r"\\'[0-9a-fA-F]{2}", "", text)
+    text = re.sub(r"\\[a-zA-Z]+-?\d* ?", "", text)
+    return text.replace("{", "").replace("}", ""), None
+
+
+@register_extractor("pdf")
+def extract_pdf(file_path):
+    # Stream page by page instead of holding every page's text in a list.
+    buffer = io.StringIO()
+    page_count = 0
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        for page in reader.pages:
+            if page_count:
+                buffer.write("\n")
+            buffer.write(page.extract_text() or "")
+            page_count += 1
+    return buffer.getvalue(), page_count
+
+
+@register_extractor("docx")
+def extract_docx(file_path):
+    return docx2txt.process(file_path), None
+
+
+@register_extractor("odt")
+def extract_odt(file_path):
+    text, _ = _zip_members_text(file_path, r"content\.xml")
+    return text, None
+
+
+@register_extractor("pptx")
+def extract_pptx(file_path):
+    # One member per slide, so the slide count doubles as the page count.
+    return _zip_members_text(file_path, r"ppt/slides/slide\d+\.xml")
+
+
+@register_extractor("xlsx")
+def extract_xlsx(file_path):
+    text, _ = _zip_members_text(file_path, r"xl/sharedStrings\.xml")
+    return text, None
+
+
+def normalize_extracted_text(text):
+    """Tidy whitespace but keep line structure for the preview."""
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\x00", "")
+    lines = [re.sub(r"[ \t\f\v]+", " ", line).strip() for line in text.split("\n")]
+    text = "\n".join(lines)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def _extension(file_path):
+    return os.path.splitext(file_path)[1].lower().lstrip(".")
+
+
+def extract_text_inline(file_path):
+    """Run the registered extractor in the current process."""
+    ext = _extension(file_path)
+    extractor = _EXTRACTORS.get(ext)
+    if extractor is None:
+        raise UnsupportedFormat(f"Preview not supported for .{ext} files.")
+    text, page_count = extractor(file_path)
+    return normalize_extracted_text(text), page_count
+
+
+# -------- Process pool --------
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _limit_worker_memory(max_bytes):
+    if not max_bytes:
+        return
+    try:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, max_bytes))
+    except (ImportError, ValueError, OSError):
+        # Not available on this platform; the wall-clock limit still applies.
+        pass
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.EXTRACTION_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_limit_worker_memory,
+                initargs=(settings.EXTRACTION_MAX_MEMORY,),
+            )
+        return _pool
+
+
+def _discard_pool(pool):
+    """Kill ``pool``'s workers (e.g. one stuck on a huge PDF) and start fresh next time."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    for process in list((pool._processes or {}).values()):
+        process.kill()
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_text(file_path, timeout=None):
+    """Return ``(text, page_count)`` using the worker pool, within ``timeout`` seconds."""
+    if timeout is None:
+        timeout = settings.EXTRACTION_TIMEOUT
+
+    ext = _extension(file_path)
+    if ext not in _EXTRACTORS:
+        raise UnsupportedFormat(f"Preview not supported for .{ext} files.")
+
+    started = time.perf_counter()
+    ok = False
+    try:
+        for can_retry in (True, False):
+            pool = _get_pool()
+            future = pool.submit(extract_text_inline, file_path)
+            try:
+                result = future.result(timeout=timeout)
+                ok = True
+                return result
+            except TimeoutError:
+                _discard_pool(pool)
+                raise ExtractionTimeout(f"Extraction took longer than {timeout}s.")
+            except BrokenProcessPool:
+                # Either this file crashed its worker (e.g. hit the memory
+                # limit) or another thread killed the pool; retry once.
+                _discard_pool(pool)
+                if not can_retry:
+                    raise
+    finally:
+        _record(ext, file_path, time.perf_counter() - started, ok)
+
+
+# -------- Throughput stats --------
+
+_stats = defaultdict(lambda: {"documents": 0, "failures": 0, "bytes": 0, "seconds": 0.0})
+_stats_lock = threading.Lock()
+
+
+def _record(ext, file_path, seconds, ok):
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        size = 0
+    metrics.STAGE_SECONDS.observe(seconds, stage="extract", format=ext)
+    metrics.STAGE_TOTAL.inc(stage="extract", outcome="ok" if ok else "error", format=ext)
+    with _stats_lock:
+        entry = _stats[ext]
+        entry["documents"] += 1
+        entry["failures"] += 0 if ok else 1
+        entry["bytes"] += size
+        entry["seconds"] += seconds
+
+
+def extraction_stats():
+    with _stats_lock:
+        stats = {ext: dict(entry) for ext, entry in _stats.items()}
+    for entry in stats.values():
+        seconds = entry["seconds"] or 1e-9
+        entry["documents_per_second"] = entry["documents"] / seconds
+        entry["megabytes_per_second"] = entry["bytes"] / seconds / (1024 * 1024)
+    return stats
+
+
+def extract_document(doc, reuse=True):
+    """
+    Extract and store the text of ``doc``'s file.
+
+    With ``reuse``, text already extracted from an identical upload (same
+    content hash) is copied instead of parsing the file again. A failed
+    extraction stores empty text and is never copied, so a re-upload retries.
+    """
+    if reuse and doc.content_hash:
+        twin = (
+            type(doc).objects
+            .filter(content_hash=doc.content_hash, extraction_seconds__isnull=False)
+            .exclude(pk=doc.pk)
+            .exclude(extracted_text="")
+            .only("extracted_text", "page_count", "extraction_seconds")
+            .first()
+        )
+        if twin is not None:
+            doc.extracted_text, doc.page_count = twin.extracted_text, twin.page_count
+            doc.extraction_seconds = twin.extraction_seconds
+            doc.save(update_fields=["extracted_text", "page_count", "extraction_seconds"])
+            return doc.extracted_text
+
+    started = time.perf_counter()
+    try:
+        doc.extracted_text, doc.page_count = extract_text(doc.file.path)
+    except Exception as e:
+        logger.warning("Could not extract %s: %s", doc.file.name, e)
+        doc.extracted_text = ""
+        doc.page_count = None
+    doc.extraction_seconds = time.perf_counter() - started
+
+    doc.save(update_fields=["extracted_text", "page_count", "extraction_seconds"])
+    return doc.extracted_text
@@ -0,0 +1,321 @@
+import asyncio
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from .quota import QuotaExceeded, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+
+# -------- Model health tracking --------
+# Every attempt records its latency and outcome. A model whose recent error
+# rate is too high (or that reports quota exhaustion) gets its circuit opened
+# and is skipped until the cooldown expires.
+
+class ModelHealth:
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.latencies = deque(maxlen=settings.ANALYZER_HEALTH_WINDOW)
+        self.outcomes = deque(maxlen=settings.ANALYZER_HEALTH_WINDOW)
+        self.open_until = 0.0
+        self.half_open = False
+        self.lock = threading.Lock()
+
+    def available(self):
+        with self.lock:
+            if self.open_until == 0.0:
+                return True
+            if time.monotonic() < self.open_until or self.half_open:
+                return False
+            # Cooldown expired: let a single trial request through.
+            self.half_open = True
+            return True
+
+    def cancel_trial(self):
+        # The trial request never reached the model; let the next one try.
+        with self.lock:
+            self.half_open = False
+
+    def record_success(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            self.outcomes.append(True)
+            self.open_until = 0.0
+            self.half_open = False
+
+    def record_failure(self, latency, rate_limited=False, cooldown=None):
+        with self.lock:
+            self.latencies.append(latency)
+            self.outcomes.append(False)
+            failures = self.outcomes.count(False)
+            if (
+                rate_limited
+                or self.half_open
+                or (
+                    len(self.outcomes) >= settings.ANALYZER_CIRCUIT_MIN_SAMPLES
+                    and failures / len(self.outcomes) >= settings.ANALYZER_CIRCUIT_ERROR_RATE
+                )
+            ):
+                self.open_until = time.monotonic() + (cooldown or settings.ANALYZER_CIRCUIT_COOLDOWN)
+                self.half_open = False
+
+    def percentile(self, pct):
+        with self.lock:
+            ordered = sorted(self.latencies)
+        if not ordered:
+            return None
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self):
+        with self.lock:
+            total = len(self.outcomes)
+            error_rate = self.outcomes.count(False) / total if total else 0.0
+            circuit_open = time.monotonic() < self.open_until
+        return {
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "error_rate": error_rate,
+            "samples": total,
+            "circuit_open": circuit_open,
+        }
+
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def get_health(model_name):
+    with _health_lock:
+        if model_name not in _health:
+            _health[model_name] = ModelHealth(model_name)
+        return _health[model_name]
+
+
+def model_health_snapshot():
+    with _health_lock:
+        models = list(_health.values())
+    return {health.model_name: health.snapshot() for health in models}
+
+
+# "429 Too Many Requests", "HTTP 429: rate limit exceeded", ...
+_RATE_LIMITED_RE = re.compile(r"\b429\b.*\b(?:too many requests|rate[ _-]?limit)", re.IGNORECASE | re.DOTALL)
+
+
+def is_rate_limited(error):
+    # Imported here so the views can read model health without loading the
+    # Google client libraries (see analyzer.engine).
+    from google.api_core.exceptions import ResourceExhausted
+
+    if isinstance(error, ResourceExhausted):
+        return True
+    for attribute in ("code", "status_code", "status"):
+        if getattr(error, attribute, None) in (429, "429", "RESOURCE_EXHAUSTED"):
+            return True
+    # Portia/langchain sometimes re-wrap the Google error, so check the text
+    # too, but not for a bare "429", which may be a token count or an ID.
+    message = str(error)
+    return "RESOURCE_EXHAUSTED" in message or bool(_RATE_LIMITED_RE.search(message))
+
+
+# -------- Hedged fallback --------
+
+class AttemptFailed(Exception):
+    """Raised by an attempt when the model gave no usable answer."""
+
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.ANALYZER_ATTEMPT_THREADS, thread_name_prefix="model-attempt",
+)
+
+
+def hedge_budget(model_name):
+    """Seconds to wait on ``model_name`` before hedging to the next model."""
+    health = get_health(model_name)
+    p95 = health.percentile(95)
+    if p95 is None or len(health.latencies) < settings.ANALYZER_CIRCUIT_MIN_SAMPLES:
+        return settings.ANALYZER_HEDGE_AFTER
+    # Hedge early for a model that is usually fast, never later than the cap.
+    return min(settings.ANALYZER_HEDGE_AFTER, p95)
+
+
+def _record_outcome(health, error, seconds):
+    if error is None:
+        health.record_success(seconds)
+    elif isinstance(error, QuotaExceeded):
+        # Shed before calling the API; says nothing about the model's health.
+        health.cancel_trial()
+    elif isinstance(error, Exception):
+        if is_rate_limited(error):
+            # Keep the circuit open for as long as the API asked us to back off.
+            health.record_failure(seconds, rate_limited=True, cooldown=retry_after_seconds(error))
+        else:
+            health.record_failure(seconds)
+
+
+def _timed_attempt(attempt, model_name):
+    health = get_health(model_name)
+    started = time.perf_counter()
+    try:
+        result = attempt(model_name)
+    except Exception as e:
+        _record_outcome(health, e, time.perf_counter() - started)
+        raise
+    _record_outcome(health, None, time.perf_counter() - started)
+    return result
+
+
+def _submit(attempt, model_name):
+    # Run in a copy of the caller's context so the trace ID follows the attempt.
+    return _executor.submit(contextvars.copy_context().run, _timed_attempt, attempt, model_name)
+
+
+def run_with_fallback(models, attempt, on_event=None):
+    """
+    Call ``attempt(model_name)`` on the healthy models in order.
+
+    The next model is started as soon as the current one fails, or as a hedge
+    once it has been running longer than its latency budget. The first
+    successful result wins. ``attempt`` raises to signal failure.
+    ``on_event(name, data)`` is told about each attempt, hedge and failure.
+    """
+    notify = on_event or (lambda name, data: None)
+    remaining = deque(models)
+    pending = {}
+
+    def launch():
+        # Availability is checked lazily so a half-open circuit only admits
+        # its trial request when that model is really called.
+        while remaining:
+            model_name = remaining.popleft()
+            if get_health(model_name).available():
+                logger.info("Attempting with %s ...", model_name)
+                notify("attempt", {"model": model_name})
+                pending[_submit(attempt, model_name)] = model_name
+                return True
+        return False
+
+    if not launch():
+        # Every circuit is open: better to try than to fail without asking.
+        remaining.extend(models)
+        model_name = remaining.popleft()
+        logger.info("Attempting with %s (all circuits open) ...", model_name)
+        notify("attempt", {"model": model_name})
+        pending[_submit(attempt, model_name)] = model_name
+
+    while pending:
+        newest = next(reversed(pending.values()))
+        budget = hedge_budget(newest) if remaining else None
+        done, _ = wait(pending, timeout=budget, return_when=FIRST_COMPLETED)
+
+        if not done:
+            logger.info("%s over budget, hedging ...", ", ".join(pending.values()))
+            notify("hedge", {"slow_models": list(pending.values())})
+            launch()
+            continue
+
+        for future in done:
+            model_name = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.warning("%s failed: %s", model_name, e)
+                notify("model_failed", {"model": model_name, "error": str(e)})
+                continue
+            return model_name, result
+
+        if remaining:
+            launch()
+
+    return None, None
+
+
+# -------- Hedged fallback (asyncio) --------
+# The same policy for the async analysis path: attempts are coroutines, so
+# hundreds of in-flight analyses cost tasks rather than threads.
+
+_background = set()
+
+
+def _forget(task):
+    _background.discard(task)
+    if not task.cancelled():
+        task.exception()  # already logged and recorded in model health
+
+
+async def _atimed_attempt(attempt, model_name):
+    health = get_health(model_name)
+    started = time.perf_counter()
+    try:
+        result = await attempt(model_name)
+    except Exception as e:
+        _record_outcome(health, e, time.perf_counter() - started)
+        raise
+    _record_outcome(health, None, time.perf_counter() - started)
+    return result
+
+
+async def arun_with_fallback(models, attempt, on_event=None):
+    """``run_with_fallback`` for an async ``attempt(model_name)`` coroutine function."""
+    notify = on_event or (lambda name, data: None)
+    remaining = deque(models)
+    pending = {}
+
+    def start(model_name, note=""):
+        logger.info("Attempting with %s%s ...", model_name, note)
+        notify("attempt", {"model": model_name})
+        # Tasks copy the current context, so the trace ID follows the attempt.
+        pending[asyncio.ensure_future(_atimed_attempt(attempt, model_name))] = model_name
+
+    def launch():
+        while remaining:
+            model_name = remaining.popleft()
+            if get_health(model_name).available():
+                start(model_name)
+                return True
+        return False
+
+    if not launch():
+        remaining.extend(models)
+        start(remaining.popleft(), " (all circuits open)")
+
+    try:
+        while pending:
+            newest = next(reversed(pending.values()))
+            budget = hedge_budget(newest) if remaining else None
+            done, _ = await asyncio.wait(pending, timeout=budget, return_when=asyncio.FIRST_COMPLETED)
+
+            if not done:
+                logger.info("%s over budget, hedging ...", ", ".join(pending.values()))
+                notify("hedge", {"slow_models": list(pending.values())})
+                launch()
+                continue
+
+            for task in done:
+                model_name = pending.pop(task)
+                try:
+                    result = task.result()
+                except Exception as e:
+                    logger.warning("%s failed: %s", model_name, e)
+                    notify("model_failed", {"model": model_name, "error": str(e)})
+                    continue
+                return model_name, result
+
+            if remaining:
+                launch()
+    finally:
+        # Like the threaded version, losing hedges finish in the background
+        # (their outcome still feeds model health); keep them referenced.
+        for task in pending:
+            _background.add(task)
+            task.add_done_callback(_forget)
+
+    return None, None
@@ -1,4 +1,5 @@
 from django import forms
+from django.conf import settings
 from .models import TextDocument
 
 class TextDocumentForm(forms.ModelForm):
@@ -13,12 +14,19 @@ class TextDocumentForm(forms.ModelForm):
         model = TextDocument
         fields = ('file', 'job_description')
 
+    def __init__(self, *args, upload_hashes=None, upload_errors=None, **kwargs):
+        # Filled in by analyzer.uploads.HashingUploadHandler while the request streamed in
+        self.upload_hashes = upload_hashes or {}
+        self.upload_errors = upload_errors or {}
+        super().__init__(*args, **kwargs)
+
     def clean_file(self):
         f = self.cleaned_data['file']
 
-        # 1. Size limit (e.g., 5 MB)
-        if f.size > 5 * 1024 * 1024:  # 5 MB
-            raise forms.ValidationError('File too large (max 5 MB).')
+        # 1. Size limit (normally already enforced while streaming)
+        if f.size > settings.UPLOAD_MAX_BYTES:
+            limit_mb = settings.UPLOAD_MAX_BYTES // (1024 * 1024)
+            raise forms.ValidationError(f'File too large (max {limit_mb} MB).')
 
         # 2. Optional: double-check allowed extensions
         valid_extensions = [
@@ -31,3 +39,19 @@ class TextDocumentForm(forms.ModelForm):
             raise forms.ValidationError(f'Unsupported file type: .{ext}')
 
         return f
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field, error in self.upload_errors.items():
+            # The file was dropped mid-upload; "This field is required" would be misleading.
+            self.errors.pop(field, None)
+            self.add_error(field, error)
+        return cleaned_data
+
+    def save(self, commit=True):
+        doc = super().save(commit=False)
+        doc.original_name = self.cleaned_data['file'].name
+        doc.content_hash = self.upload_hashes.get('file', '')
+        if commit:
+            doc.save()
+        return doc
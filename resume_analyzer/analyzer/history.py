@@ -0,0 +1,172 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Q
+
+from . import metrics
+from .listing import decode_cursor, encode_cursor
+from .models import AnalysisResult
+
+logger = logging.getLogger(__name__)
+
+
+# -------- Analysis result history --------
+# Every finished analysis of a document is kept as an AnalysisResult, so the
+# detail page can show the latest one without paying for the analysis again.
+# Results are queued in memory and one background thread per process writes
+# them with bulk inserts, so recording a result never puts a database write
+# on the path of the request (or SSE stream) that produced it.
+
+RESULT_WRITES = metrics.counter(
+    "analyzer_result_writes_total", "Analysis results written to the history, by outcome: ok, error."
+)
+
+_pending = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class ResultRecorder:
+    """
+    ``on_event`` callback that notes how an analysis was answered (model,
+    prompt version, token counts), then passes events on to ``forward``.
+    """
+
+    def __init__(self, forward=None):
+        self.forward = forward
+        self.started = time.perf_counter()
+        self.meta = {"answered_by": AnalysisResult.LLM}
+
+    def __call__(self, name, data):
+        if name == "success":
+            self.meta.update(
+                model_name=data["model"], prompt_version=data.get("prompt_version", ""),
+                tokens_in=data.get("tokens_in"), tokens_out=data.get("tokens_out"),
+            )
+        elif name == "cache_hit":
+            self.meta.update(
+                answered_by=AnalysisResult.CACHE, model_name=data["model"],
+                prompt_version=data.get("prompt_version", ""),
+            )
+        elif name == "near_duplicate":
+            self.meta.update(
+                answered_by=AnalysisResult.NEAR_DUPLICATE, model_name=data["model"],
+                prompt_version=data["prompt_version"],
+            )
+        elif name == "local_only":
+            self.meta.update(answered_by=AnalysisResult.LOCAL, model_name="local")
+        elif name == "coalesced":
+            self.meta["answered_by"] = AnalysisResult.COALESCED
+        if self.forward is not None:
+            self.forward(name, data)
+
+    def record(self, document_id, result):
+        record(document_id, result, latency_seconds=time.perf_counter() - self.started, **self.meta)
+
+
+def record(document_id, result, **meta):
+    """Queue ``result`` (a ResumeMatchResult dict) to be stored for the document."""
+    _pending.put(AnalysisResult(
+        document_id=document_id,
+        match_score=result.get("match_score", 0),
+        strengths=result.get("strengths", []),
+        missing_keywords=result.get("missing_keywords", []),
+        improvement_tips=result.get("improvement_tips", []),
+        schedule_plan_to_improve=result.get("schedule_plan_to_improve", []),
+        **meta,
+    ))
+    _ensure_writer()
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _writer_lock:
+        # A forked worker inherits the object but not the thread.
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_write_forever, name="analysis-results", daemon=True)
+            _writer.start()
+
+
+def _next_batch():
+    """Block for one result, then gather more for up to ANALYSIS_RESULT_FLUSH_SECONDS."""
+    batch = [_pending.get()]
+    deadline = time.monotonic() + settings.ANALYSIS_RESULT_FLUSH_SECONDS
+    while len(batch) < settings.ANALYSIS_RESULT_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_pending.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write_forever():
+    while True:
+        batch = _next_batch()
+        close_old_connections()
+        try:
+            AnalysisResult.objects.bulk_create(batch)
+            RESULT_WRITES.inc(len(batch), outcome="ok")
+        except DatabaseError:
+            # Losing history is better than holding results in memory forever.
+            RESULT_WRITES.inc(len(batch), outcome="error")
+            logger.exception("Could not store %d analysis result(s)", len(batch))
+        finally:
+            close_old_connections()
+            for _ in batch:
+                _pending.task_done()
+
+
+def flush(timeout=None):
+    """Wait until every queued result is written; False if ``timeout`` ran out first."""
+    with _pending.all_tasks_done:
+        return _pending.all_tasks_done.wait_for(lambda: not _pending.unfinished_tasks, timeout)
+
+
+# Short-lived processes (management commands) write what they queued before exiting.
+atexit.register(flush, 10)
+
+
+# -------- Reading the history --------
+def latest_result(document_id):
+    return (
+        AnalysisResult.objects.filter(document_id=document_id)
+        .order_by('-created_at', '-id')
+        .first()
+    )
+
+
+def results_page(document_id, cursor=None, size=None):
+    """Return ``(results, next_cursor)``, newest first, keyset-paged like the uploads listing."""
+    size = size or settings.ANALYSIS_RESULT_PAGE_SIZE
+    queryset = AnalysisResult.objects.filter(document_id=document_id).order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    results = list(queryset[:size + 1])
+    if len(results) > size:
+        return results[:size], encode_cursor(results[size - 1], 'created_at')
+    return results, None
+
+
+def history_entry(result):
+    return {
+        "id": result.pk,
+        "created_at": result.created_at,
+        "answered_by": result.answered_by,
+        "model": result.model_name,
+        "prompt_version": result.prompt_version,
+        "latency_seconds": result.latency_seconds,
+        "tokens_in": result.tokens_in,
+        "tokens_out": result.tokens_out,
+        "result": result.as_result(),
+    }
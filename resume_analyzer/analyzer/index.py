@@ -0,0 +1,329 @@
+import json
+import os
+import shutil
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+
+from .prescore import tokenize
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+# -------- Incremental inverted index over stored resumes --------
+# The index is a memory-mapped base segment plus an append-only delta log.
+# Each upload appends one line to the delta; once the delta log grows past
+# RESUME_INDEX_MERGE_BYTES it is merged into a new base segment.
+#
+# Base segment layout (all .npy, opened with mmap_mode="r"):
+#   terms     sorted vocabulary
+#   offsets   postings for terms[i] are postings[offsets[i]:offsets[i + 1]]
+#   postings  document row numbers
+#   tfs       term frequency for each posting
+#   doc_ids   TextDocument primary key for each row
+#   doc_lens  token count for each row
+
+K1 = 1.2
+B = 0.75
+
+_thread_lock = threading.Lock()
+
+
+def _index_dir():
+    path = settings.RESUME_INDEX_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@contextmanager
+def _locked(exclusive=True):
+    """Serialize writers across threads and worker processes."""
+    with _thread_lock:
+        with open(os.path.join(_index_dir(), "lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _current_segment():
+    try:
+        with open(os.path.join(_index_dir(), "CURRENT")) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _delta_path():
+    return os.path.join(_index_dir(), "delta.jsonl")
+
+
+# -------- Writing --------
+
+def add_document(doc_id, text):
+    """Append a document to the delta log (re-adding a pk replaces it)."""
+    add_documents([(doc_id, text)])
+
+
+def add_documents(documents):
+    """Append ``(doc_id, text)`` pairs to the delta log under one lock."""
+    lines = []
+    for doc_id, text in documents:
+        tokens = tokenize(text)
+        lines.append(json.dumps({"id": doc_id, "len": len(tokens), "tf": Counter(tokens)}) + "\n")
+    if not lines:
+        return
+    with _locked():
+        with open(_delta_path(), "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            pending = f.tell()
+
+    # Merge in the background once the delta log has grown large.
+    if pending > settings.RESUME_INDEX_MERGE_BYTES:
+        threading.Thread(target=merge_delta, daemon=True).start()
+
+
+def _flatten(docs):
+    """Turn ``{doc_id: (length, Counter)}`` into a vocabulary and posting arrays."""
+    doc_ids = np.array(sorted(docs), dtype=np.int64)
+    doc_lens = np.array([docs[d][0] for d in doc_ids], dtype=np.float32)
+    vocab, term_idx, rows, tfs = {}, [], [], []
+    for row, doc_id in enumerate(doc_ids):
+        for term, tf in docs[int(doc_id)][1].items():
+            term_idx.append(vocab.setdefault(term, len(vocab)))
+            rows.append(row)
+            tfs.append(tf)
+    # Renumber so the vocabulary is sorted (needed for binary search).
+    terms = np.array(list(vocab), dtype=str)
+    order = np.argsort(terms)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    return (
+        terms[order],
+        rank[np.array(term_idx, dtype=np.int64)],
+        np.array(rows, dtype=np.int64),
+        np.array(tfs, dtype=np.float32),
+        doc_ids,
+        doc_lens,
+    )
+
+
+def _write_segment(terms, term_idx, rows, tfs, doc_ids, doc_lens):
+    """Write postings ``(terms[term_idx], rows, tfs)`` as a new base segment and make it current."""
+    # Sort postings by term, then row, using one integer key.
+    order = np.argsort(term_idx * max(len(doc_ids), 1) + rows)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_idx, minlength=len(terms)), out=offsets[1:])
+
+    previous = _current_segment()
+    name = f"segment-{int(previous.split('-')[1]) + 1 if previous else 1}"
+    tmp_path = os.path.join(_index_dir(), name + ".tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    np.save(os.path.join(tmp_path, "terms.npy"), terms)
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    np.save(os.path.join(tmp_path, "postings.npy"), rows[order].astype(np.int32))
+    np.save(os.path.join(tmp_path, "tfs.npy"), tfs[order].astype(np.float32))
+    np.save(os.path.join(tmp_path, "doc_ids.npy"), doc_ids)
+    np.save(os.path.join(tmp_path, "doc_lens.npy"), doc_lens.astype(np.float32))
+    os.replace(tmp_path, os.path.join(_index_dir(), name))
+
+    current_tmp = os.path.join(_index_dir(), "CURRENT.tmp")
+    with open(current_tmp, "w") as f:
+        f.write(name)
+    os.replace(current_tmp, os.path.join(_index_dir(), "CURRENT"))
+
+    if previous:
+        # Readers that still have the old files mapped keep working on Linux.
+        shutil.rmtree(os.path.join(_index_dir(), previous), ignore_errors=True)
+
+
+def _read_delta_file():
+    docs = {}
+    try:
+        with open(_delta_path(), encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    docs[entry["id"]] = (entry["len"], Counter(entry["tf"]))
+    except FileNotFoundError:
+        pass
+    return docs
+
+
+def merge_delta():
+    """Fold the delta log into a new base segment."""
+    with _locked():
+        delta = _read_delta_file()
+        if not delta:
+            return
+        segment = _load_segment(_current_segment())
+        new_terms, new_term_idx, new_rows, new_tfs, new_ids, new_lens = _flatten(delta)
+
+        if segment is not None:
+            # Expand the base postings, dropping documents the delta replaces.
+            keep_doc = ~np.isin(segment.doc_ids, new_ids)
+            base_term_idx = np.repeat(np.arange(len(segment.terms)), np.diff(segment.offsets))
+            base_rows = np.asarray(segment.postings, dtype=np.int64)
+            keep = keep_doc[base_rows]
+
+            doc_ids = np.concatenate([np.asarray(segment.doc_ids)[keep_doc], new_ids])
+            doc_lens = np.concatenate([np.asarray(segment.doc_lens)[keep_doc], new_lens])
+            order = np.argsort(doc_ids, kind="stable")
+            doc_ids, doc_lens = doc_ids[order], doc_lens[order]
+
+            # Merge the vocabularies and renumber both sides' term indexes.
+            terms = np.union1d(np.asarray(segment.terms), new_terms)
+            term_idx = np.concatenate([
+                np.searchsorted(terms, segment.terms)[base_term_idx[keep]],
+                np.searchsorted(terms, new_terms)[new_term_idx],
+            ])
+            posting_ids = np.concatenate([np.asarray(segment.doc_ids)[base_rows[keep]], new_ids[new_rows]])
+            rows = np.searchsorted(doc_ids, posting_ids)
+            tfs = np.concatenate([np.asarray(segment.tfs)[keep], new_tfs])
+        else:
+            terms, term_idx, rows, tfs, doc_ids, doc_lens = (
+                new_terms, new_term_idx, new_rows, new_tfs, new_ids, new_lens
+            )
+
+        _write_segment(terms, term_idx, rows, tfs, doc_ids, doc_lens)
+        open(_delta_path(), "w").close()
+
+
+def rebuild(documents):
+    """Replace the whole index with ``(doc_id, text)`` pairs."""
+    docs = {}
+    for doc_id, text in documents:
+        tokens = tokenize(text)
+        docs[doc_id] = (len(tokens), Counter(tokens))
+    with _locked():
+        _write_segment(*_flatten(docs))
+        open(_delta_path(), "w").close()
+    return len(docs)
+
+
+# -------- Reading --------
+
+class _Segment:
+    def __init__(self, path):
+        def load(name):
+            return np.load(os.path.join(path, name + ".npy"), mmap_mode="r")
+
+        self.terms = load("terms")
+        self.offsets = load("offsets")
+        self.postings = load("postings")
+        self.tfs = load("tfs")
+        self.doc_ids = load("doc_ids")
+        self.doc_lens = load("doc_lens")
+
+    def lookup(self, term):
+        i = int(np.searchsorted(self.terms, term))
+        if i < len(self.terms) and self.terms[i] == term:
+            start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+            return self.postings[start:end], self.tfs[start:end]
+        return None, None
+
+
+_segment_cache = {}
+_delta_cache = {"segment": None, "offset": 0, "docs": {}}
+
+
+def _load_segment(name):
+    if not name:
+        return None
+    if name not in _segment_cache:
+        _segment_cache.clear()
+        _segment_cache[name] = _Segment(os.path.join(_index_dir(), name))
+    return _segment_cache[name]
+
+
+def _read_delta(segment_name):
+    """Read only the delta lines appended since the last query in this process."""
+    cache = _delta_cache
+    try:
+        size = os.path.getsize(_delta_path())
+    except FileNotFoundError:
+        size = 0
+    if cache["segment"] != segment_name or size < cache["offset"]:
+        # A merge happened: the delta was folded into a new base segment.
+        cache.update(segment=segment_name, offset=0, docs={})
+    if size > cache["offset"]:
+        with open(_delta_path(), "rb") as f:
+            f.seek(cache["offset"])
+            chunk = f.read(size - cache["offset"])
+        complete = chunk[:chunk.rfind(b"\n") + 1]
+        for line in complete.decode("utf-8").splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                cache["docs"][entry["id"]] = (entry["len"], Counter(entry["tf"]))
+        cache["offset"] += len(complete)
+    return cache["docs"]
+
+
+def search(query_text, k=20):
+    """Return ``[(doc_id, score), ...]`` of the ``k`` best BM25 matches."""
+    query_terms = set(tokenize(query_text))
+    if not query_terms:
+        return []
+
+    with _locked(exclusive=False):
+        segment_name = _current_segment()
+        segment = _load_segment(segment_name)
+        delta = dict(_read_delta(segment_name))
+
+    base_count = len(segment.doc_ids) if segment is not None else 0
+    base_lens = np.asarray(segment.doc_lens) if segment is not None else np.zeros(0)
+    # Documents re-added through the delta shadow their base rows.
+    shadowed = np.isin(segment.doc_ids, list(delta)) if segment is not None and delta else None
+
+    total_docs = base_count + len(delta) - (int(shadowed.sum()) if shadowed is not None else 0)
+    if total_docs == 0:
+        return []
+    total_len = float(base_lens.sum()) + sum(length for length, _ in delta.values())
+    avg_len = total_len / (base_count + len(delta)) or 1.0
+
+    base_scores = np.zeros(base_count, dtype=np.float64)
+    delta_ids = list(delta)
+    delta_scores = np.zeros(len(delta_ids))
+    delta_lens = np.array([delta[d][0] for d in delta_ids], dtype=np.float64)
+
+    for term in query_terms:
+        rows, tfs = segment.lookup(term) if segment is not None else (None, None)
+        delta_tf = np.array([delta[d][1].get(term, 0) for d in delta_ids], dtype=np.float64)
+        df = (len(rows) if rows is not None else 0) + int((delta_tf > 0).sum())
+        if df == 0:
+            continue
+        idf = np.log1p((total_docs - df + 0.5) / (df + 0.5))
+
+        if rows is not None and len(rows):
+            tfs = np.asarray(tfs, dtype=np.float64)
+            norm = K1 * (1 - B + B * base_lens[rows] / avg_len)
+            np.add.at(base_scores, rows, idf * tfs * (K1 + 1) / (tfs + norm))
+
+        if delta_ids:
+            norm = K1 * (1 - B + B * delta_lens / avg_len)
+            delta_scores += idf * delta_tf * (K1 + 1) / (delta_tf + norm)
+
+    if shadowed is not None:
+        base_scores[shadowed] = 0.0
+
+    doc_ids = np.concatenate([
+        np.asarray(segment.doc_ids) if segment is not None else np.zeros(0, dtype=np.int64),
+        np.array(delta_ids, dtype=np.int64),
+    ])
+    scores = np.concatenate([base_scores, delta_scores])
+
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return [(int(doc_ids[i]), float(scores[i])) for i in top if scores[i] > 0]
@@ -0,0 +1,261 @@
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from . import engine, history, metrics, quota
+from .extraction import extract_document
+from .models import AnalysisJob, BatchAnalysisJob, TextDocument
+
+
+# -------- Background analysis jobs --------
+# Analyses run on a small per-process thread pool so a slow LLM chain never
+# holds a web worker. Job state lives in the database, so any worker can
+# answer status polls and `manage.py process_analysis_jobs` can pick up jobs
+# left behind by a restarted process. Batch comparisons (analyzer.batch) run
+# the same way as BatchAnalysisJobs.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class QueueFull(Exception):
+    pass
+
+
+# -------- Progress events --------
+# Streaming responses (analyzer.streaming) subscribe to the progress events
+# of a job. Events only reach subscribers in the process that runs the job,
+# so the job's row stays the source of truth for its status and result.
+
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+
+
+def subscribe(job_id):
+    """A queue that receives ``(name, data)`` progress events of the job."""
+    events = queue.Queue()
+    with _subscribers_lock:
+        _subscribers.setdefault(job_id, []).append(events)
+    return events
+
+
+def unsubscribe(job_id, events):
+    with _subscribers_lock:
+        listeners = _subscribers.get(job_id, [])
+        if events in listeners:
+            listeners.remove(events)
+        if not listeners:
+            _subscribers.pop(job_id, None)
+
+
+def _publish(job_id, name, data):
+    with _subscribers_lock:
+        listeners = list(_subscribers.get(job_id, ()))
+    for events in listeners:
+        events.put((name, data))
+
+
+def _save_status(job, *fields):
+    job.save(update_fields=["status", *fields, "updated_at"])
+    _publish(job.pk, "job_status", {"status": job.status, "attempts": job.attempts})
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.ANALYSIS_JOB_WORKERS,
+                    thread_name_prefix="analysis-job",
+                )
+    return _executor
+
+
+def _admit():
+    """Raise QueueFull unless there is room for another job."""
+    active = [AnalysisJob.QUEUED, AnalysisJob.RUNNING]
+    pending = (
+        AnalysisJob.objects.filter(status__in=active).count()
+        + BatchAnalysisJob.objects.filter(status__in=active).count()
+    )
+    if pending >= settings.ANALYSIS_JOB_MAX_PENDING:
+        raise QueueFull("Too many analyses in progress, please try again shortly.")
+    if quota.queue_depth() >= settings.ANALYZER_QUOTA_MAX_QUEUE:
+        # Every model is at its quota ceiling; more work would only wait.
+        raise QueueFull("The analyzer is at its model quota, please try again shortly.")
+
+
+def enqueue_analysis(doc):
+    # An identical upload is answered from the prompt-versioned result cache
+    # by the job itself, which also records the result for this document.
+    _admit()
+    job = AnalysisJob.objects.create(document=doc)
+    trace_id = metrics.current_trace_id()
+    transaction.on_commit(lambda: get_executor().submit(run_job, job.pk, trace_id))
+    return job
+
+
+def _claim(job_id):
+    """Atomically move a queued job to running; False if someone else has it."""
+    claimed = AnalysisJob.objects.filter(pk=job_id, status=AnalysisJob.QUEUED).update(
+        status=AnalysisJob.RUNNING, attempts=F("attempts") + 1
+    )
+    return claimed == 1
+
+
+def run_job(job_id, trace_id=None):
+    # Log under the trace ID of the request that queued the job, if any.
+    trace_id = trace_id or metrics.new_trace_id()
+    with metrics.bind_trace(trace_id):
+        retry_in = _run_job(job_id)
+    if retry_in is not None:
+        _schedule_retry(job_id, trace_id, retry_in)
+
+
+def _schedule_retry(job_id, trace_id, delay):
+    # A timer rather than a sleep, so the backoff does not hold a pool thread.
+    timer = threading.Timer(delay, lambda: get_executor().submit(run_job, job_id, trace_id))
+    timer.daemon = True
+    timer.start()
+
+
+def _run_job(job_id):
+    """Run one attempt of a queued job; return the seconds to wait before retrying, or None."""
+    close_old_connections()
+    try:
+        if not _claim(job_id):
+            return None
+        job = AnalysisJob.objects.select_related("document").get(pk=job_id)
+        doc = job.document
+
+        resume_text = doc.extracted_text if doc.is_extracted else extract_document(doc)
+        if not resume_text.strip():
+            # Retrying cannot help when the file has no readable text.
+            job.status, job.error = AnalysisJob.FAILED, "No text could be extracted from this file."
+            _save_status(job, "error")
+            return None
+
+        recorder = history.ResultRecorder(forward=functools.partial(_publish, job_id))
+        try:
+            result = engine.analyze(resume_text, doc.job_description, on_event=recorder)
+            error = "" if result else "No result from analyzer"
+        except Exception as e:
+            result, error = None, str(e)
+
+        if result:
+            job.status, job.result, job.error = AnalysisJob.SUCCEEDED, result, ""
+            _save_status(job, "result", "error")
+            recorder.record(doc.pk, result)
+            return None
+
+        if job.attempts >= settings.ANALYSIS_JOB_MAX_ATTEMPTS:
+            job.status, job.error = AnalysisJob.FAILED, error
+            _save_status(job, "error")
+            return None
+
+        # Put the job back and retry after a linear backoff.
+        job.status, job.error = AnalysisJob.QUEUED, error
+        _save_status(job, "error")
+        return settings.ANALYSIS_JOB_RETRY_DELAY * job.attempts
+    finally:
+        close_old_connections()
+
+
+def _run_until_done(job_id):
+    # A management command has no requests to serve, so it waits out the backoff.
+    with metrics.bind_trace(metrics.new_trace_id()):
+        retry_in = _run_job(job_id)
+        while retry_in is not None:
+            time.sleep(retry_in)
+            retry_in = _run_job(job_id)
+
+
+# -------- Batch jobs --------
+
+def enqueue_batch(document=None, job_description="", items=()):
+    """
+    Queue a comparison of ``document`` with the job descriptions in ``items``,
+    or of ``job_description`` with the documents whose ids are in ``items``.
+    """
+    _admit()
+    job = BatchAnalysisJob.objects.create(document=document, job_description=job_description, items=list(items))
+    trace_id = metrics.current_trace_id()
+    transaction.on_commit(lambda: get_executor().submit(run_batch_job, job.pk, trace_id))
+    return job
+
+
+def _batch_inputs(job):
+    """Return ``(shared_text, texts, labels)`` for a batch job."""
+    if job.shared_is_resume:
+        doc = job.document
+        resume_text = doc.extracted_text if doc.is_extracted else extract_document(doc)
+        labels = [{"job_description_index": i} for i in range(len(job.items))]
+        return resume_text, [str(jd) for jd in job.items], labels
+
+    docs = TextDocument.objects.in_bulk(job.items)
+    ordered = [docs[pk] for pk in job.items if pk in docs]  # skip documents deleted since
+    texts = [d.extracted_text if d.is_extracted else extract_document(d) for d in ordered]
+    return job.job_description, texts, [{"doc_id": d.pk} for d in ordered]
+
+
+def run_batch_job(job_id, trace_id=None):
+    with metrics.bind_trace(trace_id or metrics.new_trace_id()):
+        _run_batch_job(job_id)
+
+
+def _run_batch_job(job_id):
+    close_old_connections()
+    try:
+        claimed = BatchAnalysisJob.objects.filter(pk=job_id, status=AnalysisJob.QUEUED).update(
+            status=AnalysisJob.RUNNING
+        )
+        if not claimed:
+            return
+        job = BatchAnalysisJob.objects.select_related("document").get(pk=job_id)
+
+        # Items every model failed for come back as null; the batch itself
+        # is not retried, as that would repeat the items that succeeded.
+        try:
+            shared_text, texts, labels = _batch_inputs(job)
+            if job.shared_is_resume and not shared_text.strip():
+                raise ValueError("No text could be extracted from this file.")
+            results = engine.analyze_batch(shared_text, texts, shared_is_resume=job.shared_is_resume)
+        except Exception as e:
+            job.status, job.error = AnalysisJob.FAILED, str(e)
+            job.save(update_fields=["status", "error", "updated_at"])
+            return
+
+        job.status = AnalysisJob.SUCCEEDED
+        job.results = [
+            dict(label, result=result.model_dump() if result else None)
+            for label, result in zip(labels, results)
+        ]
+        job.save(update_fields=["status", "results", "updated_at"])
+    finally:
+        close_old_connections()
+
+
+def run_pending_jobs():
+    """Run every queued job in this process, returning how many were picked up."""
+    job_ids = list(
+        AnalysisJob.objects.filter(status=AnalysisJob.QUEUED)
+        .order_by("created_at")
+        .values_list("pk", flat=True)
+    )
+    batch_ids = list(
+        BatchAnalysisJob.objects.filter(status=AnalysisJob.QUEUED)
+        .order_by("created_at")
+        .values_list("pk", flat=True)
+    )
+    futures = [get_executor().submit(_run_until_done, job_id) for job_id in job_ids]
+    futures += [get_executor().submit(run_batch_job, job_id) for job_id in batch_ids]
+    for future in futures:
+        future.result()
+    return len(job_ids) + len(batch_ids)
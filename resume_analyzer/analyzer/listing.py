@@ -0,0 +1,91 @@
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.db.models.functions import Substr
+
+from .models import TextDocument
+
+
+# -------- Keyset pagination over uploads --------
+# Pages are addressed by the (uploaded_at, id) of the last row shown instead
+# of an OFFSET, so every page is an index range scan on
+# textdoc_uploaded_id_idx no matter how deep into the listing it is.
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row, field='uploaded_at'):
+    raw = f"{getattr(row, field).isoformat()}|{row.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def listing_queryset():
+    """Only the columns the listing shows, plus a short job description preview."""
+    return (
+        TextDocument.objects
+        .only('id', 'file', 'original_name', 'uploaded_at')
+        .annotate(jd_preview=Substr('job_description', 1, settings.FILES_JD_PREVIEW_CHARS + 1))
+        .order_by('-uploaded_at', '-id')
+    )
+
+
+def keyset_page(cursor=None, size=None):
+    """Return ``(documents, next_cursor)``; ``next_cursor`` is None on the last page."""
+    size = size or settings.FILES_PAGE_SIZE
+    queryset = listing_queryset()
+    if cursor:
+        uploaded_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(uploaded_at__lt=uploaded_at) | Q(uploaded_at=uploaded_at, id__lt=pk)
+        )
+    # One extra row tells us whether there is a next page without a COUNT.
+    docs = list(queryset[:size + 1])
+    if len(docs) > size:
+        return docs[:size], encode_cursor(docs[size - 1])
+    return docs, None
+
+
+def listing_entry(doc):
+    return {
+        "id": doc.pk,
+        "file_name": doc.display_name,
+        "uploaded_at": doc.uploaded_at,
+        "job_description_preview": doc.jd_preview[:settings.FILES_JD_PREVIEW_CHARS] if doc.jd_preview else None,
+        "job_description_truncated": bool(doc.jd_preview) and len(doc.jd_preview) > settings.FILES_JD_PREVIEW_CHARS,
+    }
+
+
+def stream_listing(cursor=None, limit=None):
+    """
+    Yield a JSON document listing up to ``limit`` uploads after ``cursor``.
+
+    Rows are fetched one keyset page at a time and written out as they are
+    read, so memory stays flat however many rows are requested.
+    """
+    encoder = DjangoJSONEncoder()
+    limit = min(limit or settings.FILES_PAGE_SIZE, settings.FILES_API_MAX_LIMIT)
+
+    yield '{"status": "success", "files": ['
+    sent = 0
+    while sent < limit:
+        docs, cursor = keyset_page(cursor, min(settings.FILES_PAGE_SIZE, limit - sent))
+        for doc in docs:
+            yield ("," if sent else "") + encoder.encode(listing_entry(doc))
+            sent += 1
+        if cursor is None:
+            break
+    yield f'], "next_cursor": {json.dumps(cursor)}}}'
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from analyzer import index
+from analyzer.extraction import extract_document
+from analyzer.models import TextDocument
+
+
+class Command(BaseCommand):
+    help = "Extract and store text for documents uploaded before extraction ran at upload time."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Re-extract every document, not only the ones missing text.",
+        )
+
+    def handle(self, *args, **options):
+        docs = TextDocument.objects.all()
+        if not options["all"]:
+            docs = docs.filter(extraction_seconds__isnull=True)
+
+        count = 0
+        for doc in docs.iterator(chunk_size=200):
+            if extract_document(doc, reuse=not options["all"]):
+                index.add_document(doc.pk, doc.extracted_text)
+            count += 1
+            if count % 100 == 0:
+                self.stdout.write(f"Extracted {count} document(s)...")
+
+        self.stdout.write(self.style.SUCCESS(f"Extracted {count} document(s)."))
@@ -0,0 +1,539 @@
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from analyzer import engine, extraction
+from analyzer.batch import build_batch_plan
+from analyzer.history import ResultRecorder
+from analyzer.models import TextDocument
+from analyzer.utils import build_resume_analysis_plan, build_section_analysis_plan
+
+
+SAMPLE_RESUME = """Software Engineer
+Summary
+Backend engineer with 4 years of experience in Python, Django, SQL and automation.
+Experience
+Acme Corp - Backend Developer (2021-2024)
+Built REST APIs in Django and PostgreSQL serving 2M requests per day.
+Automated invoice processing with Selenium and Playwright, saving 40% manual effort.
+Skills
+Python, Django, REST, SQL, PostgreSQL, Redis, Celery, Git, Linux
+Education
+B.Tech in Computer Science
+"""
+
+SAMPLE_JD = """We are looking for a Backend Developer with experience in Python, Django,
+REST APIs, cloud platforms (AWS/GCP) and system design. Knowledge of Docker,
+Kubernetes and database optimization is a plus."""
+
+# Added to the top of the experience section before each re-analysis.
+EDIT_ENTRY = """Company {n} - Software Engineer ({start}-{end})
+Shipped feature {n} of the billing platform with Python, Celery and PostgreSQL.
+"""
+
+
+# -------- Sample documents, one per supported format --------
+
+def _xml_escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _write_zip(path, members):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+def _write_pdf(path, lines):
+    # Minimal single-page PDF with one Helvetica text object.
+    text_ops = " ".join(
+        f"({line.replace(chr(92), '').replace('(', '').replace(')', '')}) Tj T*" for line in lines
+    )
+    stream = f"BT /F1 10 Tf 12 TL 40 800 Td {text_ops} ET".encode("latin-1", errors="ignore")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+        b"/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_sample(directory, ext, index):
+    """Write a resume-like sample file of format ``ext`` and return its path."""
+    lines = [f"{line} #{index}" if line else line for line in SAMPLE_RESUME.splitlines()]
+    paragraphs = "".join(f"<w:p><w:r><w:t>{_xml_escape(l)}</w:t></w:r></w:p>" for l in lines)
+    path = os.path.join(directory, f"sample-{index}.{ext}")
+
+    if ext == "txt":
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines))
+    elif ext == "tex":
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\\documentclass{article}\n\\begin{document}\n")
+            f.write("\n\n".join(f"\\textbf{{{l}}}" for l in lines))
+            f.write("\n\\end{document}\n")
+    elif ext == "rtf":
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("{\\rtf1\\ansi{\\fonttbl{\\f0 Helvetica;}}\\f0\\fs20 ")
+            f.write("".join(f"{l}\\par " for l in lines))
+            f.write("}")
+    elif ext == "pdf":
+        _write_pdf(path, lines)
+    elif ext == "docx":
+        _write_zip(path, {
+            "word/document.xml": (
+                '<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w='
+                '"http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f"<w:body>{paragraphs}</w:body></w:document>"
+            ),
+        })
+    elif ext == "odt":
+        body = "".join(f"<text:p>{_xml_escape(l)}</text:p>" for l in lines)
+        _write_zip(path, {"content.xml": f"<office:document-content><office:body>{body}</office:body></office:document-content>"})
+    elif ext == "pptx":
+        half = len(lines) // 2
+        _write_zip(path, {
+            f"ppt/slides/slide{n}.xml": "<p:sld>" + "".join(f"<a:p><a:t>{_xml_escape(l)}</a:t></a:p>" for l in chunk) + "</p:sld>"
+            for n, chunk in enumerate((lines[:half], lines[half:]), start=1)
+        })
+    elif ext == "xlsx":
+        strings = "".join(f"<si><t>{_xml_escape(l)}</t></si>" for l in lines)
+        _write_zip(path, {"xl/sharedStrings.xml": f"<sst>{strings}</sst>"})
+    else:
+        return None
+    return path
+
+
+# -------- Measurement helpers --------
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": ordered[-1],
+    }
+
+
+@contextmanager
+def traced(report, name):
+    """Record wall time and peak Python heap of a block under ``report[name]``."""
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    yield
+    report.setdefault("phases", {})[name] = {
+        "seconds": time.perf_counter() - started,
+        "peak_python_heap_mb": tracemalloc.get_traced_memory()[1] / (1024 * 1024),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark extraction, plan building and /analyze/ latency (the WSGI job path and "
+        "the async ASGI endpoint), and input tokens when re-analyzing an edited resume, "
+        "with the offline stub LLM backend, and write the results as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="Result file (default: benchmarks/<commit>-<timestamp>.json).")
+        parser.add_argument("--compare", metavar="PATH", help="Earlier result file to compare against.")
+        parser.add_argument("--files-per-format", type=int, default=20)
+        parser.add_argument("--plan-builds", type=int, default=20)
+        parser.add_argument("--concurrency", default="1,2,4,8,16", help="Comma separated client concurrency levels.")
+        parser.add_argument("--requests", type=int, default=32, help="Analyses per concurrency level.")
+        parser.add_argument(
+            "--async-concurrency", default="1,16,64,256",
+            help="Concurrency levels for the async (ASGI) endpoint; empty to skip.",
+        )
+        parser.add_argument("--latency", type=float, default=0.2, help="Stub LLM latency in seconds.")
+        parser.add_argument(
+            "--input-latency", type=float, default=0.0,
+            help="Extra stub latency in seconds per 1,000 input tokens.",
+        )
+        parser.add_argument(
+            "--edits", type=int, default=10,
+            help="Re-analyses of a resume after adding one job each, with and without section reuse; 0 to skip.",
+        )
+        parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of stub calls that fail.")
+        parser.add_argument(
+            "--malformed-rate", type=float, default=0.0,
+            help="Fraction of stub answers sent as near-JSON that needs repair.",
+        )
+        parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of stub calls that return 429.")
+        parser.add_argument("--seed", type=int, default=1234)
+
+    def handle(self, *args, **options):
+        try:
+            levels = [int(level) for level in options["concurrency"].split(",") if level.strip()]
+            async_levels = [int(level) for level in options["async_concurrency"].split(",") if level.strip()]
+        except ValueError:
+            raise CommandError("--concurrency must be comma separated integers, e.g. 1,4,16")
+
+        stub = dict(
+            settings.ANALYZER_STUB,
+            LATENCY=options["latency"],
+            INPUT_LATENCY=options["input_latency"],
+            ERROR_RATE=options["error_rate"],
+            RATE_LIMIT_RATE=options["rate_limit_rate"],
+            MALFORMED_RATE=options["malformed_rate"],
+            SEED=options["seed"],
+        )
+
+        if options["verbosity"] < 2:
+            # Per-analysis log lines would drown the results.
+            logging.getLogger("analyzer").setLevel(logging.WARNING)
+
+        commit = _git_commit()
+        report = {
+            "meta": {
+                "commit": commit,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "stub": {k: v for k, v in stub.items() if k != "RESULT"},
+                "analysis_job_workers": settings.ANALYSIS_JOB_WORKERS,
+                "async_blocking_threads": settings.ANALYZER_ASYNC_BLOCKING_THREADS,
+                "extraction_workers": settings.EXTRACTION_WORKERS,
+            },
+        }
+
+        tracemalloc.start()
+        with tempfile.TemporaryDirectory(prefix="analyzer-bench-") as tmp, override_settings(
+            ANALYZER_LLM_BACKEND="stub",
+            ANALYZER_STUB=stub,
+            ANALYZER_LOCAL_SKIP_BELOW=None,  # every request should reach the (stub) LLM
+            ANALYSIS_JOB_MAX_PENDING=max(levels) * 2 + settings.ANALYSIS_JOB_MAX_PENDING,
+            ANALYZER_ASYNC_MAX_IN_FLIGHT=max(async_levels or [0]) + settings.ANALYZER_ASYNC_MAX_IN_FLIGHT,
+            MEDIA_ROOT=os.path.join(tmp, "media"),
+            ANALYSIS_CACHE_DIR=os.path.join(tmp, "cache"),
+            RESUME_INDEX_DIR=os.path.join(tmp, "index"),
+            ANALYZER_QUOTA_DB=os.path.join(tmp, "quota.sqlite3"),
+            ANALYZER_QUOTAS={},  # measure the pipeline, not the quota ceiling
+            ALLOWED_HOSTS=["testserver"],
+        ):
+            # A throwaway database so the benchmark never touches real data.
+            connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(tmp, "bench.sqlite3")
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self.bench_extraction(report, tmp, options["files_per_format"])
+                self.bench_plan_build(report, options["plan_builds"])
+                self.bench_analyze(report, levels, options["requests"])
+                if async_levels:
+                    self.bench_analyze_async(report, async_levels, options["requests"])
+                if options["edits"]:
+                    self.bench_iterative_edits(report, options["edits"])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+        tracemalloc.stop()
+
+        report["memory"] = {
+            "peak_python_heap_mb": max(p["peak_python_heap_mb"] for p in report["phases"].values()),
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            / (1024 * 1024 if platform.system() == "Darwin" else 1024),
+        }
+
+        output = options["output"] or os.path.join(
+            settings.BASE_DIR, "benchmarks",
+            f"{commit or 'nocommit'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json",
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+
+        self.print_summary(report)
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                self.print_comparison(json.load(f), report)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {output}"))
+
+    # -------- Phases --------
+
+    def bench_extraction(self, report, tmp, files_per_format):
+        sample_dir = os.path.join(tmp, "samples")
+        os.makedirs(sample_dir)
+        samples = {}
+        for ext in extraction.supported_extensions():
+            paths = [write_sample(sample_dir, ext, i) for i in range(files_per_format)]
+            if paths and paths[0]:
+                samples[ext] = paths
+
+        # Pay the worker pool start-up once, outside the per-format numbers.
+        started = time.perf_counter()
+        extraction.extract_text(samples["txt"][0])
+        pool_start = time.perf_counter() - started
+
+        results = {}
+        with traced(report, "extraction"):
+            for ext, paths in samples.items():
+                seconds, failures, size = [], 0, 0
+                for path in paths:
+                    size += os.path.getsize(path)
+                    started = time.perf_counter()
+                    try:
+                        text, _ = extraction.extract_text(path)
+                        failures += 0 if text else 1
+                    except Exception:
+                        failures += 1
+                    seconds.append(time.perf_counter() - started)
+                total = sum(seconds) or 1e-9
+                results[ext] = {
+                    "documents": len(paths),
+                    "failures": failures,
+                    "documents_per_second": len(paths) / total,
+                    "megabytes_per_second": size / total / (1024 * 1024),
+                    "latency_ms": {k: v * 1000 if k != "count" else v for k, v in percentiles(seconds).items()},
+                }
+        report["extraction"] = {"pool_start_seconds": pool_start, "formats": results}
+
+    def bench_plan_build(self, report, builds):
+        def timed(build, *args):
+            samples = []
+            for _ in range(builds):
+                build.cache_clear()
+                started = time.perf_counter()
+                build(*args)
+                samples.append((time.perf_counter() - started) * 1000)
+            return percentiles(samples)
+
+        with traced(report, "plan_build"):
+            report["plan_build_ms"] = {
+                "resume_analysis": timed(build_resume_analysis_plan),
+                "section_analysis": timed(build_section_analysis_plan),
+                "batch": timed(build_batch_plan, "resume", "job description"),
+            }
+
+    def make_documents(self, run, count):
+        # Distinct job descriptions so every request misses the cache.
+        doc_ids = []
+        for i in range(count):
+            doc = TextDocument(
+                file=ContentFile(SAMPLE_RESUME.encode(), name="resume.txt"),
+                job_description=f"{SAMPLE_JD}\nReference: run {run} request {i}",
+                extracted_text=SAMPLE_RESUME,
+                extraction_seconds=0.0,
+            )
+            doc.save()
+            doc_ids.append(doc.pk)
+        return doc_ids
+
+    def bench_analyze(self, report, levels, requests_per_level):
+        results = []
+        with traced(report, "analyze"):
+            for level in levels:
+                doc_ids = self.make_documents(f"wsgi {level}", requests_per_level)
+
+                local = threading.local()
+
+                def one(doc_id):
+                    client = getattr(local, "client", None)
+                    if client is None:
+                        client = local.client = Client()
+                    # Queue the analysis, then poll like detail.html's fallback does.
+                    started = time.perf_counter()
+                    data = client.post(f"/analyze/{doc_id}/").json()
+                    status_url = data.get("status_url")
+                    while status_url and data.get("status") not in ("success", "error"):
+                        time.sleep(0.01)
+                        data = client.get(status_url).json()
+                    return time.perf_counter() - started, data.get("status") == "success"
+
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=level) as pool:
+                    outcomes = list(pool.map(one, doc_ids))
+                wall = time.perf_counter() - started
+
+                latencies = [seconds * 1000 for seconds, _ in outcomes]
+                results.append({
+                    "concurrency": level,
+                    "requests": len(outcomes),
+                    "errors": sum(1 for _, ok in outcomes if not ok),
+                    "throughput_per_second": len(outcomes) / wall,
+                    "latency_ms": percentiles(latencies),
+                })
+                self.stdout.write(
+                    f"  concurrency {level:>3}: p50 {results[-1]['latency_ms']['p50']:.0f} ms, "
+                    f"p95 {results[-1]['latency_ms']['p95']:.0f} ms"
+                )
+        report["analyze"] = results
+
+    def bench_analyze_async(self, report, levels, requests_per_level):
+        """
+        The async endpoint driven through Django's ASGI handler, as uvicorn
+        would: every request is a task on one event loop, at most ``level``
+        in flight. Compare with the "analyze" (WSGI, POST + poll) numbers.
+        """
+        async def drive(doc_ids, level):
+            client = AsyncClient()
+            gate = asyncio.Semaphore(level)
+            peak_threads = threading.active_count()
+
+            async def one(doc_id):
+                nonlocal peak_threads
+                async with gate:
+                    started = time.perf_counter()
+                    response = await client.post(f"/analyze/{doc_id}/async/")
+                    peak_threads = max(peak_threads, threading.active_count())
+                    return time.perf_counter() - started, response.json().get("status") == "success"
+
+            started = time.perf_counter()
+            outcomes = await asyncio.gather(*(one(doc_id) for doc_id in doc_ids))
+            return outcomes, time.perf_counter() - started, peak_threads
+
+        results = []
+        with traced(report, "analyze_async"):
+            for level in levels:
+                # At least one request per slot, so the level is really reached.
+                doc_ids = self.make_documents(f"asgi {level}", max(requests_per_level, level))
+                outcomes, wall, peak_threads = asyncio.run(drive(doc_ids, level))
+
+                latencies = [seconds * 1000 for seconds, _ in outcomes]
+                results.append({
+                    "concurrency": level,
+                    "requests": len(outcomes),
+                    "errors": sum(1 for _, ok in outcomes if not ok),
+                    "throughput_per_second": len(outcomes) / wall,
+                    "latency_ms": percentiles(latencies),
+                    "peak_threads": peak_threads,
+                })
+                self.stdout.write(
+                    f"  async concurrency {level:>3}: p50 {results[-1]['latency_ms']['p50']:.0f} ms, "
+                    f"p95 {results[-1]['latency_ms']['p95']:.0f} ms, "
+                    f"{results[-1]['throughput_per_second']:.1f} analyses/s, {peak_threads} threads"
+                )
+        report["analyze_async"] = results
+
+    def bench_iterative_edits(self, report, edits):
+        """Add one job to a resume ``edits`` times, re-analyzing after each, with and without section reuse."""
+        results = {}
+        with traced(report, "iterative_edits"):
+            for mode, incremental in (("incremental", True), ("full", False)):
+                # Its own job description, so neither mode reuses the other's results.
+                job_description = f"{SAMPLE_JD}\nReference: iterative {mode}"
+                resume, tokens, latencies = SAMPLE_RESUME, [], []
+                with override_settings(ANALYZER_INCREMENTAL_SECTIONS=incremental):
+                    for edit in range(edits + 1):
+                        if edit:
+                            entry = EDIT_ENTRY.format(n=edit, start=1990 + edit, end=1991 + edit)
+                            resume = resume.replace("Experience\n", f"Experience\n{entry}", 1)
+                        recorder = ResultRecorder()
+                        started = time.perf_counter()
+                        engine.analyze(resume, job_description, on_event=recorder)
+                        if edit:  # the first analysis has nothing to reuse
+                            latencies.append((time.perf_counter() - started) * 1000)
+                            tokens.append(recorder.meta.get("tokens_in") or 0)
+                results[mode] = {"tokens_in": percentiles(tokens), "latency_ms": percentiles(latencies)}
+                self.stdout.write(
+                    f"  {mode:<11}: mean {results[mode]['tokens_in']['mean']:.0f} input tokens, "
+                    f"p50 {results[mode]['latency_ms']['p50']:.0f} ms per re-analysis"
+                )
+        report["iterative_edits"] = results
+
+    # -------- Output --------
+
+    def print_summary(self, report):
+        self.stdout.write("Extraction (documents/s):")
+        for ext, entry in sorted(report["extraction"]["formats"].items()):
+            self.stdout.write(f"  {ext:<5} {entry['documents_per_second']:8.1f}  ({entry['failures']} failures)")
+        for name, entry in report["plan_build_ms"].items():
+            self.stdout.write(f"Plan build {name}: mean {entry['mean']:.2f} ms")
+        for name, label in (("analyze", "WSGI (POST + poll)"), ("analyze_async", "ASGI (async view)")):
+            if report.get(name):
+                self.stdout.write(f"{label} analyses/s by concurrency:")
+                for entry in report[name]:
+                    self.stdout.write(
+                        f"  {entry['concurrency']:>4}  {entry['throughput_per_second']:8.1f}  "
+                        f"p95 {entry['latency_ms']['p95']:.0f} ms  ({entry['errors']} errors)"
+                    )
+        if report.get("iterative_edits"):
+            self.stdout.write("Re-analysis after an edit (mean input tokens, p50 latency):")
+            for mode, entry in report["iterative_edits"].items():
+                self.stdout.write(
+                    f"  {mode:<11} {entry['tokens_in']['mean']:8.0f}  p50 {entry['latency_ms']['p50']:.0f} ms"
+                )
+        self.stdout.write(
+            f"Peak Python heap {report['memory']['peak_python_heap_mb']:.1f} MB, "
+            f"max RSS {report['memory']['max_rss_mb']:.1f} MB"
+        )
+
+    def print_comparison(self, before, after):
+        def metrics(report):
+            found = {}
+            for ext, entry in report.get("extraction", {}).get("formats", {}).items():
+                found[f"extraction.{ext}.documents_per_second"] = entry["documents_per_second"]
+            for name, entry in report.get("plan_build_ms", {}).items():
+                found[f"plan_build.{name}.mean_ms"] = entry.get("mean")
+            for name in ("analyze", "analyze_async"):
+                for entry in report.get(name, []):
+                    for q in ("p50", "p95"):
+                        found[f"{name}.c{entry['concurrency']}.{q}_ms"] = entry["latency_ms"].get(q)
+                    found[f"{name}.c{entry['concurrency']}.throughput"] = entry.get("throughput_per_second")
+            for mode, entry in report.get("iterative_edits", {}).items():
+                found[f"iterative_edits.{mode}.tokens_in_mean"] = entry["tokens_in"].get("mean")
+                found[f"iterative_edits.{mode}.p50_ms"] = entry["latency_ms"].get("p50")
+            found["memory.peak_python_heap_mb"] = report.get("memory", {}).get("peak_python_heap_mb")
+            return found
+
+        old, new = metrics(before), metrics(after)
+        self.stdout.write(f"Compared with {before.get('meta', {}).get('commit')}:")
+        for key in sorted(new):
+            if old.get(key) and new[key] is not None:
+                change = (new[key] - old[key]) / old[key] * 100
+                self.stdout.write(f"  {key:<45} {old[key]:10.2f} -> {new[key]:10.2f}  ({change:+.1f}%)")
@@ -0,0 +1,98 @@
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Each scenario runs in a fresh interpreter under ``python -X importtime``
+# and prints its wall time and peak RSS as the last line of stdout.
+SCENARIOS = {
+    "django": "",
+    "routes": "import django.urls; django.urls.get_resolver().url_patterns",
+    "engine": "import django.urls; django.urls.get_resolver().url_patterns\n"
+              "from analyzer import engine; engine.warmup()",
+}
+
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+{body}
+print(json.dumps({{
+    "seconds": time.perf_counter() - started,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "engine_loaded": "analyzer.utils" in sys.modules,
+}}))
+"""
+
+
+def _parse_importtime(stderr):
+    """Self import time in seconds per top-level package."""
+    per_package = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:   <self us> | <cumulative us> | <indented module name>"
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3:
+            continue
+        self_us, name = fields[0].strip(), fields[2].strip()
+        per_package[name.split(".")[0]] += int(self_us) / 1e6
+    return per_package
+
+
+def run_scenario(name):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(body=SCENARIOS[name])],
+        capture_output=True, text=True, cwd=os.getcwd(),
+    )
+    if result.returncode != 0:
+        raise CommandError(f"Scenario {name} failed:\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["packages"] = _parse_importtime(result.stderr)
+    return report
+
+
+class Command(BaseCommand):
+    help = (
+        "Report import time and memory of a fresh worker: Django alone, with the "
+        "URL routes loaded, and with the analysis engine warmed up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=15, help="Packages to list per scenario (default 15).")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    def handle(self, *args, **options):
+        reports = {name: run_scenario(name) for name in SCENARIOS}
+
+        if options["json"]:
+            self.stdout.write(json.dumps(reports, indent=2, sort_keys=True))
+            return
+
+        # Each scenario extends the previous one; list what it adds.
+        previous = {"max_rss_kb": 0, "packages": {}}
+        for name, report in reports.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{name}: {report['seconds']:.2f}s, peak RSS {report['max_rss_kb'] / 1024:.1f} MB "
+                f"(+{(report['max_rss_kb'] - previous['max_rss_kb']) / 1024:.1f} MB), "
+                f"engine loaded: {'yes' if report['engine_loaded'] else 'no'}"
+            ))
+            added = {
+                package: seconds - previous["packages"].get(package, 0.0)
+                for package, seconds in report["packages"].items()
+            }
+            previous = report
+            top = sorted(added.items(), key=lambda item: item[1], reverse=True)[:options["top"]]
+            for package, seconds in top:
+                if seconds >= 0.001:
+                    self.stdout.write(f"  {seconds * 1000:8.1f} ms  {package}")
+
+        if reports["routes"]["engine_loaded"]:
+            self.stderr.write(self.style.WARNING(
+                "The routes import the analysis engine; something imports analyzer.utils eagerly."
+            ))
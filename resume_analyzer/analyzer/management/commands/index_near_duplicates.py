@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from analyzer import neardup
+from analyzer.models import TextDocument
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute MinHash signatures for near-duplicate reuse, for documents uploaded "
+        "before it existed (or for all documents with --rebuild)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild", action="store_true",
+            help="Re-index every document, e.g. after changing ANALYZER_MINHASH_PERMUTATIONS or _BANDS.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500, help="Documents per batch (default 500).")
+
+    def handle(self, *args, **options):
+        documents = TextDocument.objects.order_by("pk")
+        if not options["rebuild"]:
+            documents = documents.filter(minhash__isnull=True)
+        doc_ids = list(documents.values_list("pk", flat=True))
+
+        count, size = 0, options["batch_size"]
+        for start in range(0, len(doc_ids), size):
+            batch = TextDocument.objects.only("pk", "extracted_text", "job_description").filter(
+                pk__in=doc_ids[start:start + size]
+            )
+            count += neardup.index_documents(list(batch))
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} document(s)."))
@@ -0,0 +1,215 @@
+import hashlib
+import os
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from analyzer import extraction, index, neardup
+from analyzer.models import AnalysisJob, TextDocument
+from analyzer.uploads import content_file_path
+
+
+def _iter_directory(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for filename in sorted(filenames):
+            if filename.startswith("."):
+                continue
+            path = os.path.join(dirpath, filename)
+            yield os.path.relpath(path, root), os.path.getsize(path), lambda path=path: open(path, "rb")
+
+
+def _iter_zip(archive):
+    for info in sorted(archive.infolist(), key=lambda i: i.filename):
+        name = info.filename
+        parts = name.split("/")
+        if info.is_dir() or parts[0] == "__MACOSX" or any(part.startswith(".") for part in parts):
+            continue
+        yield name, info.file_size, lambda info=info: archive.open(info)
+
+
+def _hash(opener):
+    hasher = hashlib.sha256()
+    with opener() as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk load resumes from a directory or .zip archive: store each file once, "
+        "extract text in worker processes and create documents in batches. "
+        "Re-running skips files that were already ingested with the same job description."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Directory or .zip archive of resumes.")
+        jd = parser.add_mutually_exclusive_group()
+        jd.add_argument("--job-description", help="Job description to attach to every resume.")
+        jd.add_argument("--job-description-file", help="Read the job description from this file.")
+        parser.add_argument("--batch-size", type=int, default=200, help="Documents per bulk_create (default 200).")
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Extractions in flight at once (default EXTRACTION_WORKERS).",
+        )
+        parser.add_argument(
+            "--analyze", action="store_true",
+            help="Queue an analysis job per new document (run them with process_analysis_jobs).",
+        )
+
+    def handle(self, *args, **options):
+        source = options["source"]
+        job_description = options["job_description"]
+        if options["job_description_file"]:
+            with open(options["job_description_file"], encoding="utf-8") as f:
+                job_description = f.read()
+        if options["analyze"] and not job_description:
+            raise CommandError("--analyze needs --job-description or --job-description-file.")
+
+        self.job_description = job_description
+        self.batch_size = max(1, options["batch_size"])
+        self.workers = options["workers"] or settings.EXTRACTION_WORKERS
+        self.analyze = options["analyze"]
+        self.storage = TextDocument._meta.get_field("file").storage
+        self.supported = set(extraction.supported_extensions())
+        self.counts = {"seen": 0, "created": 0, "skipped": 0, "failed": 0}
+        self.failures = []
+        self.started = time.perf_counter()
+
+        if os.path.isdir(source):
+            self.ingest(_iter_directory(source))
+        elif zipfile.is_zipfile(source):
+            with zipfile.ZipFile(source) as archive:
+                self.ingest(_iter_zip(archive))
+        else:
+            raise CommandError(f"{source} is neither a directory nor a zip archive.")
+
+        if self.counts["created"]:
+            index.merge_delta()
+
+        elapsed = time.perf_counter() - self.started
+        for name, reason in self.failures[:50]:
+            self.stderr.write(f"  {name}: {reason}")
+        if len(self.failures) > 50:
+            self.stderr.write(f"  ... and {len(self.failures) - 50} more")
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {self.counts['created']} new document(s) from {self.counts['seen']} file(s) "
+            f"in {elapsed:.1f}s ({self.counts['seen'] / (elapsed or 1e-9):.1f} files/s): "
+            f"{self.counts['skipped']} already ingested, {self.counts['failed']} failed."
+        ))
+        if self.analyze and self.counts["created"]:
+            self.stdout.write("Queued analyses; run `manage.py process_analysis_jobs` to process them.")
+
+    # -------- Batches --------
+
+    def ingest(self, entries):
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= self.batch_size:
+                self.ingest_batch(batch)
+                batch = []
+        if batch:
+            self.ingest_batch(batch)
+
+    def fail(self, name, reason):
+        self.counts["failed"] += 1
+        self.failures.append((name, reason))
+
+    def ingest_batch(self, entries):
+        self.counts["seen"] += len(entries)
+
+        # 1. Filter and hash (streamed, never holding a whole file in memory).
+        candidates = []
+        for name, size, opener in entries:
+            ext = os.path.splitext(name)[1].lower().lstrip(".")
+            if ext not in self.supported:
+                self.fail(name, f"unsupported format .{ext}")
+            elif size > settings.UPLOAD_MAX_BYTES:
+                self.fail(name, "file too large")
+            else:
+                candidates.append((name, opener, _hash(opener)))
+
+        # 2. Skip what an earlier (possibly interrupted) run already created.
+        hashes = {digest for _, _, digest in candidates}
+        done = set(
+            TextDocument.objects.filter(content_hash__in=hashes, job_description=self.job_description)
+            .values_list("content_hash", flat=True)
+        )
+        pending, seen = [], set()
+        for name, opener, digest in candidates:
+            if digest in done or digest in seen:
+                self.counts["skipped"] += 1
+                continue
+            seen.add(digest)
+            pending.append((name, opener, digest))
+        if not pending:
+            self.report()
+            return
+
+        # 3. Store each blob once; identical files share it.
+        docs, names = [], {}
+        for name, opener, digest in pending:
+            names[digest] = name
+            doc = TextDocument(
+                content_hash=digest,
+                original_name=os.path.basename(name),
+                job_description=self.job_description,
+            )
+            with opener() as f:
+                doc.file.name = self.storage.save(content_file_path(doc, name), File(f, name=name))
+            docs.append(doc)
+
+        # 4. Extract in the worker processes, reusing earlier extractions of the same file.
+        extracted = {
+            row[0]: row[1:]
+            for row in TextDocument.objects.filter(
+                content_hash__in=[d.content_hash for d in docs], extraction_seconds__isnull=False,
+            ).values_list("content_hash", "extracted_text", "page_count", "extraction_seconds")
+        }
+        todo = [d for d in docs if d.content_hash not in extracted]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for doc, outcome in zip(todo, pool.map(self.extract, todo)):
+                extracted[doc.content_hash] = outcome
+
+        created = []
+        for doc in docs:
+            text, page_count, seconds = extracted[doc.content_hash]
+            if isinstance(text, Exception):
+                self.fail(names[doc.content_hash], str(text) or type(text).__name__)
+                continue
+            doc.extracted_text, doc.page_count, doc.extraction_seconds = text, page_count, seconds
+            created.append(doc)
+
+        # 5. One transaction per batch, so an interrupted run leaves whole batches.
+        with transaction.atomic():
+            created = TextDocument.objects.bulk_create(created)
+            if self.analyze:
+                AnalysisJob.objects.bulk_create([AnalysisJob(document=doc) for doc in created])
+        index.add_documents((doc.pk, doc.extracted_text) for doc in created if doc.extracted_text)
+        neardup.index_documents(created)
+
+        self.counts["created"] += len(created)
+        self.report()
+
+    def extract(self, doc):
+        started = time.perf_counter()
+        try:
+            text, page_count = extraction.extract_text(self.storage.path(doc.file.name))
+        except Exception as e:
+            return e, None, None
+        return text, page_count, time.perf_counter() - started
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        self.stdout.write(
+            f"{self.counts['seen']} file(s): {self.counts['created']} created, "
+            f"{self.counts['skipped']} skipped, {self.counts['failed']} failed "
+            f"({self.counts['seen'] / (elapsed or 1e-9):.1f} files/s)"
+        )
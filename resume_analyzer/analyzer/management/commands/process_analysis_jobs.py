@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from analyzer.jobs import run_pending_jobs
+from analyzer.models import AnalysisJob, BatchAnalysisJob
+
+
+class Command(BaseCommand):
+    help = "Run queued analysis jobs, e.g. ones left behind by a restarted worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requeue-stale",
+            type=int,
+            metavar="MINUTES",
+            help="Requeue jobs that have been running for longer than MINUTES.",
+        )
+
+    def handle(self, *args, **options):
+        stale_minutes = options["requeue_stale"]
+        if stale_minutes:
+            requeued = sum(
+                model.objects.filter(
+                    status=AnalysisJob.RUNNING,
+                    updated_at__lt=now() - timedelta(minutes=stale_minutes),
+                ).update(status=AnalysisJob.QUEUED)
+                for model in (AnalysisJob, BatchAnalysisJob)
+            )
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+
+        count = run_pending_jobs()
+        self.stdout.write(self.style.SUCCESS(f"Processed {count} job(s)."))
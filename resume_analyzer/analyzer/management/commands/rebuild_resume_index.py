@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from analyzer import index
+from analyzer.models import TextDocument
+
+
+class Command(BaseCommand):
+    help = "Rebuild the resume search index from the stored extracted text."
+
+    def handle(self, *args, **options):
+        documents = (
+            TextDocument.objects.exclude(extracted_text="")
+            .values_list("pk", "extracted_text")
+            .iterator(chunk_size=500)
+        )
+        count = index.rebuild(documents)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} document(s)."))
@@ -0,0 +1,182 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+
+# -------- Pipeline metrics --------
+# Counters and histograms for each stage of an analysis (extraction, plan
+# build, client build, LLM attempts, parsing), rendered in the Prometheus
+# text format by the /metrics view. Values are kept per process: with
+# several gunicorn workers each one reports its own share.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            series["counts"][index] += 1
+            series["sum"] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), series["counts"]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', le)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+_registry = []
+
+
+def counter(name, documentation):
+    metric = Counter(name, documentation)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name, documentation, buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, documentation, buckets)
+    _registry.append(metric)
+    return metric
+
+
+STAGE_SECONDS = histogram("analyzer_stage_seconds", "Time spent in each analysis stage.")
+STAGE_TOTAL = counter("analyzer_stage_total", "Analysis stage runs by outcome.")
+LLM_ATTEMPT_SECONDS = histogram("analyzer_llm_attempt_seconds", "Latency of each LLM attempt.")
+LLM_ATTEMPTS = counter("analyzer_llm_attempts_total", "LLM attempts by model and outcome.")
+LLM_TOKENS = counter("analyzer_llm_tokens_total", "Estimated LLM tokens by model and direction.")
+ANALYSES = counter("analyzer_analyses_total", "Finished analyses by how they were answered.")
+
+
+# -------- Trace IDs --------
+# Set per request by analyzer.middleware.TraceIdMiddleware and carried into
+# background threads with bind_trace(), so log lines of one analysis can be
+# found together.
+
+_trace_id = contextvars.ContextVar("analyzer_trace_id", default=None)
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+@contextmanager
+def bind_trace(trace_id):
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds ``record.trace_id`` for log formats."""
+
+    def filter(self, record):
+        record.trace_id = _trace_id.get() or "-"
+        return True
+
+
+# -------- Stage timing --------
+
+@contextmanager
+def stage(name, **labels):
+    """Time a pipeline stage; the outcome is "error" if the block raises."""
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=name, **labels)
+        STAGE_TOTAL.inc(stage=name, outcome=outcome, **labels)
+        logger.debug("stage %s %s %.3fs %s", name, outcome, seconds, labels or "")
+
+
+def record_llm_attempt(model, seconds, outcome, tokens_in=0, tokens_out=0):
+    LLM_ATTEMPT_SECONDS.observe(seconds, model=model)
+    LLM_ATTEMPTS.inc(model=model, outcome=outcome)
+    if tokens_in:
+        LLM_TOKENS.inc(tokens_in, model=model, direction="in")
+    if tokens_out:
+        LLM_TOKENS.inc(tokens_out, model=model, direction="out")
+    logger.info(
+        "llm attempt model=%s outcome=%s seconds=%.3f tokens_in=%s tokens_out=%s",
+        model, outcome, seconds, tokens_in, tokens_out,
+    )
+
+
+def render(extra_lines=()):
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return "\n".join(lines) + "\n"
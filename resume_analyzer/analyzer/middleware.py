@@ -0,0 +1,93 @@
+import re
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics
+
+
+REQUEST_SECONDS = metrics.histogram("analyzer_http_request_seconds", "Time to produce a response, by view.")
+
+_TRACE_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class TraceIdMiddleware:
+    """
+    Give every request a trace ID (reusing a sane incoming X-Request-ID) that
+    log lines and background analysis threads carry, and time each view.
+    With ANALYZER_TRACE_HEADER the ID is echoed back as X-Trace-Id.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Stay async under ASGI so async views are not pushed onto a thread.
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        trace_id = self._start(request)
+        started = time.perf_counter()
+        with metrics.bind_trace(trace_id):
+            response = self.get_response(request)
+        return self._finish(request, response, trace_id, started)
+
+    async def __acall__(self, request):
+        trace_id = self._start(request)
+        started = time.perf_counter()
+        with metrics.bind_trace(trace_id):
+            response = await self.get_response(request)
+        return self._finish(request, response, trace_id, started)
+
+    def _start(self, request):
+        incoming = request.headers.get("X-Request-ID", "")
+        request.trace_id = incoming if _TRACE_ID_RE.match(incoming) else metrics.new_trace_id()
+        return request.trace_id
+
+    def _finish(self, request, response, trace_id, started):
+        match = getattr(request, "resolver_match", None)
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            view=match.url_name if match and match.url_name else "unmatched",
+            method=request.method,
+            status=response.status_code,
+        )
+        if settings.ANALYZER_TRACE_HEADER:
+            response["X-Trace-Id"] = trace_id
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise, usable in an async middleware chain. WhiteNoise itself is
+    sync-only, which under ASGI would run every request below it (including
+    async views) through a thread; here only static file hits touch a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
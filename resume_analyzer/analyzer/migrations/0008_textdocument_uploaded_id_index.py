@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0007_textdocument_extracted_text'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='textdocument',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='textdoc_uploaded_id_idx'),
+        ),
+    ]
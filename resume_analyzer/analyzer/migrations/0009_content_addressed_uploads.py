@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:36
+
+import analyzer.uploads
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0008_textdocument_uploaded_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='textdocument',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='textdocument',
+            name='original_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='textdocument',
+            name='file',
+            field=models.FileField(storage=analyzer.uploads.ContentAddressedStorage(), upload_to=analyzer.uploads.content_file_path, validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['txt', 'pdf', 'doc', 'docx', 'rtf', 'odt', 'tex', 'wps', 'ppt', 'pptx', 'xls', 'xlsx'])]),
+        ),
+    ]
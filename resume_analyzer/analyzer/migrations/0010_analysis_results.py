@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0009_content_addressed_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('match_score', models.FloatField()),
+                ('strengths', models.JSONField(default=list)),
+                ('missing_keywords', models.JSONField(default=list)),
+                ('improvement_tips', models.JSONField(default=list)),
+                ('schedule_plan_to_improve', models.JSONField(default=list)),
+                ('answered_by', models.CharField(choices=[('llm', 'LLM'), ('cache', 'Cache'), ('local', 'Local scorer'), ('coalesced', 'Joined a running analysis')], default='llm', max_length=16)),
+                ('model_name', models.CharField(blank=True, default='', max_length=64)),
+                ('prompt_version', models.CharField(blank=True, default='', max_length=16)),
+                ('latency_seconds', models.FloatField(blank=True, null=True)),
+                ('tokens_in', models.PositiveIntegerField(blank=True, null=True)),
+                ('tokens_out', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='analysis_results', to='analyzer.textdocument')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['document', '-created_at', '-id'], name='result_doc_created_idx')],
+            },
+        ),
+    ]
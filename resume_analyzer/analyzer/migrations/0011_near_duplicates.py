@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyzer', '0010_analysis_results'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MinHashSignature',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='minhash', serialize=False, to='analyzer.textdocument')),
+                ('resume', models.BinaryField(null=True)),
+                ('job_description', models.BinaryField(null=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='analysisresult',
+            name='answered_by',
+            field=models.CharField(choices=[('llm', 'LLM'), ('cache', 'Cache'), ('local', 'Local scorer'), ('coalesced', 'Joined a running analysis'), ('near_duplicate', 'Reused from a near-duplicate')], default='llm', max_length=16),
+        ),
+        migrations.CreateModel(
+            name='MinHashBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField(db_index=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='minhash_buckets', to='analyzer.textdocument')),
+            ],
+        ),
+    ]
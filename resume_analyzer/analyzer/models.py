@@ -1,15 +1,14 @@
+import os
+
 from django.db import models
 from django.core.validators import FileExtensionValidator
 
-def user_directory_path(instance, filename):
-    # Save as: resume_files/YYYYMMDD_HHMMSS_originalfilename
-    base, ext = os.path.splitext(filename)
-    timestamp = now().strftime("%Y%m%d_%H%M%S")
-    return f'resume_files/{timestamp}_{base}{ext}'
+from .uploads import ContentAddressedStorage, content_file_path
 
 class TextDocument(models.Model):
     file = models.FileField(
-        upload_to='user_directory_path',
+        upload_to=content_file_path,
+        storage=ContentAddressedStorage(),
         validators=[FileExtensionValidator(allowed_extensions=[
             'txt', 'pdf', 'doc', 'docx', 'rtf', 'odt', 'tex', 'wps',
             'ppt', 'pptx', 'xls', 'xlsx'
@@ -18,5 +17,148 @@ class TextDocument(models.Model):
     job_description = models.TextField(null=True, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    # SHA-256 of the file; identical uploads share one blob and one extraction
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    original_name = models.CharField(max_length=255, blank=True, default='')
+
+    # Filled in once at upload by analyzer.extraction
+    extracted_text = models.TextField(blank=True, default='')
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    extraction_seconds = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the uploads listing (analyzer.listing)
+            models.Index(fields=['-uploaded_at', '-id'], name='textdoc_uploaded_id_idx'),
+        ]
+
+    @property
+    def is_extracted(self):
+        return self.extraction_seconds is not None
+
+    @property
+    def display_name(self):
+        return self.original_name or os.path.basename(self.file.name)
+
+    def __str__(self):
+        return f"{self.file.name} : {self.job_description}"
+
+class AnalysisJob(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    document = models.ForeignKey(TextDocument, on_delete=models.CASCADE, related_name='analysis_jobs')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Job {self.pk} for {self.document_id} : {self.status}"
+
+
+class BatchAnalysisJob(models.Model):
+    """A batch comparison (analyzer.batch) run in the background, like an AnalysisJob."""
+    # Either one document against many job descriptions, or one job
+    # description against many documents; ``items`` holds the other side.
+    document = models.ForeignKey(
+        TextDocument, null=True, blank=True, on_delete=models.CASCADE, related_name='batch_jobs'
+    )
+    job_description = models.TextField(blank=True)
+    items = models.JSONField()  # job descriptions, or document ids
+
+    status = models.CharField(
+        max_length=16, choices=AnalysisJob.STATUS_CHOICES, default=AnalysisJob.QUEUED, db_index=True
+    )
+    results = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def shared_is_resume(self):
+        return self.document_id is not None
+
+    def __str__(self):
+        return f"Batch job {self.pk} : {self.status}"
+
+class AnalysisResult(models.Model):
+    """One finished analysis of a document, kept so it can be shown again without re-running it."""
+    LLM = 'llm'
+    CACHE = 'cache'
+    LOCAL = 'local'
+    COALESCED = 'coalesced'
+    NEAR_DUPLICATE = 'near_duplicate'
+    ANSWERED_BY_CHOICES = [
+        (LLM, 'LLM'),
+        (CACHE, 'Cache'),
+        (LOCAL, 'Local scorer'),
+        (COALESCED, 'Joined a running analysis'),
+        (NEAR_DUPLICATE, 'Reused from a near-duplicate'),
+    ]
+
+    document = models.ForeignKey(TextDocument, on_delete=models.CASCADE, related_name='analysis_results')
+    match_score = models.FloatField()
+    strengths = models.JSONField(default=list)
+    missing_keywords = models.JSONField(default=list)
+    improvement_tips = models.JSONField(default=list)
+    schedule_plan_to_improve = models.JSONField(default=list)
+
+    # How the result was produced
+    answered_by = models.CharField(max_length=16, choices=ANSWERED_BY_CHOICES, default=LLM)
+    model_name = models.CharField(max_length=64, blank=True, default='')
+    prompt_version = models.CharField(max_length=16, blank=True, default='')
+    latency_seconds = models.FloatField(null=True, blank=True)
+    tokens_in = models.PositiveIntegerField(null=True, blank=True)
+    tokens_out = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Latest result per document and keyset pagination of its history
+            models.Index(fields=['document', '-created_at', '-id'], name='result_doc_created_idx'),
+        ]
+
+    def as_result(self):
+        """The result in the shape the analyzer returns it (ResumeMatchResult)."""
+        return {
+            "match_score": self.match_score,
+            "strengths": self.strengths,
+            "missing_keywords": self.missing_keywords,
+            "improvement_tips": self.improvement_tips,
+            "schedule_plan_to_improve": self.schedule_plan_to_improve,
+        }
+
+    def __str__(self):
+        return f"Result {self.pk} for {self.document_id} : {self.match_score}"
+
+
+class MinHashSignature(models.Model):
+    """MinHash signatures of a document's resume text and job description (analyzer.neardup)."""
+    document = models.OneToOneField(
+        TextDocument, on_delete=models.CASCADE, primary_key=True, related_name='minhash'
+    )
+    resume = models.BinaryField(null=True)
+    job_description = models.BinaryField(null=True)
+
+    def __str__(self):
+        return f"MinHash of {self.document_id}"
+
+
+class MinHashBucket(models.Model):
+    """One LSH band of a signature; documents sharing a key are near-duplicate candidates."""
+    document = models.ForeignKey(TextDocument, on_delete=models.CASCADE, related_name='minhash_buckets')
+    key = models.BigIntegerField(db_index=True)
+
     def __str__(self):
-        return f"{self.file.name} : {self.job_description}"
\ No newline at end of file
+        return f"Bucket {self.key} : {self.document_id}"
@@ -0,0 +1,197 @@
+import hashlib
+import re
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from . import metrics
+from .cache import normalize_text
+from .models import AnalysisResult, MinHashBucket, MinHashSignature, TextDocument
+
+
+# -------- Near-duplicate analyses (MinHash LSH) --------
+# A resume re-uploaded with small edits, or a job description pasted with a
+# changed salary line, misses the exact analysis cache. Each document's resume
+# text and job description get a MinHash signature over word 3-grams at
+# upload. Signatures are cut into LSH bands, and each band is stored as a
+# bucket key, so the documents that share a band with a new pair come back
+# from one indexed query. Those candidates are checked against the estimated
+# Jaccard similarity. The job description only has to clear
+# ANALYZER_NEAR_DUPLICATE_JD_SIMILARITY. The resume has to clear the much
+# stricter ANALYZER_NEAR_DUPLICATE_RESUME_SIMILARITY and use exactly the same
+# words as the analyzed one: a resume that gained a keyword (even one line
+# in a long resume scores 0.99) must not get the old "missing: ..." answer.
+# Those resumes go to the LLM, where analyzer.sections re-reads only the
+# sections that changed. If a pair qualifies, its stored result is reused
+# instead of calling the LLM.
+
+NEAR_DUPLICATES = metrics.counter(
+    "analyzer_near_duplicate_lookups_total",
+    "Near-duplicate lookups by outcome: reused, no_candidates, below_threshold, new_words.",
+)
+
+SHINGLE_WORDS = 3
+_PRIME = (1 << 32) - 5  # largest prime below 2**32
+_SEED = 0x5EED  # the hash family must be the same in every process
+_WORD_RE = re.compile(r"\w+")
+
+_hash_family = {}
+
+
+def _permutations(count):
+    """``(a, b)`` columns of the hash family ``h(x) = (a * x + b) mod p``."""
+    if count not in _hash_family:
+        rng = np.random.default_rng(_SEED)
+        # a < 2**31 and x < 2**32 keep a * x + b within uint64.
+        a = rng.integers(1, 1 << 31, size=count, dtype=np.uint64)
+        b = rng.integers(0, _PRIME, size=count, dtype=np.uint64)
+        _hash_family[count] = (a[:, None], b[:, None])
+    return _hash_family[count]
+
+
+def _shingles(text):
+    words = _WORD_RE.findall(normalize_text(text).lower())
+    if len(words) <= SHINGLE_WORDS:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def signature(text):
+    """MinHash signature of ``text`` as a uint32 array, or None if it has no words."""
+    shingles = _shingles(text)
+    if not shingles:
+        return None
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles),
+    )
+    a, b = _permutations(settings.ANALYZER_MINHASH_PERMUTATIONS)
+    return ((a * hashes + b) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def similarity(left, right):
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    if left is None or right is None or len(left) != len(right):
+        return 0.0
+    return float(np.mean(left == right))
+
+
+def _vocabulary(text):
+    return set(_WORD_RE.findall(normalize_text(text).lower()))
+
+
+def _band_keys(sig, kind):
+    bands = settings.ANALYZER_MINHASH_BANDS
+    rows = len(sig) // bands
+    keys = []
+    for band in range(bands):
+        digest = hashlib.blake2b(sig[band * rows:(band + 1) * rows].tobytes(), digest_size=8)
+        digest.update(f"{kind}:{band}".encode())
+        keys.append(int.from_bytes(digest.digest(), "big", signed=True))
+    return keys
+
+
+def _to_bytes(sig):
+    return None if sig is None else sig.tobytes()
+
+
+def _from_bytes(raw):
+    return None if raw is None else np.frombuffer(bytes(raw), dtype=np.uint32)
+
+
+# -------- Indexing --------
+
+def index_documents(docs):
+    """Store the signatures and LSH buckets of ``docs``, replacing any they had."""
+    signatures, buckets = [], []
+    for doc in docs:
+        resume, job_description = signature(doc.extracted_text), signature(doc.job_description)
+        signatures.append(MinHashSignature(
+            document_id=doc.pk, resume=_to_bytes(resume), job_description=_to_bytes(job_description),
+        ))
+        for sig, kind in ((resume, "resume"), (job_description, "jd")):
+            if sig is not None:
+                buckets += [MinHashBucket(document_id=doc.pk, key=key) for key in _band_keys(sig, kind)]
+    if not signatures:
+        return 0
+
+    doc_ids = [s.document_id for s in signatures]
+    with transaction.atomic():
+        MinHashBucket.objects.filter(document_id__in=doc_ids).delete()
+        MinHashSignature.objects.filter(document_id__in=doc_ids).delete()
+        MinHashSignature.objects.bulk_create(signatures)
+        MinHashBucket.objects.bulk_create(buckets, batch_size=1000)
+    return len(signatures)
+
+
+def index_document(doc):
+    index_documents([doc])
+
+
+# -------- Lookup --------
+
+def _reusable_results(prompt_version):
+    # Only real analyses: chaining near-duplicates of near-duplicates would drift.
+    return AnalysisResult.objects.filter(prompt_version=prompt_version).exclude(
+        answered_by__in=[AnalysisResult.LOCAL, AnalysisResult.NEAR_DUPLICATE]
+    )
+
+
+def find_reusable(resume_text, job_description, prompt_version, resume_threshold, jd_threshold):
+    """
+    Return ``(result, resume_similarity, jd_similarity)`` for the stored
+    AnalysisResult of the most similar analyzed pair, or None if no pair
+    reaches ``resume_threshold`` and ``jd_threshold`` with a resume made of
+    the same words and a job description that asks for nothing new.
+    """
+    resume, jd = signature(resume_text), signature(job_description)
+    if resume is None or jd is None:
+        return None
+
+    reusable = _reusable_results(prompt_version)
+    candidates = list(
+        MinHashBucket.objects
+        .filter(key__in=_band_keys(resume, "resume"), document__minhash_buckets__key__in=_band_keys(jd, "jd"))
+        .filter(Exists(reusable.filter(document=OuterRef("document_id"))))
+        .values_list("document_id", flat=True)
+        .distinct()
+        .order_by("-document_id")[:settings.ANALYZER_NEAR_DUPLICATE_CANDIDATES]
+    )
+    if not candidates:
+        NEAR_DUPLICATES.inc(outcome="no_candidates")
+        return None
+
+    close = []
+    for doc_id, raw_resume, raw_jd in MinHashSignature.objects.filter(document_id__in=candidates).values_list(
+        "document_id", "resume", "job_description"
+    ):
+        scores = (similarity(resume, _from_bytes(raw_resume)), similarity(jd, _from_bytes(raw_jd)))
+        if scores[0] >= resume_threshold and scores[1] >= jd_threshold:
+            close.append((min(scores), doc_id, scores))
+    if not close:
+        NEAR_DUPLICATES.inc(outcome="below_threshold")
+        return None
+
+    # Most similar first; only the few close pairs have their text loaded.
+    # A job description may lose words (a trimmed sentence) but not gain
+    # any: a new one may be a required skill the stored result never saw.
+    vocabulary, jd_vocabulary = _vocabulary(resume_text), _vocabulary(job_description)
+    texts = {
+        pk: (text, jd) for pk, text, jd in TextDocument.objects.filter(
+            pk__in=[doc_id for _, doc_id, _ in close]
+        ).values_list("pk", "extracted_text", "job_description")
+    }
+    for _, doc_id, (resume_similarity, jd_similarity) in sorted(close, reverse=True):
+        text, stored_jd = texts.get(doc_id, ("", ""))
+        if _vocabulary(text) != vocabulary or not jd_vocabulary <= _vocabulary(stored_jd):
+            continue
+        result = reusable.filter(document_id=doc_id).order_by("-created_at", "-id").first()
+        if result is None:  # deleted since the candidate query
+            continue
+        NEAR_DUPLICATES.inc(outcome="reused")
+        return result, resume_similarity, jd_similarity
+
+    NEAR_DUPLICATES.inc(outcome="new_words")
+    return None
@@ -0,0 +1,165 @@
+import logging
+import re
+
+import orjson
+from pydantic import BaseModel, ValidationError
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# -------- Tolerant structured-output parsing --------
+# Models often wrap their JSON in code fences, use single quotes or Python
+# literals, leave trailing commas, or stop mid-array when they hit the output
+# limit. Re-asking another model for every such slip doubles the cost of an
+# analysis, so the output is decoded with orjson, repaired when that fails,
+# and validated against the schema. Only output that cannot be repaired (or
+# does not fit the schema) is treated as a failed attempt.
+
+OUTPUT_PARSE = metrics.counter(
+    "analyzer_output_parse_total", "LLM outputs by parse outcome: clean, repaired, unparsable, invalid."
+)
+
+_FENCE_RE = re.compile(r"```[A-Za-z0-9_-]*[ \t]*\n?(.*?)(?:```|$)", re.DOTALL)
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class OutputParseError(ValueError):
+    """The model's output could not be repaired into a valid result."""
+
+
+def _next_significant(text, index):
+    while index < len(text) and text[index].isspace():
+        index += 1
+    return text[index] if index < len(text) else ""
+
+
+def _drop_dangling(out):
+    """Remove a trailing comma, or a key left without a value, from ``out``."""
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+    elif out and out[-1] == ":":
+        # '"key":' cut off before its value: drop the key and its comma.
+        out.pop()
+        text = "".join(out).rstrip()
+        key_start = text.rfind('"', 0, len(text) - 1)
+        text = text[:key_start].rstrip()
+        out[:] = list(text[:-1] if text.endswith(",") else text)
+
+
+def repair_json(text):
+    """Best-effort rewrite of near-JSON LLM output into JSON text."""
+    fenced = _FENCE_RE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        raise OutputParseError("No JSON object in the output")
+    text = text[min(starts):]
+
+    out, stack = [], []
+    quote, escaped, string_start = None, False, 0
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if quote:
+            if escaped:
+                if char == "'":
+                    out[-1] = "'"  # \' is not a JSON escape: a plain apostrophe
+                else:
+                    out.append(char)
+                escaped = False
+            elif char == "\\":
+                out.append(char)
+                escaped = True
+            elif char == quote and _next_significant(text, i + 1) in (",", ":", "}", "]", ""):
+                # A quote only ends the string where JSON could continue, so
+                # apostrophes in 'don't' and stray inner quotes survive.
+                out.append('"')
+                quote = None
+            elif char == '"':
+                out.append('\\"')
+            elif char == "\n":
+                out.append("\\n")
+            elif char == "\t":
+                out.append("\\t")
+            else:
+                out.append(char)
+        elif char in ("'", '"'):
+            string_start = len(out)
+            out.append('"')
+            quote = char
+        elif char in _CLOSERS:
+            stack.append(char)
+            out.append(char)
+        elif char in ("}", "]"):
+            _drop_dangling(out)
+            if stack:
+                out.append(_CLOSERS[stack.pop()])
+            if not stack:
+                break  # ignore any prose after the top-level value
+        elif char.isalpha() or char == "_":
+            end = i
+            while end < len(text) and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[i:end]
+            if _next_significant(text, end) == ":":
+                out.append(f'"{word}"')  # unquoted key
+            else:
+                out.append(_LITERALS.get(word, word))
+            i = end
+            continue
+        else:
+            out.append(char)
+        i += 1
+
+    # Truncated output: close the open string, arrays and objects. A cut-off
+    # list item or key is dropped; a cut-off value is kept.
+    if quote:
+        before = "".join(out[:string_start]).rstrip()
+        if before.endswith(":"):
+            out.append('"')
+        else:
+            del out[string_start:]
+    while stack:
+        _drop_dangling(out)
+        out.append(_CLOSERS[stack.pop()])
+    return "".join(out)
+
+
+def parse_json(raw):
+    """Return ``(value, repaired)`` for the raw output of a model."""
+    if isinstance(raw, BaseModel):
+        return raw.model_dump(), False
+    if isinstance(raw, (dict, list)):
+        return raw, False
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode("utf-8", "replace")
+    raw = str(raw or "")
+    try:
+        return orjson.loads(raw), False
+    except orjson.JSONDecodeError:
+        pass
+    try:
+        return orjson.loads(repair_json(raw)), True
+    except (orjson.JSONDecodeError, OutputParseError) as e:
+        OUTPUT_PARSE.inc(outcome="unparsable")
+        raise OutputParseError(f"Unrepairable JSON: {e}") from e
+
+
+def parse_output(raw, schema):
+    """Decode, repair if needed, and validate ``raw`` as an instance of ``schema``."""
+    value, repaired = parse_json(raw)
+    try:
+        result = schema.model_validate(value)
+    except ValidationError as e:
+        OUTPUT_PARSE.inc(outcome="invalid")
+        raise OutputParseError(f"Output does not match {schema.__name__}: {e}") from e
+    OUTPUT_PARSE.inc(outcome="repaired" if repaired else "clean")
+    if repaired:
+        logger.info("Repaired malformed %s output", schema.__name__)
+    return result
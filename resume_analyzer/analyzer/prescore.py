@@ -0,0 +1,102 @@
+import re
+
+import numpy as np
+
+from .schemas import ResumeMatchResult
+
+
+# -------- Local pre-scorer --------
+# A deterministic keyword scorer that answers in milliseconds without calling
+# the LLM. It is used to skip the LLM for clear mismatches and to show a
+# provisional score while the real analysis is still running.
+
+STOPWORDS = frozenset("""
+a about above after all also an and any are as at be been being both but by can
+could did do does doing for from had has have having he her here his how i if in
+into is it its just looking may me more most must my no nor not of on once only or
+other our out over own per plus same she should so some such than that the their
+them then there these they this those through to too under until up very was we
+were what when where which while who will with within would you your years year
+experience work working strong good knowledge ability skills role team need needed
+required requirements preferred responsibilities using use etc
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.\-]*")
+
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text):
+    """Lowercase word tokens, keeping things like ``c++``, ``c#`` and ``node.js``."""
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        token = token.rstrip(".-")
+        if 1 < len(token) <= 40 and token not in STOPWORDS and not token.isdigit():
+            tokens.append(token)
+    return tokens
+
+
+def _segments(text):
+    # Lines (or sentences of long lines) act as the "documents" for IDF, so
+    # words that appear everywhere count for less than specific skills.
+    # Split on sentence-ending periods only, so "node.js" or "B.Tech" stay whole.
+    parts = re.split(r"[\n;•]+|\.(?:\s|$)", text or "")
+    return [tokens for tokens in (tokenize(p) for p in parts) if tokens]
+
+
+def score_locally(resume_text, job_description):
+    resume_tokens = tokenize(resume_text)
+    jd_tokens = tokenize(job_description)
+    if not resume_tokens or not jd_tokens:
+        return ResumeMatchResult(match_score=1.0, strengths=[], missing_keywords=[], improvement_tips=[])
+
+    vocab = {term: i for i, term in enumerate(sorted(set(resume_tokens) | set(jd_tokens)))}
+
+    def counts(tokens):
+        vector = np.zeros(len(vocab))
+        np.add.at(vector, [vocab[t] for t in tokens], 1)
+        return vector
+
+    resume_tf = counts(resume_tokens)
+    jd_tf = counts(jd_tokens)
+
+    segments = _segments(resume_text) + _segments(job_description)
+    df = np.zeros(len(vocab))
+    for segment in segments:
+        df[[vocab[t] for t in set(segment)]] += 1
+    n = len(segments)
+    idf = np.log1p((n - df + 0.5) / (df + 0.5))
+
+    # BM25 of the resume against the JD terms, normalised by the score the
+    # job description itself would get (i.e. a resume that echoes the JD).
+    query = jd_tf > 0
+    avg_len = (resume_tf.sum() + jd_tf.sum()) / 2
+
+    def bm25(tf):
+        saturation = tf * (K1 + 1) / (tf + K1 * (1 - B + B * tf.sum() / avg_len))
+        return float((idf * saturation)[query].sum())
+
+    coverage = min(1.0, bm25(resume_tf) / (bm25(jd_tf) or 1.0))
+
+    # TF-IDF cosine similarity of the two documents.
+    resume_vec = resume_tf * idf
+    jd_vec = jd_tf * idf
+    norm = np.linalg.norm(resume_vec) * np.linalg.norm(jd_vec)
+    cosine = float(resume_vec @ jd_vec / norm) if norm else 0.0
+
+    match_score = round(1 + 9 * min(1.0, 0.7 * coverage + 0.3 * cosine), 1)
+
+    terms = np.array(sorted(vocab, key=vocab.get))
+    weight = jd_tf * idf
+    missing_mask = query & (resume_tf == 0)
+    matched_mask = query & (resume_tf > 0)
+    missing = [str(t) for t in terms[missing_mask][np.argsort(-weight[missing_mask], kind="stable")][:10]]
+    matched = [str(t) for t in terms[matched_mask][np.argsort(-weight[matched_mask], kind="stable")][:3]]
+
+    return ResumeMatchResult(
+        match_score=match_score,
+        strengths=[f"Mentions '{term}' from the job description" for term in matched],
+        missing_keywords=missing,
+        improvement_tips=[f"Show experience with '{term}' if you have it" for term in missing[:3]],
+    )
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# -------- Client-side quota scheduler --------
+# One token bucket per model for requests per minute and one for tokens per
+# minute, kept in a small SQLite file so every worker process on the host
+# shares them. A call waits (queues) until both buckets have room, or is
+# shed with QuotaExceeded if that would take longer than
+# ANALYZER_QUOTA_MAX_WAIT or too many calls are already waiting. A 429 from
+# the API blocks the model for its retry-after delay in every worker.
+
+QUOTA_WAIT_SECONDS = metrics.histogram("analyzer_quota_wait_seconds", "Time spent waiting for model quota.")
+QUOTA_DECISIONS = metrics.counter("analyzer_quota_decisions_total", "Quota admissions by model and decision.")
+
+_RETRY_AFTER_PATTERNS = [
+    re.compile(r"retry[_ ]delay\s*\{\s*seconds:\s*(\d+(?:\.\d+)?)", re.IGNORECASE),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+    re.compile(r"retry-after:?\s*(\d+(?:\.\d+)?)", re.IGNORECASE),
+]
+
+_local = threading.local()
+
+
+class QuotaExceeded(Exception):
+    """The call would wait too long for quota; try another model or later."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+_UNLIMITED = {"rpm": float("inf"), "tpm": float("inf")}
+
+
+def _limits(model_name):
+    # Models without configured quotas still honour retry-after blocks.
+    return dict(_UNLIMITED, **settings.ANALYZER_QUOTAS.get(model_name, {}))
+
+
+def _connection():
+    path = str(settings.ANALYZER_QUOTA_DB)
+    conn = getattr(_local, "connections", {}).get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " model TEXT PRIMARY KEY, requests REAL, tokens REAL,"
+            " updated REAL, blocked_until REAL DEFAULT 0)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS waiting ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, model TEXT, since REAL)"
+        )
+        _local.__dict__.setdefault("connections", {})[path] = conn
+    return conn
+
+
+@contextmanager
+def _transaction():
+    # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write of
+    # a bucket is atomic across processes.
+    conn = _connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _refill(conn, model_name, limits, now):
+    """Return ``(requests, tokens, blocked_until)`` for ``model_name`` after refilling."""
+    row = conn.execute(
+        "SELECT requests, tokens, updated, blocked_until FROM buckets WHERE model = ?", (model_name,)
+    ).fetchone()
+    rpm, tpm = limits["rpm"], limits["tpm"]
+    if row is None:
+        return float(rpm), float(tpm), 0.0
+    requests, tokens, updated, blocked_until = row
+    elapsed = max(0.0, now - updated)
+
+    def refilled(level, limit):
+        return limit if limit == float("inf") else min(limit, level + elapsed * limit / 60)
+
+    return refilled(requests, rpm), refilled(tokens, tpm), blocked_until
+
+
+def _store(conn, model_name, requests, tokens, now, blocked_until):
+    conn.execute(
+        "INSERT OR REPLACE INTO buckets (model, requests, tokens, updated, blocked_until)"
+        " VALUES (?, ?, ?, ?, ?)",
+        (model_name, requests, tokens, now, blocked_until),
+    )
+
+
+def _try_take(model_name, limits, cost):
+    """Take one request and ``cost`` tokens; return 0 on success or the seconds to wait."""
+    now = time.time()
+    with _transaction() as conn:
+        requests, tokens, blocked_until = _refill(conn, model_name, limits, now)
+        if blocked_until > now:
+            wait = blocked_until - now
+        elif requests >= 1 and tokens >= cost:
+            _store(conn, model_name, requests - 1, tokens - cost, now, blocked_until)
+            return 0.0
+        else:
+            wait = max(
+                (1 - requests) * 60 / limits["rpm"],
+                (cost - tokens) * 60 / limits["tpm"],
+            )
+        _store(conn, model_name, requests, tokens, now, blocked_until)
+    return max(wait, 0.01)
+
+
+def queue_depth(model_name=None):
+    """Calls currently waiting for quota (all workers), optionally for one model."""
+    stale = time.time() - 2 * settings.ANALYZER_QUOTA_MAX_WAIT - 60
+    with _transaction() as conn:
+        # Rows left behind by a killed worker.
+        conn.execute("DELETE FROM waiting WHERE since < ?", (stale,))
+        if model_name is None:
+            return conn.execute("SELECT COUNT(*) FROM waiting").fetchone()[0]
+        return conn.execute("SELECT COUNT(*) FROM waiting WHERE model = ?", (model_name,)).fetchone()[0]
+
+
+def queue_depths():
+    rows = _connection().execute("SELECT model, COUNT(*) FROM waiting GROUP BY model").fetchall()
+    return dict(rows)
+
+
+def _admit_now(model_name, limits, cost, max_wait):
+    """Return 0 if admitted at once, else the wait; raise QuotaExceeded to shed."""
+    wait = _try_take(model_name, limits, cost)
+    if not wait:
+        QUOTA_DECISIONS.inc(model=model_name, decision="admitted")
+        return 0.0
+    if queue_depth() >= settings.ANALYZER_QUOTA_MAX_QUEUE or wait > max_wait:
+        QUOTA_DECISIONS.inc(model=model_name, decision="shed")
+        raise QuotaExceeded(f"No quota for {model_name} within {max_wait:.0f}s", retry_after=wait)
+    return wait
+
+
+def _enter_queue(model_name, started):
+    with _transaction() as conn:
+        return conn.execute(
+            "INSERT INTO waiting (model, since) VALUES (?, ?)", (model_name, started)
+        ).lastrowid
+
+
+def _leave_queue(waiter):
+    with _transaction() as conn:
+        conn.execute("DELETE FROM waiting WHERE id = ?", (waiter,))
+
+
+def _check_deadline(model_name, wait, deadline, max_wait):
+    if time.time() + wait > deadline:
+        QUOTA_DECISIONS.inc(model=model_name, decision="shed")
+        raise QuotaExceeded(f"No quota for {model_name} within {max_wait:.0f}s", retry_after=wait)
+
+
+def _admitted_after_wait(model_name, started):
+    waited = time.time() - started
+    QUOTA_WAIT_SECONDS.observe(waited, model=model_name)
+    QUOTA_DECISIONS.inc(model=model_name, decision="queued")
+    logger.info("Waited %.2fs for %s quota", waited, model_name)
+
+
+def acquire(model_name, tokens, max_wait=None):
+    """
+    Block until ``model_name`` has quota for one request of ``tokens`` tokens.
+
+    Raises QuotaExceeded instead of waiting longer than ``max_wait`` seconds
+    (default ANALYZER_QUOTA_MAX_WAIT) or when ANALYZER_QUOTA_MAX_QUEUE calls
+    are already waiting.
+    """
+    limits = _limits(model_name)
+    if max_wait is None:
+        max_wait = settings.ANALYZER_QUOTA_MAX_WAIT
+    # A request bigger than the whole bucket could never fit; let it take all of it.
+    cost = min(tokens, limits["tpm"])
+    started = time.time()
+    deadline = started + max_wait
+
+    wait = _admit_now(model_name, limits, cost, max_wait)
+    if not wait:
+        return
+
+    waiter = _enter_queue(model_name, started)
+    try:
+        while wait:
+            _check_deadline(model_name, wait, deadline, max_wait)
+            # Re-check at least every second: other workers may refund tokens.
+            time.sleep(min(wait, 1.0))
+            wait = _try_take(model_name, limits, cost)
+    finally:
+        _leave_queue(waiter)
+    _admitted_after_wait(model_name, started)
+
+
+async def aacquire(model_name, tokens, max_wait=None):
+    """
+    ``acquire`` for the async analysis path: the wait is an ``asyncio.sleep``,
+    so a queued call does not hold a thread. The bucket updates run on a
+    thread, since BEGIN IMMEDIATE can wait up to 30s for the write lock and
+    would stall every task on the event loop.
+    """
+    limits = _limits(model_name)
+    if max_wait is None:
+        max_wait = settings.ANALYZER_QUOTA_MAX_WAIT
+    cost = min(tokens, limits["tpm"])
+    started = time.time()
+    deadline = started + max_wait
+
+    wait = await asyncio.to_thread(_admit_now, model_name, limits, cost, max_wait)
+    if not wait:
+        return
+
+    waiter = await asyncio.to_thread(_enter_queue, model_name, started)
+    try:
+        while wait:
+            _check_deadline(model_name, wait, deadline, max_wait)
+            await asyncio.sleep(min(wait, 1.0))
+            wait = await asyncio.to_thread(_try_take, model_name, limits, cost)
+    finally:
+        await asyncio.to_thread(_leave_queue, waiter)
+    _admitted_after_wait(model_name, started)
+
+
+def settle(model_name, charged_tokens, actual_tokens):
+    """Correct the token bucket once the real token count of a call is known."""
+    limits = _limits(model_name)
+    if charged_tokens == actual_tokens:
+        return
+    now = time.time()
+    with _transaction() as conn:
+        requests, tokens, blocked_until = _refill(conn, model_name, limits, now)
+        tokens = min(limits["tpm"], tokens + min(charged_tokens, limits["tpm"]) - actual_tokens)
+        _store(conn, model_name, requests, tokens, now, blocked_until)
+
+
+def retry_after_seconds(error):
+    """The retry delay suggested by a quota error, or ANALYZER_QUOTA_DEFAULT_RETRY_AFTER."""
+    delay = getattr(error, "retry_after", None)
+    if delay:
+        return float(delay)
+    message = str(error)
+    for pattern in _RETRY_AFTER_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return float(settings.ANALYZER_QUOTA_DEFAULT_RETRY_AFTER)
+
+
+def block(model_name, seconds):
+    """Hold every worker's calls to ``model_name`` for ``seconds`` (after a 429)."""
+    now = time.time()
+    limits = _limits(model_name)
+    with _transaction() as conn:
+        requests, tokens, blocked_until = _refill(conn, model_name, limits, now)
+        _store(conn, model_name, 0.0, tokens, now, max(blocked_until, now + seconds))
+    logger.warning("%s rate limited; holding calls for %.0fs", model_name, seconds)
@@ -0,0 +1,78 @@
+import re
+from typing import List
+
+from pydantic import BaseModel, field_validator
+
+
+def _as_text(value):
+    if isinstance(value, dict):
+        return ", ".join(f"{key}: {_as_text(item)}" for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return "; ".join(_as_text(item) for item in value)
+    return str(value).strip()
+
+
+# -------- Define structured output --------
+class ResumeMatchResult(BaseModel):
+    match_score: float
+    strengths: List[str]
+    missing_keywords: List[str]
+    improvement_tips: List[str]
+    # Asked for by the prompts; the local scorer and results cached before
+    # PROMPT_VERSION 2 (batch results before 5) leave it empty.
+    schedule_plan_to_improve: List[str] = []
+
+    @field_validator("match_score", mode="before")
+    @classmethod
+    def _leading_number(cls, value):
+        # "7/10" or "8 out of 10" -> 7 / 8
+        if isinstance(value, str):
+            match = re.search(r"-?\d+(?:\.\d+)?", value)
+            if match:
+                return match.group(0)
+        return value
+
+    @field_validator("match_score")
+    @classmethod
+    def _on_scale(cls, value):
+        # The prompt asks for 1–10; keep a stray 12 (or 0) on that scale.
+        return min(10.0, max(1.0, value))
+
+    @field_validator(
+        "strengths", "missing_keywords", "improvement_tips", "schedule_plan_to_improve", mode="before"
+    )
+    @classmethod
+    def _as_list(cls, value):
+        if value is None:
+            return []
+        if isinstance(value, str):
+            # A plain string (often a bulleted block) instead of a list
+            lines = (line.strip(" \t-*•") for line in value.splitlines())
+            return [line for line in lines if line]
+        if isinstance(value, dict):
+            return [f"{key}: {_as_text(item)}" for key, item in value.items()]
+        if isinstance(value, (list, tuple)):
+            return [item if isinstance(item, str) else _as_text(item) for item in value]
+        return value
+
+
+# -------- Section-level analysis (analyzer.sections) --------
+class SectionFinding(BaseModel):
+    section: str
+    strengths: List[str] = []
+    matched_keywords: List[str] = []
+
+    @field_validator("section", mode="before")
+    @classmethod
+    def _bare_label(cls, value):
+        # "[experience-2]" -> "experience-2"
+        return str(value).strip().strip("[]").strip()
+
+    @field_validator("strengths", "matched_keywords", mode="before")
+    @classmethod
+    def _as_list(cls, value):
+        return ResumeMatchResult._as_list(value)
+
+
+class SectionedMatchResult(ResumeMatchResult):
+    section_findings: List[SectionFinding] = []
@@ -0,0 +1,179 @@
+import hashlib
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+
+from . import metrics
+from .cache import get_cache, normalize_text
+from .compaction import clean_text, count_tokens, section_priority, segment_sections
+
+
+# -------- Section-level incremental analysis --------
+# A re-uploaded resume usually differs from the last version by one job or
+# a few skills. The resume is split into sections (summary, skills,
+# education, and each experience or project entry). Every section is
+# fingerprinted together with the job description. The findings the model
+# reports for a section are cached under that fingerprint. A later analysis
+# sends only the sections the cache has not seen, plus a few lines that
+# summarize the cached findings of the rest. The model still judges the
+# whole resume and returns a full result.
+
+SECTIONS = metrics.counter(
+    "analyzer_resume_sections_total", "Resume sections per analysis: cached (findings reused) or new."
+)
+
+# Sections made of several entries, each fingerprinted on its own.
+ENTRY_SECTIONS = ("experience", "projects", "other")
+
+_DATE_RANGE_RE = re.compile(
+    r"\b(?:19|20)\d{2}\s*(?:-|–|—|to)\s*(?:(?:19|20)\d{2}|present|current|now)\b", re.IGNORECASE
+)
+_BULLET_RE = re.compile(r"^\s*[-•*▪◦·]")
+
+# How much of the cached findings of each kind of section goes into the prompt.
+SUMMARY_STRENGTHS = 3
+SUMMARY_KEYWORDS = 12
+
+# Stands in for a changed section left out of the prompt for length.
+OMITTED = "(not shown: over the length budget)"
+
+
+@dataclass
+class Section:
+    id: str
+    name: str
+    text: str
+    key: str
+    findings: Optional[dict] = None  # {"strengths": [...], "matched_keywords": [...]} once known
+
+
+def _split_entries(text):
+    """Split an experience or projects block into entries."""
+    entries = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    if len(entries) == 1:
+        # No blank lines (common in PDF text): an entry starts at a line with
+        # a date range, or at the title line just before it.
+        lines = text.splitlines()
+        starts = [0]
+        for i, line in enumerate(lines):
+            if not _DATE_RANGE_RE.search(line):
+                continue
+            previous = lines[i - 1] if i > 0 else ""
+            start = i
+            if previous and len(previous) <= 80 and not _BULLET_RE.match(previous) and not _DATE_RANGE_RE.search(previous):
+                start = i - 1
+            if start > starts[-1]:
+                starts.append(start)
+        bounds = zip(starts, starts[1:] + [len(lines)])
+        entries = [entry for entry in ("\n".join(lines[a:b]).strip() for a, b in bounds) if entry]
+
+    if len(entries) > 1 and "\n" not in entries[0]:
+        # A lone heading line belongs with the first entry.
+        entries[:2] = [f"{entries[0]}\n{entries[1]}"]
+    return entries
+
+
+def _fingerprint(text, job_description, prompt_version):
+    digest = hashlib.sha256()
+    for part in (normalize_text(text), normalize_text(job_description), prompt_version):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return f"section:{digest.hexdigest()}"
+
+
+def split_resume(resume_text, job_description, prompt_version):
+    """Fingerprinted sections of ``resume_text``, with cached findings filled in."""
+    cache = get_cache()
+    numbers = Counter()
+    sections = []
+    for name, text in segment_sections(clean_text(resume_text)):
+        for part in _split_entries(text) if name in ENTRY_SECTIONS else [text]:
+            numbers[name] += 1
+            key = _fingerprint(part, job_description, prompt_version)
+            sections.append(Section(f"{name}-{numbers[name]}", name, part, key, cache.get(key)))
+    cached = sum(1 for s in sections if s.findings is not None)
+    SECTIONS.inc(cached, outcome="cached")
+    SECTIONS.inc(len(sections) - cached, outcome="new")
+    return sections
+
+
+def fit_changed(sections, budget):
+    """
+    Ids of the sections without cached findings that are sent in full: the
+    most important ones (compaction.SECTION_PRIORITY) that fit ``budget``.
+    """
+    kept, remaining = set(), budget
+    changed = [s for s in sections if s.findings is None]
+    for section in sorted(changed, key=lambda s: section_priority(s.name)):
+        cost = count_tokens(section.text) + 4
+        if cost <= remaining:
+            kept.add(section.id)
+            remaining -= cost
+    return kept
+
+
+def render_changed(sections, budget):
+    """
+    The sections without cached findings, labelled ``[id]``. Those that do
+    not fit ``budget`` (see fit_changed) get a one-line placeholder, so the
+    model knows the resume has more than it was shown.
+    """
+    kept = fit_changed(sections, budget)
+    return "\n\n".join(
+        f"[{s.id}]\n{s.text}" if s.id in kept else f"[{s.id}] {OMITTED}"
+        for s in sections if s.findings is None
+    )
+
+
+def render_findings(sections):
+    """
+    What the model found before in the cached sections, one line per kind
+    of section (all experience entries together), so the summary stays
+    much shorter than the text it stands for.
+    """
+    grouped = {}
+    for section in sections:
+        if section.findings is None:
+            continue
+        group = grouped.setdefault(section.name, {"count": 0, "strengths": {}, "keywords": {}})
+        group["count"] += 1
+        for strength in section.findings["strengths"]:
+            group["strengths"].setdefault(strength.lower(), strength)
+        for keyword in section.findings["matched_keywords"]:
+            group["keywords"].setdefault(keyword.lower(), keyword)
+
+    lines = []
+    for name, group in grouped.items():
+        label = name if group["count"] == 1 else f"{name} ({group['count']} entries)"
+        strengths = "; ".join(list(group["strengths"].values())[:SUMMARY_STRENGTHS]) or "none noted"
+        keywords = ", ".join(list(group["keywords"].values())[:SUMMARY_KEYWORDS]) or "none"
+        lines.append(f"{label}: strengths: {strengths} | matches: {keywords}")
+    return "\n".join(lines)
+
+
+def merge_findings(sections, parsed, sent):
+    """
+    Cache the findings the model reported for the sections it was sent in
+    full (the ids in ``sent``), and fold every section's findings into
+    ``parsed`` (a SectionedMatchResult dict), returning a plain
+    ResumeMatchResult dict.
+    """
+    by_id = {s.id: s for s in sections}
+    cache = get_cache()
+    for finding in parsed.pop("section_findings", None) or []:
+        section = by_id.get(finding["section"]) if finding["section"] in sent else None
+        if section is None or section.findings is not None:
+            continue  # an unknown label, or a section that was only summarized or left out
+        section.findings = {"strengths": finding["strengths"], "matched_keywords": finding["matched_keywords"]}
+        cache.set(section.key, section.findings, expire=settings.ANALYSIS_CACHE_TTL)
+
+    # The model saw cached sections only as a summary, so it may call a
+    # keyword missing that one of them matched.
+    matched = {
+        keyword.lower() for s in sections if s.findings for keyword in s.findings["matched_keywords"]
+    }
+    parsed["missing_keywords"] = [k for k in parsed.get("missing_keywords", []) if k.lower() not in matched]
+    return parsed
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, TimeoutError
+
+from django.conf import settings
+
+from . import metrics
+from .cache import COALESCED_KEY, get_cache
+
+logger = logging.getLogger(__name__)
+
+
+# -------- Single-flight analyses --------
+# Identical analyses (same normalized resume and job description) that
+# overlap in time share one run. Within a process, later callers wait on the
+# first caller's future. Across worker processes, a lease in the shared
+# diskcache marks the running analysis; other workers wait for the lease to
+# go and then read the result from the analysis cache, where the leader
+# stored it.
+
+SINGLE_FLIGHT = metrics.counter(
+    "analyzer_singleflight_total",
+    "Analyses by single-flight role: leader, joined (same worker), joined_remote (other worker), gave_up.",
+)
+
+_flights = {}
+_lock = threading.Lock()
+
+
+def _join_or_lead(key):
+    """Return ``(future, is_leader)`` for the in-process flight of ``key``."""
+    with _lock:
+        future = _flights.get(key)
+        if future is not None:
+            return future, False
+        future = _flights[key] = Future()
+        return future, True
+
+
+def _land(key, future, result=None, error=None):
+    # Unregister first: a caller arriving now finds the result in the cache.
+    with _lock:
+        _flights.pop(key, None)
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _saved(role):
+    SINGLE_FLIGHT.inc(role=role)
+    get_cache().incr(COALESCED_KEY)
+    logger.info("Coalesced with a running analysis (%s)", role)
+
+
+def _try_lease(key):
+    """Take the lease on ``key``; return its token, or None if another worker holds it."""
+    token = f"{os.getpid()}:{uuid.uuid4().hex}"
+    return token if get_cache().add(key, token, expire=settings.ANALYZER_SINGLEFLIGHT_LEASE) else None
+
+
+def _lease_held(key):
+    return key in get_cache()
+
+
+def _release(key, token):
+    # An analysis that outlived its lease may find another worker's lease
+    # in its place; only delete the one this run took.
+    cache = get_cache()
+    with cache.transact():
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+def run(key, compute, lookup):
+    """
+    Return ``(compute(), "leader")``, or the result of an identical analysis
+    already running here or in another worker with role "joined" or
+    "joined_remote". ``lookup()`` reads the shared result cache and returns
+    None on a miss. Waiting is bounded by ANALYZER_SINGLEFLIGHT_WAIT, after
+    which the caller computes the result itself ("gave_up").
+    """
+    deadline = time.monotonic() + settings.ANALYZER_SINGLEFLIGHT_WAIT
+    future, leader = _join_or_lead(key)
+    if not leader:
+        try:
+            result = future.result(timeout=settings.ANALYZER_SINGLEFLIGHT_WAIT)
+        except TimeoutError:
+            SINGLE_FLIGHT.inc(role="gave_up")
+            return compute(), "gave_up"
+        _saved("joined")
+        return result, "joined"
+
+    try:
+        result, role = _run_leased(key, compute, lookup, deadline)
+    except BaseException as e:
+        _land(key, future, error=e)
+        raise
+    _land(key, future, result)
+    return result, role
+
+
+def _run_leased(key, compute, lookup, deadline):
+    while (token := _try_lease(key)) is None:
+        # Another worker process is running this analysis.
+        if time.monotonic() > deadline:
+            SINGLE_FLIGHT.inc(role="gave_up")
+            return compute(), "gave_up"
+        time.sleep(settings.ANALYZER_SINGLEFLIGHT_POLL)
+        if not _lease_held(key):
+            result = lookup()
+            if result is not None:
+                _saved("joined_remote")
+                return result, "joined_remote"
+            # It failed or its worker died; try to take over.
+
+    SINGLE_FLIGHT.inc(role="leader")
+    try:
+        return compute(), "leader"
+    finally:
+        _release(key, token)
+
+
+async def arun(key, compute, lookup):
+    """``run`` for the async path; ``compute`` is a coroutine function."""
+    deadline = time.monotonic() + settings.ANALYZER_SINGLEFLIGHT_WAIT
+    future, leader = _join_or_lead(key)
+    if not leader:
+        try:
+            result = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)), settings.ANALYZER_SINGLEFLIGHT_WAIT,
+            )
+        except asyncio.TimeoutError:
+            SINGLE_FLIGHT.inc(role="gave_up")
+            return await compute(), "gave_up"
+        _saved("joined")
+        return result, "joined"
+
+    try:
+        result, role = await _arun_leased(key, compute, lookup, deadline)
+    except BaseException as e:
+        _land(key, future, error=e)
+        raise
+    _land(key, future, result)
+    return result, role
+
+
+async def _arun_leased(key, compute, lookup, deadline):
+    # The lease lives in SQLite (diskcache), so touching it can block on a
+    # lock held by another worker: keep that off the event loop.
+    while (token := await asyncio.to_thread(_try_lease, key)) is None:
+        if time.monotonic() > deadline:
+            SINGLE_FLIGHT.inc(role="gave_up")
+            return await compute(), "gave_up"
+        await asyncio.sleep(settings.ANALYZER_SINGLEFLIGHT_POLL)
+        if not await asyncio.to_thread(_lease_held, key):
+            result = await asyncio.to_thread(lookup)
+            if result is not None:
+                _saved("joined_remote")
+                return result, "joined_remote"
+
+    SINGLE_FLIGHT.inc(role="leader")
+    try:
+        return await compute(), "leader"
+    finally:
+        await asyncio.to_thread(_release, key, token)
@@ -0,0 +1,98 @@
+import json
+import queue
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from . import jobs
+from .models import AnalysisJob
+
+
+# -------- Server-sent analysis events --------
+# The analysis runs as an AnalysisJob (analyzer.jobs), like any other. The
+# response generator subscribes to the job's progress events and turns each
+# into an SSE frame as soon as it arrives, so the browser sees something
+# within milliseconds. The job's row decides when the stream ends, so a job
+# run by another process (or one that finished before the stream
+# subscribed) still ends the stream.
+
+HEARTBEAT_SECONDS = 15
+POLL_SECONDS = 2  # how often the job's row is re-read when no event arrives
+
+_DONE = object()
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _job_state(job_id):
+    try:
+        return AnalysisJob.objects.only("status", "result", "error").get(pk=job_id)
+    finally:
+        # Frames may be produced on executor threads (see aiterate).
+        close_old_connections()
+
+
+def _finished(job, format_result):
+    if job.status == AnalysisJob.FAILED or not job.result:
+        yield sse("error", {"message": job.error or "No result from analyzer"})
+        return
+    result = job.result
+    yield sse("score", {"ats_score": format_result(result)["ats_score"]})
+    for strength in result.get("strengths", []):
+        yield sse("strength", {"text": strength})
+    for keyword in result.get("missing_keywords", []):
+        yield sse("missing_keyword", {"text": keyword})
+    for tip in result.get("improvement_tips", []):
+        yield sse("tip", {"text": tip})
+    yield sse("done", format_result(result))
+
+
+def job_events(job_id, format_result, provisional=None, status_url=None):
+    """
+    Yield SSE frames for an AnalysisJob, ending with ``done`` or ``error``,
+    or with ``pending`` (and its ``status_url`` to poll) once the stream has
+    run for ANALYSIS_STREAM_MAX_SECONDS.
+    """
+    if provisional is not None:
+        yield sse("provisional", provisional)
+
+    events = jobs.subscribe(job_id)
+    try:
+        deadline = time.monotonic() + settings.ANALYSIS_STREAM_MAX_SECONDS
+        last_frame = time.monotonic()
+        while True:
+            job = _job_state(job_id)
+            if job.status in (AnalysisJob.SUCCEEDED, AnalysisJob.FAILED):
+                yield from _finished(job, format_result)
+                return
+            if time.monotonic() > deadline:
+                yield sse("pending", {"status": job.status, "status_url": status_url})
+                return
+
+            try:
+                name, data = events.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                if time.monotonic() - last_frame >= HEARTBEAT_SECONDS:
+                    # Comment frame keeps proxies from closing an idle connection.
+                    yield ": keep-alive\n\n"
+                    last_frame = time.monotonic()
+                continue
+
+            if name != "job_status":
+                yield sse(name, data)
+                last_frame = time.monotonic()
+    finally:
+        jobs.unsubscribe(job_id, events)
+
+
+async def aiterate(frames):
+    """Drive a blocking frame generator from async code (ASGI) without blocking the loop."""
+    while True:
+        frame = await sync_to_async(next, thread_sensitive=False)(frames, _DONE)
+        if frame is _DONE:
+            return
+        yield frame
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+from django.conf import settings
+
+
+# -------- Offline LLM stub --------
+# Drop-in for a Portia client, selected with ANALYZER_LLM_BACKEND = "stub".
+# It sleeps for a configurable latency, fails at configurable rates and
+# returns canned ResumeMatchResult JSON, so the whole analysis path (cache,
+# fallback, compaction, jobs, views) can run and be benchmarked with no
+# network or API key.
+
+# "[id]" labels of batch items and resume sections
+_PAIR_ID_RE = re.compile(r"^\[([^\]]+)\]", re.MULTILINE)
+
+
+class StubLLMError(Exception):
+    pass
+
+
+class _StubOutputs:
+    def __init__(self, value):
+        self.value = value
+
+    def model_dump(self):
+        return {"final_output": {"value": self.value}}
+
+
+class _StubPlanRun:
+    def __init__(self, value):
+        self.outputs = _StubOutputs(value)
+
+
+class StubPortia:
+    """Answers ``run_plan`` like a Portia client backed by a fake model."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(settings.ANALYZER_STUB.get("SEED"))
+
+    def _draw(self):
+        with self._lock:
+            self.calls += 1
+            return self._random.random(), self._random.random(), self._random.random()
+
+    def _latency_and_failure(self, plan_run_inputs):
+        config = settings.ANALYZER_STUB
+        failure_roll, jitter_roll, malformed_roll = self._draw()
+        latency = config.get("MODEL_LATENCY", {}).get(self.model_name, config["LATENCY"])
+        latency = max(0.0, latency + config.get("JITTER", 0.0) * (2 * jitter_roll - 1))
+        # Longer prompts take longer to read
+        characters = sum(len(str(value)) for value in (plan_run_inputs or {}).values())
+        latency += config.get("INPUT_LATENCY", 0.0) * characters / 4000
+
+        rate_limit_rate = config.get("RATE_LIMIT_RATE", 0.0)
+        if failure_roll < rate_limit_rate:
+            return latency, StubLLMError(f"429 RESOURCE_EXHAUSTED: stub quota for {self.model_name}"), False
+        if failure_roll < rate_limit_rate + config.get("ERROR_RATE", 0.0):
+            return latency, StubLLMError(f"Injected stub failure for {self.model_name}"), False
+        return latency, None, malformed_roll < config.get("MALFORMED_RATE", 0.0)
+
+    def _answer(self, plan_run_inputs, malformed=False):
+        inputs = plan_run_inputs or {}
+        result = dict(settings.ANALYZER_STUB["RESULT"])
+        if "changed_sections" in inputs:
+            # Section plan (analyzer.sections): findings for each [section-id] sent.
+            value = dict(result, section_findings=[
+                {"section": section_id, "strengths": result["strengths"][:1], "matched_keywords": ["Python"]}
+                for section_id in _PAIR_ID_RE.findall(inputs["changed_sections"])
+            ])
+        elif "items" in inputs:
+            # Batch plan (analyzer.batch): one result per [pair_id] item.
+            value = {
+                "results": [
+                    dict(result, pair_id=pair_id)
+                    for pair_id in _PAIR_ID_RE.findall(inputs["items"])
+                ]
+            }
+        else:
+            value = result
+        text = json.dumps(value)
+        if malformed:
+            # The usual LLM slips: code fence, single quotes, trailing comma.
+            text = "```json\n" + text[:-1].replace('"', "'") + ",}\n```"
+        return _StubPlanRun(text)
+
+    def run_plan(self, plan, plan_run_inputs=None, end_user=None):
+        latency, error, malformed = self._latency_and_failure(plan_run_inputs)
+        time.sleep(latency)
+        if error:
+            raise error
+        return self._answer(plan_run_inputs, malformed)
+
+    async def arun_plan(self, plan, plan_run_inputs=None, end_user=None):
+        latency, error, malformed = self._latency_and_failure(plan_run_inputs)
+        await asyncio.sleep(latency)
+        if error:
+            raise error
+        return self._answer(plan_run_inputs, malformed)
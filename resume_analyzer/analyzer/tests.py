@@ -1,3 +1,684 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+import orjson
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from . import cache, history, index, neardup, quota, singleflight
+from .compaction import count_tokens
+from .fallback import ModelHealth, _record_outcome
+from .forms import TextDocumentForm
+from .models import AnalysisJob, AnalysisResult, TextDocument
+from .parsing import OutputParseError, parse_json, parse_output, repair_json
+from .schemas import ResumeMatchResult
+from .sections import OMITTED, Section, _split_entries, merge_findings, render_changed
+from .streaming import _finished
+from .views import format_result
+
+
+VALID = (
+    '{"match_score": 7, "strengths": ["Python"], "missing_keywords": ["Docker"], '
+    '"improvement_tips": ["Add a Docker project"]}'
+)
+
+
+class RepairJsonTests(SimpleTestCase):
+    def assertRepairs(self, raw, expected):
+        self.assertEqual(orjson.loads(repair_json(raw)), expected)
+
+    def test_code_fence(self):
+        self.assertRepairs('```json\n{"a": 1}\n```', {"a": 1})
+
+    def test_unterminated_code_fence(self):
+        self.assertRepairs('```json\n{"a": 1}', {"a": 1})
+
+    def test_prose_around_the_object(self):
+        self.assertRepairs('Here is the result:\n{"a": [1, 2]}\nHope this helps!', {"a": [1, 2]})
+
+    def test_single_quotes(self):
+        self.assertRepairs("{'a': 'b', 'c': ['d']}", {"a": "b", "c": ["d"]})
+
+    def test_apostrophe_inside_single_quotes(self):
+        self.assertRepairs("{'tips': ['Don't list every tool']}", {"tips": ["Don't list every tool"]})
+
+    def test_escaped_apostrophe_inside_single_quotes(self):
+        self.assertRepairs("{'strengths': ['it\\'s good']}", {"strengths": ["it's good"]})
+
+    def test_double_quote_inside_single_quotes(self):
+        self.assertRepairs("{'tip': 'Say \"led\" not \"helped\"'}", {"tip": 'Say "led" not "helped"'})
+
+    def test_unquoted_keys(self):
+        self.assertRepairs('{match_score: 7, strengths: ["a"]}', {"match_score": 7, "strengths": ["a"]})
+
+    def test_python_literals(self):
+        self.assertRepairs("{'a': True, 'b': False, 'c': None}", {"a": True, "b": False, "c": None})
+
+    def test_trailing_commas(self):
+        self.assertRepairs('{"a": [1, 2,], "b": 3,}', {"a": [1, 2], "b": 3})
+
+    def test_newline_inside_a_string(self):
+        self.assertRepairs('{"a": "line one\nline two"}', {"a": "line one\nline two"})
+
+    def test_truncated_mid_list_item(self):
+        # A cut-off list item is dropped.
+        self.assertRepairs('{"a": ["done", "half wri', {"a": ["done"]})
+
+    def test_truncated_mid_value(self):
+        # A cut-off value is kept.
+        self.assertRepairs('{"a": 1, "b": "half wri', {"a": 1, "b": "half wri"})
+
+    def test_truncated_mid_array(self):
+        self.assertRepairs('{"a": [1, 2, ', {"a": [1, 2]})
+
+    def test_truncated_mid_key(self):
+        self.assertRepairs('{"a": 1, "stre', {"a": 1})
+
+    def test_truncated_after_key(self):
+        self.assertRepairs('{"a": 1, "b":', {"a": 1})
+
+    def test_truncated_nested(self):
+        self.assertRepairs('{"a": {"b": [{"c": 1}, {"d": ', {"a": {"b": [{"c": 1}, {}]}})
+
+    def test_no_json(self):
+        with self.assertRaises(OutputParseError):
+            repair_json("Sorry, I cannot help with that.")
+
+
+class ParseOutputTests(SimpleTestCase):
+    def test_clean_output_is_not_repaired(self):
+        value, repaired = parse_json(VALID)
+        self.assertFalse(repaired)
+        self.assertEqual(value["match_score"], 7)
+
+    def test_malformed_output_is_repaired(self):
+        raw = "```json\n" + VALID.replace('"', "'")[:-1] + ",}\n```"
+        value, repaired = parse_json(raw)
+        self.assertTrue(repaired)
+        self.assertEqual(value["missing_keywords"], ["Docker"])
+
+    def test_dict_and_bytes(self):
+        self.assertEqual(parse_json({"a": 1}), ({"a": 1}, False))
+        self.assertEqual(parse_json(b'{"a": 1}'), ({"a": 1}, False))
+
+    def test_validates_against_the_schema(self):
+        result = parse_output(VALID, ResumeMatchResult)
+        self.assertEqual(result.strengths, ["Python"])
+        self.assertEqual(result.schedule_plan_to_improve, [])
+
+    def test_score_as_text(self):
+        raw = VALID.replace('"match_score": 7', '"match_score": "8 out of 10"')
+        self.assertEqual(parse_output(raw, ResumeMatchResult).match_score, 8)
+
+    def test_score_is_kept_on_scale(self):
+        raw = VALID.replace('"match_score": 7', '"match_score": 12')
+        self.assertEqual(parse_output(raw, ResumeMatchResult).match_score, 10)
+        raw = VALID.replace('"match_score": 7', '"match_score": 0')
+        self.assertEqual(parse_output(raw, ResumeMatchResult).match_score, 1)
+
+    def test_bulleted_string_instead_of_list(self):
+        raw = VALID.replace('["Python"]', '"- Python\\n- Django"')
+        self.assertEqual(parse_output(raw, ResumeMatchResult).strengths, ["Python", "Django"])
+
+    def test_missing_field(self):
+        with self.assertRaises(OutputParseError):
+            parse_output('{"match_score": 7, "strengths": []}', ResumeMatchResult)
+
+    def test_score_that_is_not_a_number(self):
+        raw = VALID.replace('"match_score": 7', '"match_score": "high"')
+        with self.assertRaises(OutputParseError):
+            parse_output(raw, ResumeMatchResult)
+
+    def test_unrepairable_output(self):
+        with self.assertRaises(OutputParseError):
+            parse_output("The candidate is a strong match.", ResumeMatchResult)
+
+    def test_wrong_top_level_type(self):
+        with self.assertRaises(OutputParseError):
+            parse_output('["not", "an", "object"]', ResumeMatchResult)
+
+
+# -------- Near-duplicate reuse (analyzer.neardup) --------
+
+SKILLS = "python django postgres redis celery docker linux git testing design".split()
+NEAR_RESUME = "Backend Engineer, Acme 2019 - 2023\n" + "\n".join(
+    f"- Built {SKILLS[i % 10]} service {i} with {SKILLS[i * 7 % 10]} for team {i}" for i in range(40)
+)
+NEAR_JD = "We need a backend engineer. " + " ".join(
+    f"Duty {i}: own {skill} systems end to end." for i, skill in enumerate(SKILLS)
+) + " Salary 100k."
+
+
+class NearDuplicateSignatureTests(SimpleTestCase):
+    def test_identical_texts(self):
+        self.assertEqual(neardup.similarity(neardup.signature(NEAR_RESUME), neardup.signature(NEAR_RESUME)), 1.0)
+
+    def test_whitespace_and_case_do_not_matter(self):
+        reformatted = NEAR_RESUME.upper().replace("\n", "\n\n  ")
+        self.assertEqual(neardup.similarity(neardup.signature(NEAR_RESUME), neardup.signature(reformatted)), 1.0)
+
+    def test_unrelated_texts(self):
+        similarity = neardup.similarity(neardup.signature(NEAR_RESUME), neardup.signature(NEAR_JD))
+        self.assertLess(similarity, 0.1)
+
+    def test_small_edit(self):
+        edited = NEAR_RESUME.replace("service 3 ", "service three ")
+        similarity = neardup.similarity(neardup.signature(NEAR_RESUME), neardup.signature(edited))
+        self.assertGreater(similarity, 0.9)
+        self.assertLess(similarity, 1.0)
+
+    def test_no_words(self):
+        self.assertIsNone(neardup.signature("  ,.;  "))
+        self.assertEqual(neardup.similarity(None, neardup.signature(NEAR_RESUME)), 0.0)
+
+    def test_stable_across_processes(self):
+        # Signatures are stored, so another process must compute the same hash family.
+        script = (
+            "import django, sys; django.setup(); from analyzer import neardup; "
+            "sys.stdout.write(neardup.signature(sys.stdin.read()).tobytes().hex())"
+        )
+        child = subprocess.run(
+            [sys.executable, "-c", script], input=NEAR_RESUME, capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR, env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+        )
+        self.assertEqual(child.stdout, neardup.signature(NEAR_RESUME).tobytes().hex())
+
+    def test_band_keys_depend_on_kind(self):
+        sig = neardup.signature(NEAR_RESUME)
+        self.assertEqual(neardup._band_keys(sig, "resume"), neardup._band_keys(sig.copy(), "resume"))
+        self.assertFalse(set(neardup._band_keys(sig, "resume")) & set(neardup._band_keys(sig, "jd")))
+
+
+class FindReusableTests(TestCase):
+    def analyzed(self, resume_text=NEAR_RESUME, job_description=NEAR_JD, answered_by=AnalysisResult.LLM):
+        doc = TextDocument.objects.create(
+            file="blobs/test.txt", extracted_text=resume_text, job_description=job_description, extraction_seconds=0.0,
+        )
+        neardup.index_document(doc)
+        result = AnalysisResult.objects.create(
+            document=doc, match_score=7, strengths=["Python"], answered_by=answered_by, prompt_version="3",
+        )
+        return doc, result
+
+    def find(self, resume_text=NEAR_RESUME, job_description=NEAR_JD, prompt_version="3"):
+        return neardup.find_reusable(resume_text, job_description, prompt_version, 0.98, 0.85)
+
+    def test_reformatted_resume_and_edited_jd(self):
+        _, result = self.analyzed()
+        match = self.find(NEAR_RESUME.replace("\n-", "\n  *"), NEAR_JD.replace(" Salary 100k.", ""))
+        self.assertIsNotNone(match)
+        self.assertEqual(match[0], result)
+        self.assertEqual(match[1], 1.0)
+        self.assertGreaterEqual(match[2], 0.85)
+
+    def test_no_candidates(self):
+        self.analyzed()
+        self.assertIsNone(self.find("Pastry chef with ten years in French bakeries and cafes", NEAR_JD))
+
+    def test_both_texts_must_clear_their_threshold(self):
+        self.analyzed()
+        other_jd = "Hiring a pastry chef for a French bakery. " + NEAR_JD[:60]
+        self.assertIsNone(self.find(NEAR_RESUME, other_jd))
+
+    def test_resume_with_a_new_keyword_is_not_reused(self):
+        self.analyzed()
+        edited = NEAR_RESUME + "\n- Ran Kubernetes clusters"
+        self.assertIsNone(self.find(edited, NEAR_JD))
+
+    def test_job_description_with_a_new_keyword_is_not_reused(self):
+        self.analyzed()
+        edited = NEAR_JD.replace("Salary 100k.", "Kubernetes required. Salary 100k.")
+        self.assertGreaterEqual(
+            neardup.similarity(neardup.signature(NEAR_JD), neardup.signature(edited)), 0.85,
+        )
+        self.assertIsNone(self.find(NEAR_RESUME, edited))
+
+    def test_other_prompt_version(self):
+        self.analyzed()
+        self.assertIsNone(self.find(prompt_version="2"))
+
+    def test_local_and_near_duplicate_results_are_never_reused(self):
+        for answered_by in (AnalysisResult.LOCAL, AnalysisResult.NEAR_DUPLICATE):
+            with self.subTest(answered_by=answered_by):
+                doc, _ = self.analyzed(answered_by=answered_by)
+                self.assertIsNone(self.find())
+                doc.delete()
+
+    def test_latest_real_result_is_reused(self):
+        doc, first = self.analyzed()
+        AnalysisResult.objects.create(document=doc, match_score=5, answered_by=AnalysisResult.LOCAL, prompt_version="3")
+        self.assertEqual(self.find()[0], first)
+
+
+# -------- Section-level analysis (analyzer.sections) --------
+
+class SplitEntriesTests(SimpleTestCase):
+    def test_blank_lines(self):
+        text = "Acme 2019 - 2021\n- Built APIs\n\nBeta 2021 - 2023\n- Ran teams"
+        self.assertEqual(_split_entries(text), ["Acme 2019 - 2021\n- Built APIs", "Beta 2021 - 2023\n- Ran teams"])
+
+    def test_date_ranges_with_title_lines(self):
+        text = "Engineer\nAcme 2019 - 2021\n- Built APIs\nDeveloper\nBeta 2021 - Present\n- Ran teams"
+        self.assertEqual(_split_entries(text), [
+            "Engineer\nAcme 2019 - 2021\n- Built APIs", "Developer\nBeta 2021 - Present\n- Ran teams",
+        ])
+
+    def test_bullet_before_a_date_range_is_not_a_title(self):
+        text = "Acme 2019 - 2021\n- Built APIs\nBeta 2021 to now\n- Ran teams"
+        self.assertEqual(_split_entries(text), ["Acme 2019 - 2021\n- Built APIs", "Beta 2021 to now\n- Ran teams"])
+
+    def test_lone_heading_joins_the_first_entry(self):
+        text = "Selected work\n\nAcme 2019 - 2021\n- Built APIs\n\nBeta 2021 - 2023\n- Ran teams"
+        self.assertEqual(_split_entries(text), [
+            "Selected work\nAcme 2019 - 2021\n- Built APIs", "Beta 2021 - 2023\n- Ran teams",
+        ])
+
+    def test_single_entry(self):
+        self.assertEqual(_split_entries("Acme\n- Built APIs\n- Ran teams"), ["Acme\n- Built APIs\n- Ran teams"])
+
+
+def _section(id, text, findings=None):
+    return Section(id, id.rsplit("-", 1)[0], text, f"section:{id}", findings)
+
+
+class RenderChangedTests(SimpleTestCase):
+    def setUp(self):
+        self.experience = _section("experience-1", "Acme 2019 - 2021\n- Built payment APIs in Python and Django")
+        self.skills = _section("skills-1", "Python, Django, Postgres")
+        self.education = _section("education-1", "BSc Computer Science", {"strengths": [], "matched_keywords": []})
+        self.sections = [self.experience, self.skills, self.education]
+
+    def test_everything_fits(self):
+        self.assertEqual(
+            render_changed(self.sections, 1000),
+            f"[experience-1]\n{self.experience.text}\n\n[skills-1]\n{self.skills.text}",
+        )
+
+    def test_over_budget_sections_get_a_placeholder(self):
+        # Skills come first in SECTION_PRIORITY, so they take the budget.
+        budget = count_tokens(self.skills.text) + 4
+        self.assertEqual(
+            render_changed(self.sections, budget),
+            f"[experience-1] {OMITTED}\n\n[skills-1]\n{self.skills.text}",
+        )
+
+    def test_nothing_changed(self):
+        self.assertEqual(render_changed([self.education], 1000), "")
+
+
+def use_temp_cache(test):
+    """Point the analysis cache (analyzer.cache) at an empty directory for ``test``."""
+    directory = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+    settings_override = override_settings(ANALYSIS_CACHE_DIR=directory)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    cache._cache = None
+    test.addCleanup(setattr, cache, "_cache", None)
+
+
+class MergeFindingsTests(SimpleTestCase):
+    def setUp(self):
+        use_temp_cache(self)
+        self.sent = _section("experience-1", "Acme 2019 - 2021\n- Built APIs")
+        self.left_out = _section("experience-2", "Beta 2021 - 2023\n- Ran teams")
+        self.cached = _section("skills-1", "Docker, Python", {"strengths": ["Tooling"], "matched_keywords": ["Docker"]})
+        self.sections = [self.sent, self.left_out, self.cached]
+
+    def merge(self, **parsed):
+        def finding(section_id, keyword):
+            return {"section": section_id, "strengths": [f"{section_id} strength"], "matched_keywords": [keyword]}
+        parsed.setdefault("section_findings", [
+            finding("experience-1", "APIs"), finding("experience-2", "Leadership"),
+            finding("skills-1", "Python"), finding("projects-9", "Rust"),
+        ])
+        return merge_findings(self.sections, parsed, {"experience-1"})
+
+    def test_caches_only_sections_sent_in_full(self):
+        self.merge()
+        store = cache.get_cache()
+        self.assertEqual(store.get(self.sent.key), {"strengths": ["experience-1 strength"], "matched_keywords": ["APIs"]})
+        self.assertIsNone(store.get(self.left_out.key))
+        self.assertIsNone(self.left_out.findings)
+
+    def test_cached_sections_keep_their_findings(self):
+        self.merge()
+        self.assertEqual(self.cached.findings["matched_keywords"], ["Docker"])
+        self.assertIsNone(cache.get_cache().get(self.cached.key))
+
+    def test_unknown_labels_are_ignored(self):
+        self.merge(section_findings=[{"section": "projects-9", "strengths": ["x"], "matched_keywords": ["Rust"]}])
+        self.assertEqual(len(cache.get_cache()), 0)
+
+    def test_missing_keywords_matched_elsewhere_are_dropped(self):
+        parsed = self.merge(missing_keywords=["docker", "APIs", "Kubernetes"])
+        self.assertEqual(parsed["missing_keywords"], ["Kubernetes"])
+        self.assertNotIn("section_findings", parsed)
+
+
+# -------- Model health (analyzer.fallback) --------
+
+class CircuitBreakerTests(SimpleTestCase):
+    def tripped(self):
+        health = ModelHealth("test-model")
+        health.record_failure(0.1, rate_limited=True)
+        self.assertFalse(health.available())
+        health.open_until = time.monotonic() - 1  # the cooldown has run out
+        return health
+
+    def test_error_rate_opens_the_circuit(self):
+        health = ModelHealth("test-model")
+        for _ in range(settings.ANALYZER_CIRCUIT_MIN_SAMPLES - 1):
+            health.record_failure(0.1)
+        self.assertTrue(health.available())  # too few samples to judge
+        health.record_failure(0.1)
+        self.assertFalse(health.available())
+        self.assertTrue(health.snapshot()["circuit_open"])
+
+    def test_half_open_admits_a_single_trial(self):
+        health = self.tripped()
+        self.assertTrue(health.available())
+        self.assertFalse(health.available())
+
+    def test_successful_trial_closes_the_circuit(self):
+        health = self.tripped()
+        health.available()
+        health.record_success(0.1)
+        self.assertTrue(health.available())
+        self.assertTrue(health.available())
+        self.assertFalse(health.snapshot()["circuit_open"])
+
+    def test_failed_trial_reopens_the_circuit(self):
+        health = self.tripped()
+        health.available()
+        health.record_failure(0.1)
+        self.assertFalse(health.available())
+        self.assertTrue(health.snapshot()["circuit_open"])
+
+    def test_rate_limit_keeps_the_circuit_open_for_retry_after(self):
+        health = ModelHealth("test-model")
+        _record_outcome(health, Exception("429 Too Many Requests. Please retry in 45s"), 0.1)
+        self.assertGreater(health.open_until - time.monotonic(), 40)
+
+    def test_trial_shed_by_the_quota_is_given_back(self):
+        health = self.tripped()
+        self.assertTrue(health.available())  # the trial request
+        _record_outcome(health, quota.QuotaExceeded("shed"), 0.0)
+        self.assertTrue(health.available())
+
+
+# -------- Streamed results (analyzer.streaming) --------
+
+class FinishedEventsTests(SimpleTestCase):
+    def events(self, **job):
+        frames = _finished(AnalysisJob(**job), format_result)
+        return [frame.split("\n", 1)[0].removeprefix("event: ") for frame in frames]
+
+    def test_every_item_is_streamed_before_done(self):
+        result = orjson.loads(VALID)
+        result["strengths"] = ["Python", "Django"]
+        self.assertEqual(
+            self.events(status=AnalysisJob.SUCCEEDED, result=result),
+            ["score", "strength", "strength", "missing_keyword", "tip", "done"],
+        )
+
+    def test_failed_job(self):
+        self.assertEqual(self.events(status=AnalysisJob.FAILED, error="boom"), ["error"])
+
+
+# -------- Single-flight analyses (analyzer.singleflight) --------
+
+@override_settings(ANALYZER_SINGLEFLIGHT_WAIT=5, ANALYZER_SINGLEFLIGHT_POLL=0.01)
+class SingleFlightTests(SimpleTestCase):
+    key = "flight:test"
+
+    def setUp(self):
+        use_temp_cache(self)
+
+    def test_identical_analyses_share_one_run(self):
+        started, release, calls = threading.Event(), threading.Event(), []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {"match_score": 7}
+
+        outcomes = []
+        leader = threading.Thread(target=lambda: outcomes.append(singleflight.run(self.key, compute, lambda: None)))
+        leader.start()
+        started.wait(5)
+        joiner = threading.Thread(target=lambda: outcomes.append(singleflight.run(self.key, compute, lambda: None)))
+        joiner.start()
+        time.sleep(0.05)  # let the second caller join the flight
+        release.set()
+        leader.join(5)
+        joiner.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(role for _, role in outcomes), ["joined", "leader"])
+        self.assertEqual([result for result, _ in outcomes], [{"match_score": 7}] * 2)
+        self.assertNotIn(self.key, cache.get_cache())  # the lease is released
+
+    def test_waits_for_another_workers_lease(self):
+        store = cache.get_cache()
+        store.add(self.key, "other-worker", expire=60)
+        threading.Timer(0.05, store.delete, [self.key]).start()
+
+        result, role = singleflight.run(self.key, lambda: self.fail("computed twice"), lambda: {"match_score": 5})
+        self.assertEqual((result, role), ({"match_score": 5}, "joined_remote"))
+
+    def test_release_only_deletes_its_own_lease(self):
+        token = singleflight._try_lease(self.key)
+        self.assertIsNotNone(token)
+        self.assertIsNone(singleflight._try_lease(self.key))
+
+        # The lease expired and another worker took it over.
+        cache.get_cache().set(self.key, "other-worker")
+        singleflight._release(self.key, token)
+        self.assertEqual(cache.get_cache().get(self.key), "other-worker")
+
+        singleflight._release(self.key, "other-worker")
+        self.assertNotIn(self.key, cache.get_cache())
+
+
+# -------- Quota scheduler (analyzer.quota) --------
+
+class QuotaTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, "quota.sqlite3")
+        settings_override = override_settings(
+            ANALYZER_QUOTA_DB=path, ANALYZER_QUOTA_MAX_QUEUE=20,
+            ANALYZER_QUOTAS={"fast": {"rpm": 2, "tpm": 600}, "other": {"rpm": 100, "tpm": 1000}},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(lambda: quota._local.connections.pop(path).close())
+
+    def test_requests_per_minute(self):
+        quota.acquire("fast", 10)
+        quota.acquire("fast", 10)
+        with self.assertRaises(quota.QuotaExceeded) as shed:
+            quota.acquire("fast", 10, max_wait=0)
+        self.assertAlmostEqual(shed.exception.retry_after, 30, delta=1)  # one request per 30s
+
+    def test_waits_for_tokens_to_refill(self):
+        quota.acquire("fast", 600)
+        started = time.monotonic()
+        quota.acquire("fast", 5, max_wait=5)  # 600 tokens a minute: 10 a second
+        self.assertGreaterEqual(time.monotonic() - started, 0.4)
+        self.assertEqual(quota.queue_depth(), 0)
+
+    def test_settle_refunds_an_overestimate(self):
+        quota.acquire("other", 900)
+        with self.assertRaises(quota.QuotaExceeded):
+            quota.acquire("other", 500, max_wait=0)
+        quota.settle("other", 900, 100)
+        quota.acquire("other", 500, max_wait=0)
+
+    def test_settle_charges_an_underestimate(self):
+        quota.acquire("other", 100)
+        quota.settle("other", 100, 900)
+        with self.assertRaises(quota.QuotaExceeded):
+            quota.acquire("other", 500, max_wait=0)
+
+    def test_block_holds_every_call(self):
+        quota.block("other", 30)
+        with self.assertRaises(quota.QuotaExceeded) as shed:
+            quota.acquire("other", 1, max_wait=5)
+        self.assertAlmostEqual(shed.exception.retry_after, 30, delta=1)
+
+    def test_queue_depth_across_models(self):
+        now = time.time()
+        waiters = [quota._enter_queue(model, now) for model in ("fast", "fast", "other")]
+        quota._enter_queue("other", now - 10_000)  # left behind by a killed worker
+        self.assertEqual(quota.queue_depth(), 3)
+        self.assertEqual(quota.queue_depth("fast"), 2)
+        self.assertEqual(quota.queue_depths(), {"fast": 2, "other": 1})
+        quota._leave_queue(waiters[0])
+        self.assertEqual(quota.queue_depth("fast"), 1)
+
+    def test_full_queue_sheds_instead_of_waiting(self):
+        quota.acquire("fast", 600)
+        now = time.time()
+        for _ in range(3):
+            quota._enter_queue("other", now)
+        with override_settings(ANALYZER_QUOTA_MAX_QUEUE=3):
+            with self.assertRaises(quota.QuotaExceeded):
+                quota.acquire("fast", 5, max_wait=5)
+
+
+# -------- Resume search index (analyzer.index) --------
+
+INDEXED = [
+    (1, "Python Django developer, built REST APIs with Postgres"),
+    (2, "Data engineer: Spark, Airflow and Python pipelines"),
+    (3, "iOS developer writing Swift and Objective-C apps"),
+]
+
+
+class ResumeIndexTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(RESUME_INDEX_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Segments and delta read by this process are cached per index.
+        self.forget_index()
+        self.addCleanup(self.forget_index)
+
+    def forget_index(self):
+        index._segment_cache.clear()
+        index._delta_cache.update(segment=None, offset=0, docs={})
+
+    def ids(self, query):
+        return [doc_id for doc_id, _ in index.search(query)]
+
+    def test_delta_only(self):
+        index.add_documents(INDEXED)
+        self.assertEqual(self.ids("swift apps"), [3])
+        self.assertEqual(set(self.ids("python")), {1, 2})
+
+    def test_query_after_merge_matches_the_delta(self):
+        index.add_documents(INDEXED)
+        before = index.search("python django postgres")
+        index.merge_delta()
+        self.assertEqual(os.path.getsize(index._delta_path()), 0)
+        after = index.search("python django postgres")
+        self.assertEqual([doc_id for doc_id, _ in after], [doc_id for doc_id, _ in before])
+        for (_, score_after), (_, score_before) in zip(after, before):
+            self.assertAlmostEqual(score_after, score_before)
+
+    def test_merge_into_an_existing_segment(self):
+        index.add_documents(INDEXED[:2])
+        index.merge_delta()
+        index.add_documents(INDEXED[2:] + [(1, "Rust systems programmer")])  # doc 1 replaced
+        self.assertEqual(self.ids("django"), [])  # the delta shadows the old doc 1
+        index.merge_delta()
+        self.assertEqual(self.ids("django"), [])
+        self.assertEqual(self.ids("rust"), [1])
+        self.assertEqual(self.ids("swift"), [3])
+
+        merged = index.search("python developer rust")
+        index.rebuild(INDEXED[1:] + [(1, "Rust systems programmer")])
+        rebuilt = index.search("python developer rust")
+        self.assertEqual([doc_id for doc_id, _ in merged], [doc_id for doc_id, _ in rebuilt])
+        for (_, merged_score), (_, rebuilt_score) in zip(merged, rebuilt):
+            self.assertAlmostEqual(merged_score, rebuilt_score)
+
+
+# -------- Streaming uploads (analyzer.uploads) --------
+
+@override_settings(UPLOAD_MAX_BYTES=1024 * 1024)
+class HashingUploadHandlerTests(SimpleTestCase):
+    def upload(self, content):
+        request = RequestFactory().post("/upload/", {
+            "file": SimpleUploadedFile("resume.txt", content), "job_description": "Python developer",
+        })
+        request.FILES  # parse the body through FILE_UPLOAD_HANDLERS
+        return request
+
+    def test_hashes_the_file_as_it_streams(self):
+        content = b"Python developer\n" * 10_000  # several chunks
+        request = self.upload(content)
+        self.assertEqual(request.upload_hashes, {"file": hashlib.sha256(content).hexdigest()})
+        self.assertEqual(request.FILES["file"].read(), content)
+        self.assertEqual(request.upload_errors, {})
+
+    def test_rejects_a_file_over_the_limit(self):
+        request = self.upload(b"x" * (1024 * 1024 + 1))
+        self.assertNotIn("file", request.FILES)
+        self.assertNotIn("file", request.upload_hashes)
+        self.assertEqual(request.upload_errors, {"file": "File too large (max 1 MB)."})
+        self.assertEqual(request.POST["job_description"], "Python developer")
+
+        form = TextDocumentForm(
+            request.POST, request.FILES,
+            upload_hashes=request.upload_hashes, upload_errors=request.upload_errors,
+        )
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["file"], ["File too large (max 1 MB)."])
+
+
+# -------- Result history (analyzer.history) --------
+
+@override_settings(ANALYSIS_RESULT_FLUSH_SECONDS=0.05)
+class HistoryWriterTests(TransactionTestCase):
+    # Results are written by a background thread on its own connection, so
+    # this needs committed rows rather than TestCase's wrapping transaction.
+
+    def test_flush_waits_for_queued_results(self):
+        doc = TextDocument.objects.create(file="blobs/test.txt", extracted_text="Python", extraction_seconds=0.0)
+        for score in (4, 6, 8):
+            history.record(doc.pk, dict(orjson.loads(VALID), match_score=score), answered_by=AnalysisResult.LLM)
+        self.assertTrue(history.flush(5))
+
+        self.assertEqual(
+            sorted(AnalysisResult.objects.filter(document=doc).values_list("match_score", flat=True)), [4, 6, 8],
+        )
+        latest = history.latest_result(doc.pk)
+        self.assertEqual(latest.strengths, ["Python"])
+        self.assertEqual(latest.answered_by, AnalysisResult.LLM)
+
+    def test_recorder_notes_how_the_analysis_was_answered(self):
+        doc = TextDocument.objects.create(file="blobs/test.txt", extracted_text="Python", extraction_seconds=0.0)
+        forwarded = []
+        recorder = history.ResultRecorder(forward=lambda name, data: forwarded.append(name))
+        recorder("cache_hit", {"model": "gemini-2.0-flash", "prompt_version": "5"})
+        recorder.record(doc.pk, orjson.loads(VALID))
+        self.assertTrue(history.flush(5))
+
+        result = history.latest_result(doc.pk)
+        self.assertEqual((result.answered_by, result.model_name), (AnalysisResult.CACHE, "gemini-2.0-flash"))
+        self.assertIsNotNone(result.latency_seconds)
+        self.assertEqual(forwarded, ["cache_hit"])
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.utils.deconstruct import deconstructible
+
+
+# -------- Content-addressed uploads --------
+# Every uploaded file is stored once under the SHA-256 of its bytes
+# (blobs/ab/cd/<sha256>.<ext>), so the same resume uploaded ten times is one
+# blob on disk and is extracted once.
+
+def hash_file(f):
+    """SHA-256 hex digest of a Django File, read in chunks."""
+    hasher = hashlib.sha256()
+    f.seek(0)
+    for chunk in f.chunks():
+        hasher.update(chunk)
+    f.seek(0)
+    return hasher.hexdigest()
+
+
+def content_file_path(instance, filename):
+    # Save as: blobs/ab/cd/<sha256>.<ext>
+    if not instance.content_hash:
+        # Saved outside a request (shell, management command): hash it now.
+        # This needs the file assigned to the instance before save(), e.g.
+        # TextDocument(file=File(f, name=...)).save(), not FieldFile.save().
+        instance.content_hash = hash_file(instance.file)
+    digest = instance.content_hash
+    ext = os.path.splitext(filename)[1].lower()
+    return f'blobs/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File storage where a name identifies its content, so existing files are never rewritten."""
+
+    def get_available_name(self, name, max_length=None):
+        # Same name means same bytes: reuse it instead of adding a suffix.
+        return name
+
+    def _save(self, name, content):
+        if self.exists(name):
+            return name
+        # Write under a unique temporary name and rename into place, so
+        # concurrent uploads of the same file never see a partial blob.
+        tmp_name = super()._save(f"{name}.{uuid.uuid4().hex}.part", content)
+        os.replace(self.path(tmp_name), self.path(name))
+        return name
+
+
+# -------- Streaming upload handler --------
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Hash uploaded files and enforce UPLOAD_MAX_BYTES while they stream in.
+
+    Must come before the memory/temporary file handlers in
+    FILE_UPLOAD_HANDLERS; it passes every chunk on unchanged. Digests end up
+    in ``request.upload_hashes`` and rejected files in
+    ``request.upload_errors``, both keyed by form field name.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request.upload_hashes = {}
+        self.request.upload_errors = {}
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > settings.UPLOAD_MAX_BYTES:
+            limit_mb = settings.UPLOAD_MAX_BYTES // (1024 * 1024)
+            self.request.upload_errors[self.field_name] = f'File too large (max {limit_mb} MB).'
+            # Drops the partial file and skips the rest of it without buffering.
+            raise SkipFile()
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.request.upload_hashes[self.field_name] = self.hasher.hexdigest()
+        # Let the next handler build the uploaded file object.
+        return None
@@ -6,6 +6,15 @@ urlpatterns = [
     path('home/', views.home, name='home'),
     path('', views.upload_text, name='upload'),
     path('doc/<int:pk>/', views.detail, name='detail'),
+    path('doc/<int:pk>/results/', views.analysis_history, name='analysis_history'),
     path('files/', views.all_files, name='all_files'),
+    path('files/api/', views.files_api, name='files_api'),
     path('analyze/<int:doc_id>/', views.analyze_resume, name='analyze_resume'),
+    path('analyze/<int:doc_id>/async/', views.analyze_resume_async, name='analyze_resume_async'),
+    path('analyze/<int:doc_id>/stream/', views.analyze_stream, name='analyze_stream'),
+    path('analyze/batch/', views.analyze_batch_view, name='analyze_batch'),
+    path('rank/', views.rank_resumes, name='rank_resumes'),
+    path('jobs/<int:job_id>/', views.analysis_job, name='analysis_job'),
+    path('jobs/batch/<int:job_id>/', views.batch_job, name='batch_job'),
+    path('metrics', views.metrics_view, name='metrics'),
 ]
@@ -1,39 +1,55 @@
+import functools
 import logging
-import os
-from dotenv import load_dotenv
-from portia import (
-    Config,
-    DefaultToolRegistry,
-    Portia,
-    StorageClass,
-    LLMProvider,
-)
-from portia.cli import CLIExecutionHooks
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from portia import PlanBuilderV2
-from pydantic import BaseModel
-from typing import List
-import json
 
+from . import metrics, quota, sections, singleflight
+from .cache import lookup_result, make_flight_key, store_result
+from .clients import aget_client, arun_plan, get_client
+from .compaction import (
+    clean_text, compact_inputs, count_tokens, record_compaction, token_budget, trim_to_budget,
+)
+from .fallback import AttemptFailed, arun_with_fallback, is_rate_limited, run_with_fallback
+from .neardup import find_reusable
+from .parsing import OutputParseError, parse_output
+from .prescore import score_locally
+from .schemas import ResumeMatchResult, SectionedMatchResult
+
+logger = logging.getLogger(__name__)
 
 
-# -------- Define structured output --------
-class ResumeMatchResult(BaseModel):
-    match_score: float
-    strengths: List[str]
-    missing_keywords: List[str]
-    improvement_tips: List[str]
+# Bump whenever the analysis prompt or output schema changes so cached
+# results produced by an older prompt are not reused.
+PROMPT_VERSION = "5"
+
+FALLBACK_MODELS = [
+    "gemini-2.0-flash",
+    "gemini-1.5-flash",
+    "gemini-1.5-pro",
+    "gemini-2.5-flash",
+]
 
 
 # -------- Build plan using PlanBuilderV2 --------
-def build_resume_analysis_plan(resume_text, job_description):
+# The plan does not depend on the documents (they are passed as
+# plan_run_inputs), so it is built once and reused for every analysis.
+@functools.lru_cache(maxsize=None)
+def build_resume_analysis_plan():
+    with metrics.stage("plan_build", plan="resume_analysis"):
+        return _build_resume_analysis_plan()
+
+
+def _build_resume_analysis_plan():
     builder = PlanBuilderV2(label="Resume to Job Match Analyzer")
 
     # Define inputs
     resume_input = builder.input(
-        name="resume_text", description=f"{resume_text}"
+        name="resume_text", description="The candidate's resume"
     )
     jd_input = builder.input(
-        name="job_description", description=f"{job_description}"
+        name="job_description", description="The job description to match against"
     )
 
     # Step: LLM analyzes resume vs job description
@@ -48,7 +64,7 @@ Return ONLY a valid JSON object matching this schema:
   'strengths': list of 3 strengths that the resume already shows off,
   'missing_keywords': list of important skills/keywords from the JD that are hiding from the resume,
   'improvement_tips': list of 3–5 actionable suggestions to level up the resume,
-  'schedule_plan_to_improve': create a smart plan to learn from the improvement tips.
+  'schedule_plan_to_improve': list of steps (with rough timing) to learn what the improvement tips need.
 }
 
 Do not include any extra text, commentary, or formatting outside of JSON."""
@@ -64,128 +80,334 @@ Do not include any extra text, commentary, or formatting outside of JSON."""
     return builder.build()
 
 
-# -------- Main analyzer --------
-def analyze_resume(model_name, resume_text, job_description):
-    logging.disable(logging.CRITICAL)
-    load_dotenv()
-
-    GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-    if not GOOGLE_API_KEY:
-        raise ValueError("GOOGLE_API_KEY is not set. Please check your .env file.")
-
-    google_config = Config.from_default(
-        llm_provider=LLMProvider.GOOGLE,
-        default_model=f"google/{model_name}",
-        google_api_key=GOOGLE_API_KEY,
-        storage_class=StorageClass.MEMORY,
+# The same analysis, given only the resume sections the model has not seen
+# (see analyzer.sections) and a summary of what it found in the others.
+@functools.lru_cache(maxsize=None)
+def build_section_analysis_plan():
+    with metrics.stage("plan_build", plan="section_analysis"):
+        return _build_section_analysis_plan()
+
+
+def _build_section_analysis_plan():
+    builder = PlanBuilderV2(label="Incremental Resume to Job Match Analyzer")
+
+    sections_input = builder.input(
+        name="changed_sections", description="Resume sections to read in full, each after its [section-id]"
     )
+    findings_input = builder.input(
+        name="cached_findings", description="Findings from the other resume sections, analyzed before"
+    )
+    jd_input = builder.input(
+        name="job_description", description="The job description to match against"
+    )
+
+    builder.llm_step(
+        task=(
+            """You are a Resume-Job Match Detective 🕵️‍♂️.
 
-    portia = Portia(
-        config=google_config,
-        tools=DefaultToolRegistry(google_config),
-        execution_hooks=CLIExecutionHooks(),
+Compare the RESUME against the JOB DESCRIPTION and provide a structured evaluation.
+The resume comes in two parts: NEW SECTIONS, given in full, each starting with its [section-id];
+and CACHED FINDINGS, one line per section you analyzed before. A NEW SECTION marked "(not shown ...)"
+was left out for length. Judge the resume as a whole.
+Return ONLY a valid JSON object matching this schema:
+{
+  'match_score': number from 1–10 (higher means stronger match),
+  'strengths': list of 3 strengths that the resume already shows off,
+  'missing_keywords': list of important skills/keywords from the JD that are hiding from the resume,
+  'improvement_tips': list of 3–5 actionable suggestions to level up the resume,
+  'schedule_plan_to_improve': list of steps (with rough timing) to learn what the improvement tips need,
+  'section_findings': one entry per NEW SECTION shown in full: {'section': its section-id,
+                      'strengths': what it shows for this job, 'matched_keywords': JD keywords it covers}
+}
+
+Do not include any extra text, commentary, or formatting outside of JSON."""
+        ),
+        inputs=[sections_input, findings_input, jd_input],
+        output_schema=SectionedMatchResult,
+        step_name="analyze_resume_sections",
     )
 
-    plan = build_resume_analysis_plan(resume_text, job_description)
+    builder.final_output(output_schema=SectionedMatchResult)
 
-    try:
-        plan_run = portia.run_plan(
-            plan,
-            plan_run_inputs={"resume_text": resume_text, "job_description": job_description},
-            end_user="its me, mario",
+    return builder.build()
+
+
+# -------- Main analyzer --------
+def _output_value(outputs):
+    return outputs.model_dump().get("final_output", {}).get("value", "") or ""
+
+
+def _section_inputs(model_name, resume_sections, job_description):
+    resume_budget, jd_budget = token_budget(model_name)
+    return {
+        "changed_sections": sections.render_changed(resume_sections, resume_budget) or "(none)",
+        "cached_findings": sections.render_findings(resume_sections) or "(none)",
+        "job_description": trim_to_budget(clean_text(job_description), jd_budget),
+    }
+
+
+def _prepare_call(model_name, resume_text, job_description, resume_sections=None):
+    if resume_sections is None:
+        resume_text, job_description = compact_inputs(model_name, resume_text, job_description)
+        inputs = {"resume_text": resume_text, "job_description": job_description}
+        tokens_in = sum(count_tokens(value) for value in inputs.values())
+    else:
+        inputs = _section_inputs(model_name, resume_sections, job_description)
+        tokens_in = sum(count_tokens(value) for value in inputs.values())
+        before = count_tokens(resume_text) + count_tokens(job_description)
+        record_compaction(model_name, before, tokens_in, "sections")
+    # Tokens reserved from the quota until the real output size is known.
+    charged = tokens_in + settings.ANALYZER_QUOTA_OUTPUT_ESTIMATE
+    return inputs, tokens_in, charged
+
+
+def _call_succeeded(model_name, plan_run, started, tokens_in, charged, usage):
+    if plan_run and plan_run.outputs:
+        tokens_out = count_tokens(str(_output_value(plan_run.outputs)))
+        quota.settle(model_name, charged, tokens_in + tokens_out)
+        if usage is not None:
+            usage.update(tokens_in=tokens_in, tokens_out=tokens_out)
+        metrics.record_llm_attempt(
+            model_name, time.perf_counter() - started, "ok",
+            tokens_in=tokens_in, tokens_out=tokens_out,
         )
+        return plan_run.outputs  # ✅ Already validated JSON
+
+    metrics.record_llm_attempt(model_name, time.perf_counter() - started, "empty", tokens_in=tokens_in)
+    logger.warning("No outputs returned from Portia for %s", model_name)
+    return None
+
+
+def _call_failed(model_name, error, started, tokens_in):
+    if is_rate_limited(error):
+        metrics.record_llm_attempt(model_name, time.perf_counter() - started, "rate_limited", tokens_in=tokens_in)
+        # Hold this model in every worker for as long as the API asked.
+        quota.block(model_name, quota.retry_after_seconds(error))
+        # Let the fallback engine see quota errors so it can open the circuit.
+        raise error
+    metrics.record_llm_attempt(model_name, time.perf_counter() - started, "error", tokens_in=tokens_in)
+    logger.warning("LLM call to %s failed: %s", model_name, error)
+    return None
+
 
-        if plan_run and plan_run.outputs:
-            return plan_run.outputs  # ✅ Already validated JSON
-        else:
-            print("⚠️ No outputs returned from Portia.")
-            return None
+def _plan(resume_sections):
+    return build_resume_analysis_plan() if resume_sections is None else build_section_analysis_plan()
 
+
+def analyze_resume(model_name, resume_text, job_description, usage=None, resume_sections=None):
+    """
+    One model's raw output, or None; ``usage``, if given, receives its token
+    counts. With ``resume_sections`` only the sections without cached
+    findings are sent (see analyzer.sections).
+    """
+    portia = get_client(model_name)
+    plan = _plan(resume_sections)
+    inputs, tokens_in, charged = _prepare_call(model_name, resume_text, job_description, resume_sections)
+
+    # Wait for (or be refused) quota before the request reaches the API.
+    quota.acquire(model_name, charged)
+
+    started = time.perf_counter()
+    try:
+        plan_run = portia.run_plan(plan, plan_run_inputs=inputs, end_user="its me, mario")
     except Exception as e:
-        print("Error:", e)
-        return None
+        return _call_failed(model_name, e, started, tokens_in)
+    return _call_succeeded(model_name, plan_run, started, tokens_in, charged, usage)
+
+
+async def aanalyze_resume(model_name, resume_text, job_description, usage=None, resume_sections=None):
+    """``analyze_resume`` that awaits the quota and the LLM call instead of blocking."""
+    portia = await aget_client(model_name)
+    plan = _plan(resume_sections)
+    inputs, tokens_in, charged = _prepare_call(model_name, resume_text, job_description, resume_sections)
+
+    await quota.aacquire(model_name, charged)
+
+    started = time.perf_counter()
+    try:
+        plan_run = await arun_plan(portia, plan, inputs, end_user="its me, mario")
+    except Exception as e:
+        return _call_failed(model_name, e, started, tokens_in)
+    return _call_succeeded(model_name, plan_run, started, tokens_in, charged, usage)
+
+
+def _parse_output(model, result, schema=ResumeMatchResult):
+    if not result:
+        raise AttemptFailed(f"No output from {model}")
+
+    try:
+        with metrics.stage("json_parse", model=model):
+            # Decode (repairing common JSON slips) and validate the final output
+            return parse_output(_output_value(result), schema).model_dump()
+
+    except OutputParseError as e:
+        # Only output that cannot be repaired is worth another model's call.
+        logger.warning("Unusable LLM output from %s: %s", model, e)
+        raise AttemptFailed(f"Unusable output from {model}") from e
 
 
 # -------- Fallback across models --------
-def analyze_resume_with_fallback(resume_text, job_description):
-    models = [
-        "gemini-2.0-flash",
-        "gemini-1.5-flash",
-        "gemini-1.5-pro",
-        "gemini-2.5-flash",
-    ]
-
-    for model in models:
-        print(f"🔄 Attempting with {model} ...")
-        result = analyze_resume(model, resume_text, job_description)
-
-        if result:
-            print(f"✅ Success with {model}")
-
-            try:
-                # Convert PlanRunOutputs → dict
-                result_dict = result.model_dump()
-
-                # Extract the final JSON string safely
-                raw_value = result_dict.get("final_output", {}).get("value", "{}")
-
-                # Parse string → Python dict
-                parsed = json.loads(raw_value)
-
-                # Pretty print important fields
-                print(f"\n📊 Match Score: {parsed.get('match_score', 'N/A')}")
-
-                strengths = parsed.get("strengths", [])
-                if strengths:
-                    print("💪 Strengths:")
-                    for s in strengths[:3]:  # show top 3
-                        print(f"   - {s}")
-
-                missing = parsed.get("missing_keywords", [])
-                if missing:
-                    print("❌ Missing Keywords:")
-                    print("   " + ", ".join(missing))
-
-                tips = parsed.get("improvement_tips", [])
-                if tips:
-                    print("📝 Improvement Tips:")
-                    for t in tips:
-                        print(f"   - {t}")
-
-                schedule_plan = parsed.get("schedule_plan_to_improve", [])
-                if schedule_plan:
-                    print("Schedule Plan:")
-                    if schedule_plan:
-                        print("   " + ", ".join(schedule_plan))
-
-                # ✅ Return parsed dict for downstream usage
-                return parsed
-
-            except (json.JSONDecodeError, KeyError) as e:
-                print(f"⚠️ Failed to parse LLM output: {e}")
-                return None
-
-    print("❌ All models failed.")
+def _answer_without_llm(resume_text, job_description, notify):
+    """A cached, near-duplicate or local-only result, or None if the LLM has to be asked."""
+    cached_model, cached = lookup_result(resume_text, job_description, FALLBACK_MODELS, PROMPT_VERSION)
+    if cached is not None:
+        logger.info("Cache hit (%s)", cached_model)
+        metrics.ANALYSES.inc(answered_by="cache")
+        notify("cache_hit", {"model": cached_model, "prompt_version": PROMPT_VERSION})
+        return cached
+
+    # A reformatted resume, or a lightly edited job description, reuses the
+    # analysis of the original pair. Edited resumes go on to the section path.
+    resume_similarity = settings.ANALYZER_NEAR_DUPLICATE_RESUME_SIMILARITY
+    if resume_similarity is not None:
+        match = find_reusable(
+            resume_text, job_description, PROMPT_VERSION,
+            resume_similarity, settings.ANALYZER_NEAR_DUPLICATE_JD_SIMILARITY,
+        )
+        if match is not None:
+            stored, resume_similarity, jd_similarity = match
+            logger.info(
+                "Near-duplicate of document %s (resume %.2f, job description %.2f)",
+                stored.document_id, resume_similarity, jd_similarity,
+            )
+            metrics.ANALYSES.inc(answered_by="near_duplicate")
+            notify("near_duplicate", {
+                "document_id": stored.document_id,
+                "model": stored.model_name,
+                "prompt_version": stored.prompt_version,
+                "resume_similarity": resume_similarity,
+                "jd_similarity": jd_similarity,
+            })
+            return stored.as_result()
+
+    # Clear mismatches are answered by the local scorer without an LLM call.
+    threshold = settings.ANALYZER_LOCAL_SKIP_BELOW
+    if threshold is not None:
+        local = score_locally(resume_text, job_description)
+        if local.match_score < threshold:
+            logger.info("Local score %s below %s, skipping LLM", local.match_score, threshold)
+            metrics.ANALYSES.inc(answered_by="local")
+            notify("local_only", {"match_score": local.match_score})
+            return local.model_dump()
     return None
 
 
-# -------- Example run --------
-resume_text = """
-Software Engineer with 2+ years of experience in Python, Django, SQL, and automation.
-Worked on RPA (Automation Anywhere), Selenium, and Playwright for process optimization.
-Built internal tools to reduce manual effort by 40%.
-"""
+def _cached(resume_text, job_description):
+    return lookup_result(resume_text, job_description, FALLBACK_MODELS, PROMPT_VERSION)[1]
 
-job_description = """
-We are looking for a Backend Developer with experience in Python, Django, REST APIs,
-cloud platforms (AWS/GCP), and system design. Knowledge of containerization (Docker, Kubernetes) and database optimization is a plus.
-"""
 
+def _coalesced(result, role, notify):
+    if role in ("joined", "joined_remote"):
+        metrics.ANALYSES.inc(answered_by="coalesced")
+        notify("coalesced", {"role": role})
+    return result
 
 
+def _split_sections(resume_text, job_description, notify):
+    """Resume sections for an incremental analysis, or None when it is turned off."""
+    if not settings.ANALYZER_INCREMENTAL_SECTIONS:
+        return None
+    resume_sections = sections.split_resume(resume_text, job_description, PROMPT_VERSION)
+    cached = sum(1 for s in resume_sections if s.findings is not None)
+    notify("sections", {"total": len(resume_sections), "cached": cached})
+    return resume_sections
 
 
+def _finish(model, parsed, resume_text, job_description, notify, usage, resume_sections=None):
+    if parsed is None:
+        logger.error("All models failed.")
+        metrics.ANALYSES.inc(answered_by="none")
+        return None
 
+    if resume_sections is not None:
+        sent = sections.fit_changed(resume_sections, token_budget(model)[0])
+        parsed = sections.merge_findings(resume_sections, parsed, sent)
+
+    metrics.ANALYSES.inc(answered_by="llm")
+    notify("success", {"model": model, "prompt_version": PROMPT_VERSION, **usage.get(model, {})})
+    logger.info(
+        "Success with %s: match_score=%s strengths=%d missing_keywords=%d tips=%d",
+        model,
+        parsed.get("match_score", "N/A"),
+        len(parsed.get("strengths", [])),
+        len(parsed.get("missing_keywords", [])),
+        len(parsed.get("improvement_tips", [])),
+    )
 
+    store_result(resume_text, job_description, model, PROMPT_VERSION, parsed)
 
+    # ✅ Return parsed dict for downstream usage
+    return parsed
 
+
+def analyze_resume_with_fallback(resume_text, job_description, on_event=None):
+    """
+    Analyze with the first healthy model that answers.
+
+    ``on_event(name, data)``, if given, is called as the analysis progresses
+    (e.g. ``("attempt", {"model": ...})``) so callers can report progress.
+    """
+    notify = on_event or (lambda name, data: None)
+
+    answer = _answer_without_llm(resume_text, job_description, notify)
+    if answer is not None:
+        return answer
+
+    usage = {}  # token counts per model that answered
+
+    def analyze():
+        resume_sections = _split_sections(resume_text, job_description, notify)
+        schema = ResumeMatchResult if resume_sections is None else SectionedMatchResult
+
+        def attempt(model):
+            usage[model] = {}
+            raw = analyze_resume(model, resume_text, job_description, usage[model], resume_sections)
+            return _parse_output(model, raw, schema)
+
+        model, parsed = run_with_fallback(FALLBACK_MODELS, attempt, on_event=on_event)
+        return _finish(model, parsed, resume_text, job_description, notify, usage, resume_sections)
+
+    # A double-click or a second tab joins the analysis already running.
+    result, role = singleflight.run(
+        make_flight_key(resume_text, job_description, PROMPT_VERSION),
+        analyze,
+        lambda: _cached(resume_text, job_description),
+    )
+    return _coalesced(result, role, notify)
+
+
+async def aanalyze_resume_with_fallback(resume_text, job_description, on_event=None):
+    """
+    ``analyze_resume_with_fallback`` for ASGI views. The LLM calls and quota
+    waits are awaited. The steps that query the database (near-duplicate
+    lookup) or may (the ``on_event`` callbacks they notify) run through
+    sync_to_async, so Django manages their connections like any sync view's.
+    """
+    notify = on_event or (lambda name, data: None)
+
+    answer = await sync_to_async(_answer_without_llm)(resume_text, job_description, notify)
+    if answer is not None:
+        return answer
+
+    usage = {}
+
+    async def analyze():
+        resume_sections = await sync_to_async(_split_sections)(resume_text, job_description, notify)
+        schema = ResumeMatchResult if resume_sections is None else SectionedMatchResult
+
+        async def attempt(model):
+            usage[model] = {}
+            raw = await aanalyze_resume(model, resume_text, job_description, usage[model], resume_sections)
+            return _parse_output(model, raw, schema)
+
+        model, parsed = await arun_with_fallback(FALLBACK_MODELS, attempt, on_event=on_event)
+        return await sync_to_async(_finish)(
+            model, parsed, resume_text, job_description, notify, usage, resume_sections,
+        )
+
+    result, role = await singleflight.arun(
+        make_flight_key(resume_text, job_description, PROMPT_VERSION),
+        analyze,
+        lambda: _cached(resume_text, job_description),
+    )
+    return _coalesced(result, role, notify)
@@ -1,53 +1,347 @@
 import os
-import PyPDF2
-import docx2txt
-from .utils import analyze_resume, analyze_resume_with_fallback
+import json
 import time
-from google.api_core.exceptions import ResourceExhausted
+import hashlib
+import functools
 
-from django.http import HttpResponse
-from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import MD5
+from django.template.loader import get_template, render_to_string
+from django.utils.cache import patch_cache_control
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.views.static import serve
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 
 from .forms import TextDocumentForm
-from .models import TextDocument
+from .models import AnalysisJob, AnalysisResult, BatchAnalysisJob, TextDocument
+from .jobs import QueueFull, enqueue_analysis, enqueue_batch
+from .extraction import extract_document
+from .prescore import score_locally
+from . import index, neardup
+from .streaming import aiterate, job_events
+from .listing import InvalidCursor, decode_cursor, keyset_page, stream_listing
+from .cache import cache_stats
+from .fallback import model_health_snapshot
+from . import engine, history, metrics, quota
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import os
 
 
 
+def format_result(result):
+    # Map backend result → frontend format
+    return {
+        "ats_score": int(result.get("match_score", 0) * 10),  # convert 0–10 → %
+        "suggestions": (
+            result.get("improvement_tips", [])
+            + [f"Missing keyword: {kw}" for kw in result.get("missing_keywords", [])]
+        )
+    }
+
+
+def provisional_result(doc):
+    # Instant local estimate shown while the LLM analysis is pending. Status
+    # polls ask for it every few seconds; uploads never change, so it is
+    # computed once per document version.
+    key = f"provisional:{doc.pk}:{doc.content_hash}:{doc.extraction_seconds}"
+    provisional = caches['default'].get(key)
+    if provisional is None:
+        local = score_locally(doc.extracted_text, doc.job_description)
+        provisional = format_result(local.model_dump())
+        caches['default'].set(key, provisional, settings.ANALYZER_PROVISIONAL_CACHE_SECONDS)
+    return provisional
+
+
+def _busy(message):
+    response = JsonResponse({"status": "error", "message": message}, status=503)
+    response["Retry-After"] = str(settings.ANALYSIS_JOB_RETRY_DELAY)
+    return response
+
+
 @csrf_exempt
 def analyze_resume(request, doc_id):
     if request.method == "POST":
+        doc = get_object_or_404(TextDocument, id=doc_id)
+
         try:
-            doc = TextDocument.objects.get(id=doc_id)
+            job = enqueue_analysis(doc)
+        except QueueFull as e:
+            return _busy(str(e))
 
-            # Read resume and job description
-            resume_text = doc.file.read().decode("utf-8", errors="ignore")
-            job_desc = doc.job_description
+        return JsonResponse({
+            "status": "queued",
+            "job_id": job.pk,
+            "status_url": reverse('analysis_job', args=[job.pk]),
+            "provisional": provisional_result(doc),
+        }, status=202)
 
-            # Run your analyzer
-            result = analyze_resume_with_fallback(resume_text, job_desc)
+    return JsonResponse({"status": "error", "message": "Invalid request"})
 
-            if not result:
-                return JsonResponse({"status": "error", "message": "No result from analyzer"})
 
-            # Map backend result → frontend format
-            formatted_result = {
-                "ats_score": int(result.get("match_score", 0) * 10),  # convert 0–10 → %
-                "suggestions": (
-                    result.get("improvement_tips", [])
-                    + [f"Missing keyword: {kw}" for kw in result.get("missing_keywords", [])]
-                )
-            }
+# Async analyses currently awaiting a result in this process (one event loop).
+_async_in_flight = 0
 
-            return JsonResponse({"status": "success", "result": formatted_result})
 
-        except Exception as e:
-            return JsonResponse({"status": "error", "message": str(e)})
+@csrf_exempt
+async def analyze_resume_async(request, doc_id):
+    """
+    Analyze inline and answer with the result, awaiting the LLM calls.
 
-    return JsonResponse({"status": "error", "message": "Invalid request"})
+    Meant for ASGI (uvicorn): an in-flight analysis is a task on the event
+    loop rather than a busy thread, so one process can hold hundreds.
+    """
+    global _async_in_flight
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "Invalid request"})
+
+    doc = await aget_object_or_404(TextDocument, id=doc_id)
+
+    if _async_in_flight >= settings.ANALYZER_ASYNC_MAX_IN_FLIGHT:
+        return _busy("Too many analyses in progress, please try again shortly.")
+
+    _async_in_flight += 1
+    try:
+        if await sync_to_async(quota.queue_depth)() >= settings.ANALYZER_QUOTA_MAX_QUEUE:
+            return _busy("The analyzer is at its model quota, please try again shortly.")
+        resume_text = doc.extracted_text if doc.is_extracted else await sync_to_async(extract_document)(doc)
+        recorder = history.ResultRecorder()
+        result = await engine.aanalyze(resume_text, doc.job_description, on_event=recorder)
+    finally:
+        _async_in_flight -= 1
+
+    if not result:
+        return JsonResponse({"status": "error", "message": "No result from analyzer"})
+
+    # Recorded like a finished background job so later requests can reuse it.
+    await AnalysisJob.objects.acreate(document=doc, status=AnalysisJob.SUCCEEDED, attempts=1, result=result)
+    recorder.record(doc.pk, result)
+    return JsonResponse({"status": "success", "result": format_result(result)})
+
+
+def analyze_stream(request, doc_id):
+    """
+    Queue an analysis like analyze_resume, then stream the job's progress as
+    server-sent events (works under WSGI and ASGI). The job's status URL is
+    in the X-Status-Url header, to poll if the stream is cut.
+    """
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "Invalid request"}, status=405)
+
+    doc = get_object_or_404(TextDocument, id=doc_id)
+    try:
+        job = enqueue_analysis(doc)
+    except QueueFull as e:
+        return _busy(str(e))
+
+    status_url = reverse('analysis_job', args=[job.pk])
+    frames = job_events(job.pk, format_result, provisional_result(doc), status_url)
+    if isinstance(request, ASGIRequest):
+        # Async iterator so the event loop is not blocked between events
+        frames = aiterate(frames)
+
+    response = StreamingHttpResponse(frames, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # disable proxy buffering (nginx)
+    response["X-Status-Url"] = status_url
+    return response
+
+
+def analysis_job(request, job_id):
+    # The document's text is only loaded if its provisional score is not cached.
+    job = get_object_or_404(
+        AnalysisJob.objects.select_related('document').defer('document__extracted_text', 'document__job_description'),
+        pk=job_id,
+    )
+
+    if job.status == AnalysisJob.SUCCEEDED:
+        return JsonResponse({"status": "success", "result": format_result(job.result)})
+
+    if job.status == AnalysisJob.FAILED:
+        return JsonResponse({"status": "error", "message": job.error or "No result from analyzer"})
+
+    return JsonResponse({
+        "status": job.status,
+        "attempts": job.attempts,
+        "provisional": provisional_result(job.document),
+    })
+
+
+@csrf_exempt
+def analyze_batch_view(request):
+    """
+    Queue a comparison of one resume with many job descriptions, or of many
+    resumes with one; poll the returned status_url for the results.
+
+    Body: {"doc_id": 1, "job_descriptions": [...]}
+       or {"job_description": "...", "doc_ids": [...]}
+    """
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "Invalid request"})
+
+    try:
+        payload = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"status": "error", "message": "Body must be JSON"}, status=400)
+
+    if "doc_id" in payload:
+        items = payload.get("job_descriptions", [])
+    elif "job_description" in payload:
+        items = payload.get("doc_ids", [])
+    else:
+        return JsonResponse({"status": "error", "message": "Provide doc_id or job_description"}, status=400)
+
+    # Checked before anything is loaded or extracted
+    if not isinstance(items, list) or not items or len(items) > settings.BATCH_MAX_ITEMS:
+        return JsonResponse({
+            "status": "error",
+            "message": f"Provide between 1 and {settings.BATCH_MAX_ITEMS} items to compare",
+        }, status=400)
+
+    if "doc_id" in payload:
+        doc = get_object_or_404(TextDocument.objects.only('id'), id=payload["doc_id"])
+        batch = {"document": doc, "items": [str(jd) for jd in items]}
+    else:
+        if not all(isinstance(pk, int) for pk in items):
+            return JsonResponse({"status": "error", "message": "doc_ids must be integers"}, status=400)
+        batch = {"job_description": str(payload["job_description"]), "items": items}
+
+    try:
+        job = enqueue_batch(**batch)
+    except QueueFull as e:
+        return _busy(str(e))
+
+    return JsonResponse({
+        "status": "queued",
+        "job_id": job.pk,
+        "status_url": reverse('batch_job', args=[job.pk]),
+    }, status=202)
+
+
+def batch_job(request, job_id):
+    job = get_object_or_404(BatchAnalysisJob.objects.only('status', 'results', 'error'), pk=job_id)
+
+    if job.status == AnalysisJob.SUCCEEDED:
+        return JsonResponse({"status": "success", "results": job.results})
+
+    if job.status == AnalysisJob.FAILED:
+        return JsonResponse({"status": "error", "message": job.error or "No result from analyzer"})
+
+    return JsonResponse({"status": job.status})
+
+
+@csrf_exempt
+def rank_resumes(request):
+    """
+    Rank stored resumes against a pasted job description.
+
+    Body: {"job_description": "...", "k": 20, "analyze": false}
+    With "analyze": true the shortlisted resumes are also queued for a batch
+    LLM analysis, whose results are at the returned analysis status_url.
+    """
+    if request.method != "POST":
+        return JsonResponse({"status": "error", "message": "Invalid request"})
+
+    try:
+        payload = json.loads(request.body or b"{}")
+    except json.JSONDecodeError:
+        return JsonResponse({"status": "error", "message": "Body must be JSON"}, status=400)
+
+    job_description = str(payload.get("job_description", "")).strip()
+    if not job_description:
+        return JsonResponse({"status": "error", "message": "Provide job_description"}, status=400)
+    try:
+        k = max(1, min(int(payload.get("k", 20)), settings.BATCH_MAX_ITEMS))
+    except (TypeError, ValueError):
+        return JsonResponse({"status": "error", "message": "k must be an integer"}, status=400)
+
+    ranked = index.search(job_description, k=k)
+    docs = TextDocument.objects.only('id', 'file', 'original_name', 'uploaded_at').in_bulk([doc_id for doc_id, _ in ranked])
+    shortlist = [(docs[doc_id], score) for doc_id, score in ranked if doc_id in docs]
+
+    results = [
+        {
+            "doc_id": doc.pk,
+            "file_name": doc.display_name,
+            "uploaded_at": doc.uploaded_at,
+            "score": round(score, 4),
+        }
+        for doc, score in shortlist
+    ]
+
+    response = {"status": "success", "results": results}
+    if payload.get("analyze") and shortlist:
+        try:
+            job = enqueue_batch(job_description=job_description, items=[doc.pk for doc, _ in shortlist])
+        except QueueFull as e:
+            return _busy(str(e))
+        response["analysis"] = {"job_id": job.pk, "status_url": reverse('batch_job', args=[job.pk])}
+
+    return JsonResponse(response)
+
+
+def metrics_view(request):
+    """Prometheus text exposition of this process's pipeline metrics."""
+    token = settings.ANALYZER_METRICS_TOKEN
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponse("Unauthorized", status=401, content_type="text/plain")
+
+    lines = [
+        "# HELP analyzer_jobs Analysis jobs by status.",
+        "# TYPE analyzer_jobs gauge",
+    ]
+    counts = dict(AnalysisJob.objects.values_list('status').annotate(n=Count('id')))
+    for status, _ in AnalysisJob.STATUS_CHOICES:
+        lines.append(f'analyzer_jobs{{status="{status}"}} {counts.get(status, 0)}')
+
+    stats = cache_stats()
+    lines += [
+        "# HELP analyzer_cache_lookups_total Analysis cache lookups (all workers).",
+        "# TYPE analyzer_cache_lookups_total counter",
+        f'analyzer_cache_lookups_total{{result="hit"}} {stats.get("hits", 0)}',
+        f'analyzer_cache_lookups_total{{result="miss"}} {stats.get("misses", 0)}',
+        "# HELP analyzer_singleflight_saved_calls_total Analyses that joined an identical one in flight (all workers).",
+        "# TYPE analyzer_singleflight_saved_calls_total counter",
+        f'analyzer_singleflight_saved_calls_total {stats.get("coalesced", 0)}',
+        "# HELP analyzer_cache_entries Entries in the analysis cache.",
+        "# TYPE analyzer_cache_entries gauge",
+        f'analyzer_cache_entries {stats["entries"]}',
+        "# HELP analyzer_cache_size_bytes Disk used by the analysis cache.",
+        "# TYPE analyzer_cache_size_bytes gauge",
+        f'analyzer_cache_size_bytes {stats["size_bytes"]}',
+        "# HELP analyzer_model_circuit_open Whether a model's circuit breaker is open.",
+        "# TYPE analyzer_model_circuit_open gauge",
+    ]
+    for model_name, health in model_health_snapshot().items():
+        lines.append(f'analyzer_model_circuit_open{{model="{model_name}"}} {int(bool(health.get("circuit_open")))}')
+
+    lines += [
+        "# HELP analyzer_quota_queue_depth Calls waiting for model quota (all workers).",
+        "# TYPE analyzer_quota_queue_depth gauge",
+    ]
+    depths = quota.queue_depths()
+    for model_name in sorted(set(settings.ANALYZER_QUOTAS) | set(depths)):
+        lines.append(f'analyzer_quota_queue_depth{{model="{model_name}"}} {depths.get(model_name, 0)}')
+
+    lines += [
+        "# HELP analyzer_engine_loaded Whether this worker has imported the analysis engine.",
+        "# TYPE analyzer_engine_loaded gauge",
+        f"analyzer_engine_loaded {int(engine.is_loaded())}",
+        "# HELP analyzer_async_in_flight Async analyses awaiting a result in this worker.",
+        "# TYPE analyzer_async_in_flight gauge",
+        f"analyzer_async_in_flight {_async_in_flight}",
+    ]
+
+    return HttpResponse(metrics.render(lines), content_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 def home(request):
@@ -56,9 +350,18 @@ def home(request):
 
 def upload_text(request):
     if request.method == 'POST':
-        form = TextDocumentForm(request.POST, request.FILES)
+        # Reading request.FILES runs the upload handlers (hashing, size limit)
+        files = request.FILES
+        form = TextDocumentForm(
+            request.POST, files,
+            upload_hashes=getattr(request, 'upload_hashes', None),
+            upload_errors=getattr(request, 'upload_errors', None),
+        )
         if form.is_valid():
             doc = form.save()
+            if extract_document(doc):
+                index.add_document(doc.pk, doc.extracted_text)
+            neardup.index_document(doc)
             messages.success(request, 'Upload successful.')
             return redirect('detail',pk=doc.pk)
         else:
@@ -69,44 +372,165 @@ def upload_text(request):
     return render(request, 'analyzer/upload.html', {'form': form})
 
 
-def detail(request, pk):
+def _document_version(request, pk):
+    """Cheap fingerprint of what detail() renders, without loading the text or file."""
+    if not hasattr(request, '_document_version'):
+        latest = AnalysisResult.objects.filter(document=OuterRef('pk')).order_by('-created_at', '-id')
+        request._document_version = (
+            TextDocument.objects.filter(pk=pk)
+            .annotate(
+                jd_md5=MD5('job_description'),
+                latest_result_id=Subquery(latest.values('id')[:1]),
+                latest_result_at=Subquery(latest.values('created_at')[:1]),
+            )
+            .values('content_hash', 'extraction_seconds', 'uploaded_at', 'jd_md5',
+                    'latest_result_id', 'latest_result_at')
+            .first()
+        )
+    return request._document_version
 
-    doc = get_object_or_404(TextDocument, pk=pk)
-    file_name = os.path.basename(doc.file.name)
-    file_path = doc.file.path
-    ext = os.path.splitext(file_path)[1].lower()
-    content = ""
 
-    try:
-        # TXT files
-        if ext == ".txt":
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                content = f.read()
-
-        # PDF files
-        elif ext == ".pdf":
-            with open(file_path, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                text_list = [page.extract_text() or "" for page in reader.pages]
-                content = "\n".join(text_list)
-
-        # DOCX files
-        elif ext == ".docx":
-            content = docx2txt.process(file_path)
+def _preview_version(request, pk):
+    version = _document_version(request, pk)
+    if version is None:
+        return None
+    # Unextracted documents change once extraction runs, so no version yet.
+    if version['extraction_seconds'] is None:
+        return None
+    fingerprint = "|".join(str(version[k]) for k in ('content_hash', 'extraction_seconds', 'jd_md5'))
+    return f"{pk}-{hashlib.sha1(fingerprint.encode()).hexdigest()[:16]}"
+
+
+@functools.lru_cache(maxsize=None)
+def _markup_version():
+    """Changes with every deploy (DEPLOY_VERSION) and whenever the detail templates change."""
+    digest = hashlib.sha1(settings.DEPLOY_VERSION.encode())
+    for name in ('analyzer/detail.html', 'analyzer/_preview.html'):
+        digest.update(get_template(name).template.source.encode())
+    return digest.hexdigest()[:8]
+
+
+def _detail_etag(request, pk):
+    preview_version = _preview_version(request, pk)
+    if preview_version is None:
+        return None
+    # A new analysis result changes the page but not the preview fragment,
+    # and a deploy can change the page for every document.
+    latest_result_id = _document_version(request, pk)['latest_result_id']
+    return f"{_markup_version()}-{preview_version}-r{latest_result_id or 0}"
 
-        else:
-            content = f"⚠️ Preview not supported for {ext} files."
 
-    except Exception as e:
-        content = f"⚠️ Error reading file: {str(e)}"
+def _detail_last_modified(request, pk):
+    version = _document_version(request, pk)
+    if version is None:
+        return None
+    return max(filter(None, (version['uploaded_at'], version['latest_result_at'])))
+
+
+def render_preview(doc, version):
+    """Rendered resume/job description fragment, cached per document version."""
+    preview_cache = caches['previews']
+    key = f"doc_preview:{version}" if version else None
+    html = preview_cache.get(key) if key else None
+    if html is None:
+        ext = os.path.splitext(doc.file.name)[1].lower()
+        html = render_to_string('analyzer/_preview.html', {
+            'doc': doc,
+            'content': doc.extracted_text or f"⚠️ Preview not supported for {ext} files.",
+        })
+        if key:
+            preview_cache.set(key, html)
+    return mark_safe(html)
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_detail_etag, last_modified_func=_detail_last_modified)
+def detail(request, pk):
+    preview_version = _preview_version(request, pk)
+    docs = TextDocument.objects.all()
+    if preview_version and f"doc_preview:{preview_version}" in caches['previews']:
+        # The fragment is cached; skip loading the (possibly large) text.
+        docs = docs.defer('extracted_text', 'job_description')
+    doc = get_object_or_404(docs, pk=pk)
+
+    # Documents uploaded before extraction ran at upload time
+    if not doc.is_extracted:
+        extract_document(doc)
+
+    # The latest stored analysis is shown right away instead of re-running it.
+    latest_result_id = _document_version(request, pk)['latest_result_id']
+    latest = AnalysisResult.objects.filter(pk=latest_result_id).first() if latest_result_id else None
 
     return render(request, 'analyzer/detail.html', {
         'doc': doc,
-        'content': content,
-        'file_name': file_name,  # pass just the file name
+        'preview': render_preview(doc, preview_version),
+        'file_name': doc.display_name,  # pass just the file name
+        'latest_result': latest,
+        'latest_formatted': format_result(latest.as_result()) if latest else None,
+    })
+
+
+def analysis_history(request, pk):
+    """
+    Stored analysis results of one document, newest first.
+
+    Query: ?cursor=<next_cursor from the previous response>&limit=<results>
+    """
+    get_object_or_404(TextDocument.objects.only('id'), pk=pk)
+    try:
+        limit = int(request.GET.get('limit', settings.ANALYSIS_RESULT_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "limit must be an integer"}, status=400)
+    limit = min(max(1, limit), settings.ANALYSIS_RESULT_MAX_PAGE)
+    try:
+        results, next_cursor = history.results_page(pk, request.GET.get('cursor') or None, limit)
+    except InvalidCursor as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+    return JsonResponse({
+        "status": "success",
+        "results": [dict(history.history_entry(r), formatted=format_result(r.as_result())) for r in results],
+        "next_cursor": next_cursor,
     })
 
 
+def serve_media(request, path):
+    """Serve uploads (DEBUG only); blobs are content-addressed, so they never change."""
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    # Files stored before content addressing keep their upload names.
+    if path.startswith('blobs/') and response.status_code in (200, 304):
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_SECONDS, immutable=True)
+    return response
+
+
 def all_files(request):
-    files = TextDocument.objects.order_by('-uploaded_at')
-    return render(request, 'analyzer/all_files.html', {'files': files})
+    try:
+        files, next_cursor = keyset_page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return redirect('all_files')
+    return render(request, 'analyzer/all_files.html', {
+        'files': files,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('cursor'),
+        'preview_chars': settings.FILES_JD_PREVIEW_CHARS,
+    })
+
+
+def files_api(request):
+    """
+    JSON listing of uploads, newest first.
+
+    Query: ?cursor=<next_cursor from the previous response>&limit=<rows>
+    """
+    cursor = request.GET.get('cursor') or None
+    try:
+        limit = int(request.GET.get('limit', settings.FILES_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({"status": "error", "message": "limit must be an integer"}, status=400)
+    try:
+        if cursor:
+            decode_cursor(cursor)  # validate before the response starts streaming
+    except InvalidCursor as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+
+    return StreamingHttpResponse(stream_listing(cursor, max(1, limit)), content_type="application/json")
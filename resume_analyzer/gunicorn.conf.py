@@ -0,0 +1,25 @@
+import os
+
+
+def _enabled(name):
+    return os.getenv(name, "").lower() in ("1", "true", "yes")
+
+
+# Import the analysis engine once in the master so workers share its pages
+# copy-on-write instead of each importing it on their first analysis.
+preload_app = _enabled("ANALYZER_PRELOAD_ENGINE")
+
+
+def when_ready(server):
+    if preload_app:
+        from analyzer import engine
+
+        engine.warmup()
+
+
+def post_worker_init(worker):
+    # Build the Portia clients before the worker accepts its first request.
+    if _enabled("ANALYZER_PREWARM_CLIENTS"):
+        from analyzer import engine
+
+        engine.warmup(clients=True)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +44,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'analyzer.middleware.TraceIdMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,7 +52,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'analyzer.middleware.StaticFilesMiddleware',  # WhiteNoise, async-capable
 ]
 
 ROOT_URLCONF = 'resume_analyzer.urls'
@@ -129,3 +131,272 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+
+# Analysis result cache
+# Repeat analyses of the same resume/job description are served from disk.
+
+ANALYSIS_CACHE_DIR = BASE_DIR / 'cache' / 'analysis'
+
+ANALYSIS_CACHE_SIZE_LIMIT = 256 * 1024 * 1024  # 256 MB, least-recently-used entries are evicted
+
+ANALYSIS_CACHE_TTL = 7 * 24 * 60 * 60  # seconds
+
+# Single-flight: identical analyses running at the same time share one run
+# (across threads, and across workers through a lease in the analysis cache)
+
+ANALYZER_SINGLEFLIGHT_WAIT = 120  # seconds a duplicate waits before analyzing on its own
+
+ANALYZER_SINGLEFLIGHT_LEASE = 180  # seconds before a crashed worker's lease expires
+
+ANALYZER_SINGLEFLIGHT_POLL = 0.25  # seconds between checks on another worker's analysis
+
+
+# Background analysis jobs
+
+ANALYSIS_JOB_WORKERS = 2  # concurrent analyses per web process
+
+ANALYSIS_JOB_MAX_PENDING = 50  # new jobs are refused once this many are queued/running
+
+ANALYSIS_JOB_MAX_ATTEMPTS = 3
+
+ANALYSIS_JOB_RETRY_DELAY = 5  # seconds, multiplied by the attempt number
+
+ANALYSIS_STREAM_MAX_SECONDS = 120  # a progress stream then hands over to polling the job's status URL
+
+
+# Analysis result history (analyzer.history): results are written in batches off the request path
+
+ANALYSIS_RESULT_BATCH_SIZE = 100  # rows per bulk insert
+
+ANALYSIS_RESULT_FLUSH_SECONDS = 1.0  # longest a result waits in memory before it is written
+
+ANALYSIS_RESULT_PAGE_SIZE = 20  # results per /doc/<id>/results/ page
+
+ANALYSIS_RESULT_MAX_PAGE = 100  # largest ?limit= that endpoint accepts
+
+
+# Async analysis endpoint (/analyze/<id>/async/, served under ASGI, e.g. uvicorn)
+
+ANALYZER_ASYNC_MAX_IN_FLIGHT = 500  # concurrent async analyses per process; more get a 503
+
+ANALYZER_ASYNC_BLOCKING_THREADS = 64  # threads for LLM clients without a native async API
+
+
+# Model fallback: circuit breaking and hedging
+
+ANALYZER_HEALTH_WINDOW = 50  # recent attempts kept per model
+
+ANALYZER_CIRCUIT_MIN_SAMPLES = 5
+
+ANALYZER_CIRCUIT_ERROR_RATE = 0.5  # open the circuit at this failure ratio
+
+ANALYZER_CIRCUIT_COOLDOWN = 60  # seconds before a tripped model is tried again
+
+ANALYZER_HEDGE_AFTER = 20  # seconds, upper bound before a hedged request goes to the next model
+
+ANALYZER_ATTEMPT_THREADS = 32  # model calls (including hedges) in flight per process on the threaded path
+
+
+# Document text extraction (runs in a separate process pool)
+
+EXTRACTION_WORKERS = 2
+
+EXTRACTION_TIMEOUT = 15  # seconds of wall-clock time per document
+
+EXTRACTION_MAX_MEMORY = 512 * 1024 * 1024  # address-space limit per extraction process
+
+
+# Batch analysis
+
+BATCH_TOKEN_BUDGET = 24000  # approximate input tokens per packed LLM request
+
+BATCH_MAX_PAIRS = 10  # comparisons per LLM request
+
+BATCH_CONCURRENCY = 4  # packed requests in flight per batch
+
+BATCH_MAX_ITEMS = 200  # job descriptions or resumes accepted per API call
+
+
+# Local pre-scorer
+
+# Local score (1–10) under which the LLM is skipped; None to always call it.
+# Off until the scorer is calibrated against LLM scores: a strong resume can
+# score under 4 locally.
+ANALYZER_LOCAL_SKIP_BELOW = None
+
+ANALYZER_PROVISIONAL_CACHE_SECONDS = 60 * 60  # provisional scores are reused across status polls
+
+
+# Near-duplicate reuse (analyzer.neardup): a resume and job description that both
+# closely match an already analyzed pair get that pair's stored result. Thresholds
+# are estimated Jaccard similarities of word 3-grams. The resume must also use the
+# same words, and the job description no words the analyzed one lacked, so in
+# practice only reformatted resumes or trimmed job descriptions are reused.
+
+ANALYZER_NEAR_DUPLICATE_RESUME_SIMILARITY = 0.98  # None to disable near-duplicate reuse
+
+ANALYZER_NEAR_DUPLICATE_JD_SIMILARITY = 0.85
+
+# Changing these invalidates stored signatures: run `manage.py index_near_duplicates --rebuild`
+ANALYZER_MINHASH_PERMUTATIONS = 128
+
+ANALYZER_MINHASH_BANDS = 16  # LSH bands of PERMUTATIONS / BANDS rows; candidates share at least one band
+
+ANALYZER_NEAR_DUPLICATE_CANDIDATES = 50  # most recent candidates verified per lookup
+
+
+# Resume search index
+
+RESUME_INDEX_DIR = BASE_DIR / 'index'
+
+RESUME_INDEX_MERGE_BYTES = 8 * 1024 * 1024  # fold the delta log into the base segment past this size
+
+
+# Prompt compaction: (resume, job description) input token budgets per model
+
+ANALYZER_PROMPT_TOKEN_BUDGETS = {
+    'default': (4000, 1500),
+    'gemini-1.5-pro': (8000, 3000),
+    'gemini-2.5-flash': (8000, 3000),
+}
+
+# Section-level incremental analysis (analyzer.sections): only resume sections
+# without cached findings for this job description are sent to the model. The
+# model must then also report findings per section, which costs output tokens
+# on every analysis, including first ones with nothing to reuse. Worth turning
+# on when users often re-upload edited resumes against the same job description
+# (see `manage.py benchmark_analyzer`, iterative edits).
+ANALYZER_INCREMENTAL_SECTIONS = False
+
+
+# Uploaded files listing
+
+FILES_PAGE_SIZE = 30  # cards per page on /files/
+
+FILES_JD_PREVIEW_CHARS = 200  # job description characters loaded per row
+
+FILES_API_MAX_LIMIT = 5000  # rows one /files/api/ response may stream
+
+
+# Uploads: hashed and size-checked while they stream in (analyzer.uploads)
+
+UPLOAD_MAX_BYTES = 5 * 1024 * 1024  # 5 MB per resume
+
+FILE_UPLOAD_HANDLERS = [
+    'analyzer.uploads.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+
+# Caches: rendered detail page previews live in their own bounded LocMem cache
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'previews': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'doc-previews',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 500},  # per process; least recently used evicted first
+    },
+}
+
+MEDIA_CACHE_SECONDS = 365 * 24 * 60 * 60  # content-addressed uploads (media/blobs/) never change
+
+# Set per release (e.g. the git commit) so validators of rendered pages change on deploy
+DEPLOY_VERSION = os.environ.get('DEPLOY_VERSION', '')
+
+
+# LLM backend: 'portia' (Gemini) or 'stub' (offline canned answers, see
+# analyzer.stub_llm; used by `manage.py benchmark_analyzer`)
+
+ANALYZER_LLM_BACKEND = os.environ.get('ANALYZER_LLM_BACKEND', 'portia')
+
+ANALYZER_STUB = {
+    'LATENCY': 0.2,          # seconds per call
+    'JITTER': 0.05,          # +/- seconds
+    'MODEL_LATENCY': {},     # per-model overrides of LATENCY
+    'ERROR_RATE': 0.0,       # fraction of calls that fail
+    'RATE_LIMIT_RATE': 0.0,  # fraction of calls that fail with a 429
+    'MALFORMED_RATE': 0.0,   # fraction of answers sent as fenced, single-quoted near-JSON
+    'INPUT_LATENCY': 0.0,    # extra seconds per 1,000 input tokens (about 4,000 characters)
+    'SEED': None,
+    'RESULT': {
+        'match_score': 7,
+        'strengths': ['Python and Django experience', 'Automation background', 'Measurable impact'],
+        'missing_keywords': ['Docker', 'Kubernetes', 'AWS'],
+        'improvement_tips': [
+            'Add a project deployed with Docker',
+            'Mention any cloud platform experience',
+            'Quantify the impact of backend work',
+        ],
+        'schedule_plan_to_improve': [
+            'Week 1: containerize a Django project with Docker',
+            'Week 2: deploy it to AWS or GCP',
+        ],
+    },
+}
+
+
+# Instrumentation: per-stage metrics on /metrics, trace IDs on every log line
+
+ANALYZER_TRACE_HEADER = True  # echo the request's trace ID as X-Trace-Id
+
+ANALYZER_METRICS_TOKEN = os.environ.get('ANALYZER_METRICS_TOKEN')  # if set, /metrics needs "Authorization: Bearer <token>"
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'trace_id': {'()': 'analyzer.metrics.TraceIdFilter'},
+    },
+    'formatters': {
+        'analyzer': {
+            'format': '%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['trace_id'],
+            'formatter': 'analyzer',
+        },
+    },
+    'loggers': {
+        'analyzer': {
+            'handlers': ['console'],
+            'level': os.environ.get('ANALYZER_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        # Portia logs every plan step; only its warnings are useful here.
+        'portia': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
+# Client-side model quotas, shared by all workers on the host (analyzer.quota).
+# Requests and tokens per minute; models not listed are only held after a 429.
+
+ANALYZER_QUOTAS = {
+    'gemini-2.0-flash': {'rpm': 15, 'tpm': 1_000_000},
+    'gemini-1.5-flash': {'rpm': 15, 'tpm': 1_000_000},
+    'gemini-1.5-pro': {'rpm': 2, 'tpm': 32_000},
+    'gemini-2.5-flash': {'rpm': 10, 'tpm': 250_000},
+}
+
+ANALYZER_QUOTA_DB = BASE_DIR / 'cache' / 'quota.sqlite3'
+
+ANALYZER_QUOTA_MAX_WAIT = 30  # seconds a call may queue for quota before trying the next model
+
+ANALYZER_QUOTA_MAX_QUEUE = 20  # calls allowed to wait at once; beyond this new analyses are refused
+
+ANALYZER_QUOTA_OUTPUT_ESTIMATE = 800  # tokens reserved for a response until the real count is known
+
+ANALYZER_QUOTA_DEFAULT_RETRY_AFTER = 30  # seconds to back off after a 429 without a retry hint